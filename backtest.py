@@ -0,0 +1,350 @@
+import os
+import csv
+import time
+import pandas as pd
+import profiling
+import exit_rules
+from indicators import SignalGenerator, symbol_for
+from time_axis import from_epoch_ms, to_epoch_ms
+from frame_memory import compact_candles, categorize_trades, frame_bytes
+from dataset_cache import default_cache
+from trade_simulation import TradeSimulation
+from stats import compute_stats
+
+# Candle files larger than this (MB) are backtested in chunks instead of loaded whole
+STREAM_MB = float(os.environ.get("BACKTEST_STREAM_MB", "512"))
+CHUNK_ROWS = 250_000
+CANDLE_COLUMNS = ["Datetime", "High", "Low"]
+# Progress stage of a run answered from the ResultCache
+CACHED_STAGE = "Loaded from cache"
+
+
+class BacktestError(Exception):
+    """Raised when the inputs of a backtest run are invalid."""
+
+
+class BacktestCancelled(Exception):
+    """Raised when a run is stopped through its should_stop callback."""
+
+
+def load_candles(candles_path):
+    if not candles_path or not os.path.exists(candles_path):
+        raise BacktestError("Invalid or missing Candle File.")
+
+    try:
+        with profiling.span("pipeline.load_candles", bytes=os.path.getsize(candles_path)) as s:
+            # Datetime as epoch ms and prices as float32 where that is exact
+            candles_df = compact_candles(pd.read_csv(candles_path))
+            s.set(rows=len(candles_df))
+            if profiling.is_enabled():
+                s.set(memory_bytes=frame_bytes(candles_df))
+        return candles_df
+    except Exception as e:
+        raise BacktestError(f"Error loading Candle File: {e}")
+
+
+def iter_candle_chunks(candles_path, chunk_rows=CHUNK_ROWS, columns=CANDLE_COLUMNS):
+    """
+    Read the candle columns the engine uses, chunk_rows candles at a time.
+    """
+    reader = pd.read_csv(candles_path, usecols=columns, chunksize=chunk_rows)
+    with reader:
+        yield from reader
+
+
+def candle_time_range(candles_path):
+    """
+    Epoch-ms times of the first and last candle, read from the start and end
+    of the file without loading it. (None, None) for a file without candles.
+    """
+    with open(candles_path, "r", newline="") as f:
+        header = next(csv.reader([f.readline()]), [])
+        first_line = f.readline()
+        if "Datetime" not in header or not first_line.strip():
+            return None, None
+        column = header.index("Datetime")
+
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - 64 * 1024))
+        lines = [line for line in f.read().splitlines() if line.strip()]
+
+    first = next(csv.reader([first_line]))[column]
+    last = next(csv.reader([lines[-1]]))[column]
+    first, last = to_epoch_ms(pd.Series([first, last], dtype=object))
+    return int(first), int(last)
+
+
+def should_stream(candles_path):
+    return os.path.getsize(candles_path) > STREAM_MB * 2**20
+
+
+def load_signals(signals_path):
+    """
+    Read a signals CSV with Buy/Sell Normal/Smart columns into the
+    time/Entry/Buy/Sell frame TradeSimulation expects.
+    """
+    if not signals_path:
+        raise BacktestError("No Signals File provided.")
+
+    try:
+        with profiling.span("pipeline.read_signals") as s:
+            signals_raw = pd.read_csv(signals_path)
+            s.set(rows=len(signals_raw), bytes=os.path.getsize(signals_path))
+        signals_raw.columns = signals_raw.columns.str.strip()
+        signals_raw['Entry'] = signals_raw['close'].astype(float)
+        signals_raw = signals_raw.dropna(
+            subset=['Buy Normal', 'Buy Smart', 'Sell Normal', 'Sell Smart'])
+        signals_raw['sum'] = signals_raw[['Buy Normal',
+                                          'Buy Smart', 'Sell Normal', 'Sell Smart']].sum(axis=1)
+        filter_data = signals_raw[signals_raw['sum'] > 0].copy()
+
+        buy_mask = (filter_data["Buy Normal"] > 0) | (
+            filter_data["Buy Smart"] > 0)
+        sell_mask = (filter_data["Sell Normal"] > 0) | (
+            filter_data["Sell Smart"] > 0)
+        filter_data['Buy'] = buy_mask.astype(int)
+        filter_data['Sell'] = sell_mask.astype(int)
+
+        columns_to_select = ["time", "Entry", "Buy", "Sell"]
+        signals_df = filter_data[columns_to_select]
+    except Exception as e:
+        raise BacktestError(f"Error processing Signals File: {e}")
+
+    if signals_df.empty:
+        raise BacktestError("No valid signals in the Signals File.")
+    if profiling.is_enabled():
+        with profiling.span("pipeline.signals_frame", rows=len(signals_df)) as s:
+            s.set(memory_bytes=frame_bytes(signals_df))
+
+    return signals_df
+
+
+def generate_signals(candles_df, candles_path, formData):
+    """
+    Signals of formData["SignalStrategy"] computed from the candles, in the
+    frame load_signals() returns.
+
+    :param candles_df: Candle frame, or an iterable of consecutive candle
+        chunks of a file that is not loaded whole.
+    """
+    try:
+        generator = SignalGenerator(
+            formData["SignalStrategy"], symbol_for(candles_path), formData.get("interval"))
+        if isinstance(candles_df, pd.DataFrame):
+            signals_df = generator.signals(candles_df)
+        else:
+            signals_df = generator.signals_chunked(candles_df)
+    except (ValueError, TypeError, KeyError) as e:
+        raise BacktestError(f"Invalid signal strategy: {e}")
+
+    if signals_df.empty:
+        raise BacktestError("The signal strategy gave no signals on these candles.")
+    return signals_df
+
+
+def create_simulation(candles_df, signals_df, formData):
+    capital = formData.get("Capital", 1000)
+    leverage = formData.get("Leverage", 1)
+    maker_fee_rate = formData.get("MakerFees", 0.02) / 100
+    taker_fee_rate = formData.get("TakerFees", 0.055) / 100
+    tp_percent = formData.get("TP_percent", 0)
+    sl_percent = formData.get("SL_percent", 0)
+    with_compounding = formData.get("WithCompounding", False)
+    use_alternate_signall = formData.get("useAlternateSignal", False)
+    interval = formData.get("interval", False)
+    # Older forms and cached parameter sets have no alignment settings, exact matching
+    signal_tolerance_ms = int(formData.get("SignalTolerance", 0) * 1000)
+    signal_direction = formData.get("SignalMatch", "backward")
+    max_positions = formData.get("MaxPositions", 1)
+    try:
+        rules = exit_rules.from_config(formData.get("ExitRules"))
+    except (ValueError, TypeError, KeyError) as e:
+        raise BacktestError(f"Invalid exit rule: {e}")
+    if rules and max_positions > 1:
+        raise BacktestError("Exit rules can only be used with one open position at a time.")
+
+    return TradeSimulation(
+        candles_df,
+        signals_df,
+        capital,
+        leverage,
+        maker_fee_rate,
+        taker_fee_rate,
+        tp_percent,
+        sl_percent,
+        with_compounding,
+        use_alternate_signall,
+        interval,
+        signal_tolerance_ms,
+        signal_direction,
+        max_positions,
+        rules
+    )
+
+
+@profiling.traced("pipeline")
+def run_pipeline(candles_path, formData, progress=None, should_stop=None, on_trades=None,
+                 cache=None, chunk_rows=None, datasets=None):
+    """
+    Load the inputs, run the backtest and compute monthly stats.
+
+    :param candles_path: Candle CSV to backtest on.
+    :param formData: Parameters as collected by Screen1.
+    :param progress: Optional callback(stage, percent, candles_per_second).
+    :param should_stop: Optional callable; the run raises BacktestCancelled
+        soon after it returns True.
+    :param on_trades: Optional callback(trades_df) with newly completed trades
+        while the backtest is still running.
+    :param cache: Optional ResultCache; a run with the same inputs and
+        parameters as a cached one returns the cached result.
+    :param chunk_rows: Backtest the candle file in chunks of this many rows
+        rather than loading it whole. Files above STREAM_MB are always chunked.
+    :param datasets: Object whose candles(path) and signals(path) return
+        the frames of load_candles() and load_signals(), reusing files loaded
+        before; the process-wide DatasetCache by default. The frames are not
+        modified.
+    :return: (monthly_stats, trades_df, summary), summary being the
+        whole-run metrics of stats.compute_stats with monthly periods
+    """
+    datasets = datasets if datasets is not None else default_cache()
+
+    def report(stage, percent=0.0, rate=0.0):
+        if progress is not None:
+            progress(stage, percent, rate)
+
+    def check_cancelled():
+        if should_stop is not None and should_stop():
+            raise BacktestCancelled()
+
+    key = None
+    if cache is not None and cache.enabled:
+        report("Checking cache")
+        try:
+            key = cache.key_for(candles_path, formData)
+        except (OSError, KeyError, TypeError):
+            pass  # Missing inputs are reported by the loaders below
+        cached = cache.get(key) if key is not None else None
+        if cached is not None:
+            report(CACHED_STAGE, 100.0)
+            monthly_stats, trades_df, summary = cached
+            if summary is None:  # Cached before summaries were stored
+                _, summary = compute_stats(trades_df, formData.get("Capital", 1000))
+            return monthly_stats, trades_df, summary
+
+    if not candles_path or not os.path.exists(candles_path):
+        raise BacktestError("Invalid or missing Candle File.")
+    if chunk_rows is None and should_stream(candles_path):
+        chunk_rows = CHUNK_ROWS
+
+    if chunk_rows:
+        # Candles are read chunk by chunk while backtesting
+        try:
+            first, last = candle_time_range(candles_path)
+        except Exception as e:
+            raise BacktestError(f"Error loading Candle File: {e}")
+        candles_df = None
+    else:
+        report("Loading candles")
+        candles_df = datasets.candles(candles_path)
+    check_cancelled()
+
+    if formData.get("SignalStrategy"):
+        report("Generating signals")
+        if candles_df is None:
+            # Streamed files are read a chunk at a time for the signals too
+            signal_candles = iter_candle_chunks(candles_path, chunk_rows, CANDLE_COLUMNS + ["Close"])
+        else:
+            signal_candles = candles_df
+        signals_df = generate_signals(signal_candles, candles_path, formData)
+        del signal_candles
+    else:
+        report("Loading signals")
+        signals_df = datasets.signals(formData.get("File"))
+    check_cancelled()
+
+    report("Preparing data")
+    simulation = create_simulation(candles_df, signals_df, formData)
+    if chunk_rows:
+        simulation.prepare_signals()
+    else:
+        simulation.tranform()
+        index = simulation.candles_df.index
+        first, last = (index[0], index[-1]) if len(index) else (None, None)
+        warn_unmatched(simulation)
+    check_cancelled()
+
+    span = last - first if first is not None and last != first else 0
+    started = time.perf_counter()
+    reported = [0]
+
+    def on_progress(processed, current):
+        elapsed = time.perf_counter() - started
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        percent = 100.0 * (current - first) / span if span else 100.0
+        report("Backtesting", percent, rate)
+
+        if on_trades is not None:
+            new_trades = simulation.completed_trades[reported[0]:]
+            reported[0] += len(new_trades)
+            if new_trades:
+                on_trades(trades_frame(new_trades))
+
+    if chunk_rows:
+        try:
+            columns = CANDLE_COLUMNS + (["Close"] if simulation.needs_close else [])
+            simulation.run_chunks(iter_candle_chunks(candles_path, chunk_rows, columns),
+                                  progress=on_progress, should_stop=should_stop)
+        except ValueError as e:
+            raise BacktestError(f"Error loading Candle File: {e}")
+        warn_unmatched(simulation)
+    else:
+        simulation.run_backtest(progress=on_progress, should_stop=should_stop)
+    check_cancelled()
+    report("Backtesting", 100.0, 0.0)
+
+    report("Computing statistics")
+    monthly_stats, trades_df, summary = compute_results(simulation, formData)
+    if key is not None:
+        cache.put(key, monthly_stats, trades_df, summary=summary, meta={
+            "candles_path": candles_path, "formData": formData})
+    return monthly_stats, trades_df, summary
+
+
+def warn_unmatched(simulation):
+    if simulation.unmatched_signals:
+        print(f"{simulation.unmatched_signals} of {len(simulation.signals_df)} signals matched "
+              "no candle within the signal tolerance and were skipped.")
+
+
+def compute_results(simulation, formData):
+    """
+    Monthly stats, trades DataFrame and run summary of a finished simulation.
+    """
+    capital = formData.get("Capital", 1000)
+    completed_trades = simulation.completed_trades
+    if not completed_trades:
+        return [], pd.DataFrame(), compute_stats(None, capital)[1]
+
+    with profiling.span("pipeline.trades_frame", rows=len(completed_trades)) as s:
+        trades_df = trades_frame(completed_trades)
+        trades_df["Month"] = trades_df["Datetime"].dt.to_period(
+            "M").astype(str)
+        if profiling.is_enabled():
+            s.set(memory_bytes=frame_bytes(trades_df))
+
+    with profiling.span("pipeline.compute_stats", trades=len(trades_df)) as s:
+        monthly_stats, summary = compute_stats(trades_df, capital, period="month")
+        s.set(periods=len(monthly_stats))
+    return monthly_stats, trades_df, summary
+
+
+def trades_frame(trades):
+    """
+    DataFrame of completed trades with the engine's epoch-ms open and close
+    times shown in the display timezone.
+    """
+    trades_df = pd.DataFrame(trades)
+    for column in ("Datetime", "Close_Time"):
+        trades_df[column] = from_epoch_ms(trades_df[column].to_numpy())
+    return categorize_trades(trades_df)
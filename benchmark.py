@@ -0,0 +1,344 @@
+"""
+Benchmarks for the backtest hot paths on synthetic data.
+
+Runs headless (Qt uses the offscreen platform) and reports wall time and
+peak memory per stage. Every run is appended to a JSON history and
+can be compared against a saved baseline:
+
+    python benchmark.py --sizes 10k,1m --densities sparse,dense
+    python benchmark.py --save-baseline
+    python benchmark.py --compare --threshold 20
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import platform
+import tempfile
+import threading
+import tracemalloc
+import numpy as np
+import pandas as pd
+import synthetic_data
+
+HISTORY_FILE = "benchmark_history.json"
+BASELINE_FILE = "benchmark_baseline.json"
+
+# Fraction of candles that carry a signal
+DENSITIES = {"sparse": 0.01, "dense": 0.25}
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# How measure() takes peak memory, set from --memory
+MEMORY = "rss"
+
+# Stages below these are dominated by noise and never flagged as regressions
+MIN_SECONDS = 0.1
+MIN_PEAK_BYTES = 4 * 2**20
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+
+def synthetic_candles(n, seed=0):
+    """
+    n bars of 1m candles from synthetic_data, in the layout the backtest reads
+    from the store. Bars in the market's gaps are missing, so a few less rows.
+    """
+    return synthetic_data.candles(n, seed)
+
+
+def synthetic_signals(candles, density, seed=1):
+    """
+    Signals frame as backtest.load_signals returns it, on a random subset of candles.
+    """
+    rng = np.random.default_rng(seed)
+    picked = np.flatnonzero(rng.random(len(candles)) < density)
+    buy = rng.random(len(picked)) < 0.5
+    return pd.DataFrame({
+        "time": candles["Datetime"].iloc[picked].to_numpy(),
+        "Entry": candles["Close"].iloc[picked].to_numpy(),
+        "Buy": buy.astype(int),
+        "Sell": (~buy).astype(int),
+    })
+
+
+def synthetic_klines(n, seed=2):
+    """
+    Raw kline arrays like the Binance REST endpoint returns.
+    """
+    candles = synthetic_candles(n, seed)
+    return [
+        [int(t), str(o), str(h), str(l), str(c), str(v)]
+        for t, o, h, l, c, v in zip(
+            candles["Datetime"], candles["Open"], candles["High"], candles["Low"],
+            candles["Close"], candles["Volume"])
+    ]
+
+
+class RssSampler(threading.Thread):
+    """
+    Polls the resident set size while a stage runs. Unlike tracemalloc it
+    does not slow the stage down, and it sees numpy and Qt allocations too.
+    """
+
+    def __init__(self, interval=0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.start_bytes = current_rss()
+        self.peak_bytes = self.start_bytes
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak_bytes = max(self.peak_bytes, current_rss())
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.peak_bytes = max(self.peak_bytes, current_rss())
+        return self.peak_bytes - self.start_bytes
+
+
+def current_rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * PAGE_SIZE
+
+
+def memory_method(requested):
+    if requested == "rss" and not os.path.exists("/proc/self/statm"):
+        return "tracemalloc"
+    return requested
+
+
+def measure(records, stage, label, fn, memory=None):
+    """
+    Run fn once, appending its wall time and peak memory to records.
+
+    memory is "rss" (growth of the process RSS over the stage), "tracemalloc"
+    (peak traced Python allocations, slows allocation-heavy stages down) or "off".
+    """
+    memory = memory or MEMORY
+    sampler = None
+    if memory == "tracemalloc":
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+    elif memory == "rss":
+        sampler = RssSampler()
+        sampler.start()
+
+    started = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - started
+
+    peak = 0
+    if memory == "tracemalloc":
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    elif sampler is not None:
+        peak = sampler.stop()
+
+    records.append({
+        "key": f"{stage}[{label}]",
+        "stage": stage,
+        "case": label,
+        "seconds": round(seconds, 4),
+        "peak_bytes": int(peak),
+    })
+    print(f"  {stage:<36} {seconds:10.3f}s {peak / 2**20:10.1f} MiB")
+    return result
+
+
+def bench_engine(records, candles, signals, label):
+    from trade_simulation import TradeSimulation
+    from backtest import trades_frame
+    from stats import compute_stats
+
+    simulation = TradeSimulation(
+        candles, signals, 1000, 10, 0.0002, 0.00055, 0.5, 0.3, True, True, "1")
+    measure(records, "TradeSimulation.tranform", label, simulation.tranform)
+    measure(records, "TradeSimulation.run_backtest", label, simulation.run_backtest)
+
+    if not simulation.completed_trades:
+        return pd.DataFrame()
+    trades = measure(records, "backtest.trades_frame", label,
+                     lambda: trades_frame(simulation.completed_trades))
+    measure(records, "stats.compute_stats", label,
+            lambda: compute_stats(trades, 1000, "month"))
+    return trades
+
+
+def bench_ingest(records, rows, label, workdir):
+    from data_handler import DataHandler
+    from binance_data import BinanceData, kline_to_row
+
+    klines = synthetic_klines(rows)
+
+    path = os.path.join(workdir, f"upsert-{label}.csv")
+    handler = DataHandler(path)
+    candle_rows = [kline_to_row(k) for k in klines]
+
+    def upsert_all():
+        for row in candle_rows:
+            handler.upsert(row)
+    measure(records, "DataHandler.upsert", label, upsert_all)
+
+    path = os.path.join(workdir, f"ingest-{label}.csv")
+    binance_data = BinanceData("http://localhost", "BTCUSDT", "1m", path)
+    measure(records, "BinanceData.process_and_save_data", label,
+            lambda: binance_data.process_and_save_data(klines))
+
+
+def bench_models(records, candles, trades, label):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt5.QtWidgets import QApplication
+        from PyQt5.QtCore import Qt
+    except ImportError:
+        print("  PyQt5 not available, skipping UI models")
+        return
+    app = QApplication.instance() or QApplication([])
+    from table_models import DataFrameTableModel, TradesTableModel
+
+    model = measure(records, "DataFrameTableModel.init", label,
+                    lambda: DataFrameTableModel(candles, timeColumns=["Datetime"]))
+    measure(records, "DataFrameTableModel.sort", label,
+            lambda: model.sort(4, Qt.DescendingOrder))
+    measure(records, "DataFrameTableModel.filter", label,
+            lambda: model.setFilter(4, "> 100"))
+    # What a view asks for while painting one screen of rows
+    measure(records, "DataFrameTableModel.paint50", label, lambda: [
+        model.data(model.index(r, c)) for r in range(50) for c in range(model.columnCount())])
+
+    if trades is not None and not trades.empty:
+        measure(records, "TradesTableModel.init", label,
+                lambda: TradesTableModel(trades))
+    app.processEvents()
+
+
+def run_suite(sizes, densities, ingest_rows, with_ui):
+    records = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            candles = synthetic_candles(size)
+            for density in densities:
+                label = f"{size},{density}"
+                print(f"{size} candles, {density} signals")
+                signals = synthetic_signals(candles, DENSITIES[density])
+                trades = bench_engine(records, candles, signals, label)
+                if with_ui:
+                    bench_models(records, candles, trades, label)
+
+        if ingest_rows:
+            print(f"{ingest_rows} klines ingest")
+            bench_ingest(records, ingest_rows, str(ingest_rows), workdir)
+    return records
+
+
+def compare(records, baseline, threshold):
+    """
+    Print stages slower (or hungrier) than the baseline by more than threshold percent.
+
+    :return: True when any stage regressed.
+    """
+    previous = {r["key"]: r for r in baseline.get("records", [])}
+    fields = ["seconds"]
+    # Peaks taken with different methods are not comparable
+    if baseline.get("memory_method", "tracemalloc") == MEMORY and MEMORY != "off":
+        fields.append("peak_bytes")
+
+    regressed = False
+    for record in records:
+        base = previous.get(record["key"])
+        if base is None:
+            continue
+        for field in fields:
+            if base[field] <= 0:
+                continue
+            floor = MIN_SECONDS if field == "seconds" else MIN_PEAK_BYTES
+            if max(base[field], record[field]) < floor:
+                continue
+            change = (record[field] - base[field]) / base[field] * 100
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                regressed = True
+            print(f"  {record['key']:<48} {field:<10} {change:+7.1f}%{flag}")
+    return regressed
+
+
+def load_json(path, default):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10k",
+                        help="Candle counts, e.g. 10k,1m,10m")
+    parser.add_argument("--densities", default="sparse,dense",
+                        help=f"Signal densities from {', '.join(DENSITIES)}")
+    parser.add_argument("--ingest-rows", type=parse_size, default=1000,
+                        help="Klines for the upsert/process_and_save_data stages (0 to skip)")
+    parser.add_argument("--no-ui", action="store_true",
+                        help="Skip the Qt table model stages")
+    parser.add_argument("--memory", choices=["rss", "tracemalloc", "off"], default="rss",
+                        help="Peak memory method; tracemalloc is exact for Python "
+                             "allocations but inflates timings")
+    parser.add_argument("--history", default=HISTORY_FILE)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store this run as the baseline")
+    parser.add_argument("--compare", action="store_true",
+                        help="Compare against the baseline, exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=20.0,
+                        help="Allowed slowdown in percent before flagging a regression")
+    args = parser.parse_args(argv)
+
+    global MEMORY
+    MEMORY = memory_method(args.memory)
+
+    sizes = [parse_size(s) for s in args.sizes.split(",")]
+    densities = [d.strip() for d in args.densities.split(",")]
+    records = run_suite(sizes, densities, args.ingest_rows, not args.no_ui)
+
+    run = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "memory_method": MEMORY,
+        "records": records,
+    }
+    history = load_json(args.history, [])
+    history.append(run)
+    with open(args.history, "w") as f:
+        json.dump(history, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.compare:
+        baseline = load_json(args.baseline, None)
+        if baseline is None:
+            print(f"No baseline at {args.baseline}")
+            return 1
+        print(f"Compared with baseline from {baseline['timestamp']}:")
+        if compare(records, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,12 +5,29 @@ import time
 import requests
 import pandas as pd
 from dotenv import load_dotenv
+import profiling
 from data_handler import DataHandler
 
 # Load environment variables from .env file
 load_dotenv()
 
 
+def kline_to_row(kline):
+    """
+    Convert a raw Binance kline array into a candle row for the DataHandler.
+
+    :param kline: [open_time, open, high, low, close, volume, ...] as returned by the API.
+    """
+    return {
+        "Datetime": int(kline[0]),  # Open time, UTC epoch ms like the whole store
+        "Open": float(kline[1]),
+        "High": float(kline[2]),
+        "Low": float(kline[3]),
+        "Close": float(kline[4]),
+        "Volume": float(kline[5]),
+    }
+
+
 class BinanceData:
     def __init__(self, api_url: str, symbol: str, interval: str, file: str):
         self.api_url = api_url
@@ -28,9 +45,11 @@ class BinanceData:
             "limit": limit,
         }
         try:
-            response = requests.get(endpoint, params=params)
-            response.raise_for_status()
-            data = response.json()
+            with profiling.span("download.fetch_klines", symbol=self.symbol) as s:
+                response = requests.get(endpoint, params=params)
+                response.raise_for_status()
+                data = response.json()
+                s.set(bytes=len(response.content), rows=len(data))
             print(f"Kline data fetched successfully for {self.symbol}.")
             return data
         except requests.RequestException as e:
@@ -42,21 +61,12 @@ class BinanceData:
             print("No data to process.")
             return
 
-        for kline in kline_data:
-            utc_dt = pd.to_datetime(int(kline[0]), unit="ms", utc=True)
-            gmt_plus_5_dt = utc_dt.tz_convert("Asia/Karachi")
-
-            row = {
-                "Datetime": gmt_plus_5_dt,
-                "Open": float(kline[1]),
-                "High": float(kline[2]),
-                "Low": float(kline[3]),
-                "Close": float(kline[4]),
-                "Volume": float(kline[5]),
-            }
-            self.data_handler.upsert(row)
-
-        self.data_handler.data.sort_values(
-            by="Datetime", ascending=True, inplace=True)
+        with profiling.span("download.upsert", rows=len(kline_data)):
+            for kline in kline_data:
+                self.data_handler.upsert(kline_to_row(kline))
+
+        with profiling.span("download.sort", rows=len(self.data_handler.data)):
+            self.data_handler.data.sort_values(
+                by="Datetime", ascending=True, inplace=True)
         self.data_handler.save_data()
         print("Data sorted and saved successfully.")
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+from time_axis import to_epoch_ms, DISPLAY_TZ
+from frame_memory import price_array
+
+
+class CandleSeries:
+    """
+    Candle columns as numpy arrays with a sorted epoch-ms time index, so chart
+    windows are found by binary search instead of scanning the frame.
+    """
+
+    def __init__(self, candles_df, tz=DISPLAY_TZ):
+        times = to_epoch_ms(candles_df["Datetime"])
+        order = np.argsort(times, kind="stable")
+        candles_df = candles_df.iloc[order]
+        self.times = times[order]
+        self.open = price_array(candles_df, "Open")
+        self.high = price_array(candles_df, "High")
+        self.low = price_array(candles_df, "Low")
+        self.close = price_array(candles_df, "Close")
+        self.tz = tz
+
+    def __len__(self):
+        return len(self.times)
+
+    def locate(self, when):
+        """
+        Index of the candle that opened exactly at when, or -1.
+        """
+        ms = to_epoch_ms(when)
+        i = int(np.searchsorted(self.times, ms))
+        if i < len(self.times) and self.times[i] == ms:
+            return i
+        return -1
+
+    def window(self, open_time, close_time, padding=30):
+        """
+        Slice covering a trade plus padding candles on each side, or None when
+        either time is not a candle in this series.
+        """
+        open_idx = self.locate(open_time)
+        close_idx = self.locate(close_time)
+        if open_idx < 0 or close_idx < 0:
+            return None
+        return slice(max(open_idx - padding, 0), min(close_idx + padding, len(self) - 1) + 1)
+
+    def wall_clock_ms(self, times):
+        """
+        Shift epoch-ms times to local wall-clock ms, which is what chart
+        libraries without timezone support display.
+        """
+        local = pd.to_datetime(times, unit="ms", utc=True).tz_convert(self.tz)
+        wall = local.tz_localize(None) - pd.Timestamp(0)
+        return np.asarray(wall // pd.Timedelta(milliseconds=1), dtype=np.int64)
+
+
+def downsample_ohlc(times, open_, high, low, close, max_bars):
+    """
+    Merge consecutive candles into at most max_bars buckets while keeping each
+    bucket's first open, highest high, lowest low and last close.
+    """
+    n = len(times)
+    if n <= max_bars:
+        return times, open_, high, low, close
+
+    size = int(np.ceil(n / max_bars))
+    starts = np.arange(0, n, size)
+    ends = np.minimum(starts + size, n) - 1
+    return (
+        times[starts],
+        open_[starts],
+        np.maximum.reduceat(high, starts),
+        np.minimum.reduceat(low, starts),
+        close[ends],
+    )
+
+
+def minmax_downsample(x, y, x_start, x_end, buckets):
+    """
+    Level-of-detail reduction of a line for display: the points between
+    x_start and x_end are split into buckets of equal x width (one per pixel
+    column) and only each bucket's lowest and highest point is kept, in their
+    original order. Peaks and troughs survive at any zoom level.
+
+    :return: (x, y) of at most 2 * buckets points, plus the neighbours just
+        outside the range so the line runs to the plot edges.
+    """
+    lo = max(int(np.searchsorted(x, x_start, side="left")) - 1, 0)
+    hi = min(int(np.searchsorted(x, x_end, side="right")) + 1, len(x))
+    x, y = x[lo:hi], y[lo:hi]
+    if len(x) <= 2 * buckets:
+        return x, y
+
+    edges = np.linspace(x[0], x[-1], buckets + 1)
+    starts = np.unique(np.searchsorted(x, edges[:-1], side="left"))
+    starts = starts[starts < len(x)]
+    counts = np.diff(np.append(starts, len(x)))
+
+    positions = np.arange(len(x))
+    mins = np.repeat(np.minimum.reduceat(y, starts), counts)
+    maxs = np.repeat(np.maximum.reduceat(y, starts), counts)
+    far = len(x)
+    min_pos = np.minimum.reduceat(np.where(y == mins, positions, far), starts)
+    max_pos = np.minimum.reduceat(np.where(y == maxs, positions, far), starts)
+
+    keep = np.unique(np.concatenate([min_pos, max_pos, [0, len(x) - 1]]))
+    return x[keep], y[keep]
+
+
+def load_candle_series(filepath):
+    """
+    CandleSeries for a candle CSV, from the dataset cache shared with the
+    backtest, so a file is parsed once until it changes.
+    """
+    from dataset_cache import default_cache
+    return default_cache().candle_series(filepath)
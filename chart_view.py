@@ -0,0 +1,134 @@
+import os
+import json
+import tempfile
+import plotly
+from plotly.offline import get_plotlyjs
+from PyQt5.QtWidgets import QDialog, QVBoxLayout
+from PyQt5.QtWebEngineWidgets import QWebEngineView
+from PyQt5.QtCore import QUrl
+from chart_data import downsample_ohlc
+
+MAX_CHART_BARS = 2000
+
+CHART_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<script>{plotlyjs}</script>
+<style>html, body, #chart {{ margin: 0; width: 100%; height: 100%; background: #111111; }}</style>
+</head>
+<body>
+<div id="chart"></div>
+<script>
+var layout = {{
+    title: {{text: "Candle Chart with Trade Points"}},
+    paper_bgcolor: "#111111",
+    plot_bgcolor: "#111111",
+    font: {{color: "white"}},
+    xaxis: {{title: {{text: "Datetime"}}, type: "date", rangeslider: {{visible: false}}, gridcolor: "#283442"}},
+    yaxis: {{title: {{text: "Price"}}, gridcolor: "#283442"}}
+}};
+
+function showCandles(data) {{
+    var traces = [{{
+        type: "candlestick",
+        x: data.x, open: data.open, high: data.high, low: data.low, close: data.close,
+        increasing: {{line: {{color: "limegreen"}}}},
+        decreasing: {{line: {{color: "tomato"}}}},
+        name: "Candles"
+    }}];
+    data.markers.forEach(function (m) {{
+        traces.push({{
+            type: "scatter", mode: "markers+text", x: [m.x], y: [m.y],
+            name: m.name, text: [m.text], textposition: "top center",
+            marker: {{color: m.color, size: 10, symbol: "circle"}}
+        }});
+    }});
+    Plotly.react("chart", traces, layout, {{responsive: true}});
+}}
+</script>
+</body>
+</html>
+"""
+
+
+def chart_page_path():
+    """
+    The chart page with plotly.js inlined, written once and reused so opening
+    a chart never re-exports the library.
+    """
+    path = os.path.join(
+        tempfile.gettempdir(), f"backtest_chart_{plotly.__version__}.html")
+    if not os.path.exists(path):
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(CHART_PAGE.format(plotlyjs=get_plotlyjs()))
+        os.replace(path + ".tmp", path)
+    return path
+
+
+class CandleChartView(QWebEngineView):
+    """
+    A single web view that loads the chart page once and afterwards only
+    receives candle windows as JSON.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.ready = False
+        self.pending = None
+        self.loadFinished.connect(self.onLoadFinished)
+        self.setUrl(QUrl.fromLocalFile(chart_page_path()))
+
+    def onLoadFinished(self, ok):
+        self.ready = ok
+        if ok and self.pending is not None:
+            self.page().runJavaScript(self.pending)
+            self.pending = None
+
+    def showWindow(self, series, window, markers=(), max_bars=MAX_CHART_BARS):
+        """
+        :param series: CandleSeries to draw from.
+        :param window: slice of candle positions to show.
+        :param markers: (position, name, text, color) tuples drawn at the High
+            of the candle at position.
+        """
+        times, open_, high, low, close = downsample_ohlc(
+            series.times[window],
+            series.open[window],
+            series.high[window],
+            series.low[window],
+            series.close[window],
+            max_bars
+        )
+        payload = {
+            "x": series.wall_clock_ms(times).tolist(),
+            "open": open_.tolist(),
+            "high": high.tolist(),
+            "low": low.tolist(),
+            "close": close.tolist(),
+            "markers": [
+                {
+                    "x": int(series.wall_clock_ms(series.times[position:position + 1])[0]),
+                    "y": float(series.high[position]),
+                    "name": name,
+                    "text": text,
+                    "color": color,
+                }
+                for position, name, text, color in markers
+            ],
+        }
+
+        script = f"showCandles({json.dumps(payload)});"
+        if self.ready:
+            self.page().runJavaScript(script)
+        else:
+            self.pending = script
+
+
+class CandleChartDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Candle Chart")
+        self.chartView = CandleChartView(self)
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.chartView)
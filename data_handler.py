@@ -1,6 +1,21 @@
 # data_handler.py
 import os
+import csv
 import pandas as pd
+import profiling
+from time_axis import to_epoch_ms
+from dataset_cache import default_cache
+
+
+def read_store(filepath):
+    """
+    A candle store as a frame indexed by Datetime as UTC epoch ms.
+    """
+    with profiling.span("data_handler.load", bytes=os.path.getsize(filepath)) as s:
+        data = pd.read_csv(filepath, index_col="Datetime")
+        data.index = pd.Index(to_epoch_ms(data.index.to_series()), name="Datetime")
+        s.set(rows=len(data))
+    return data
 
 
 class DataHandler:
@@ -24,6 +39,7 @@ class DataHandler:
         if not hasattr(self, "initialized"):  # Prevent reinitialization
             self.filepath = filepath
             self.data = None
+            self._pending = []
 
             # Ensure the directory exists
             os.makedirs(os.path.dirname(filepath), exist_ok=True)
@@ -45,24 +61,86 @@ class DataHandler:
 
     def load_data(self):
         """
-        Load data from the CSV file into memory, indexed by Datetime.
+        Load data from the CSV file into memory, indexed by Datetime as UTC
+        epoch ms. Files written with datetime strings are converted on load and
+        stored as epoch ms with the next save.
+
+        The frame comes from the dataset cache, changes made here copy it
+        first and leave the cached one as it is.
         """
         if os.path.exists(self.filepath):
-            self.data = pd.read_csv(self.filepath, parse_dates=[
-                                    "Datetime"], index_col="Datetime")
+            self.data = default_cache().get("store", self.filepath, read_store)
         else:
             # This should never happen due to _ensure_file_exists
             self.data = pd.DataFrame(
                 columns=["Datetime", "Open", "Close", "High", "Low", "Volume"])
 
     def get_data(self):
+        self._flush_pending()
         return self.data
 
     def save_data(self):
         """
         Save the in-memory data to the CSV file.
         """
-        self.data.to_csv(self.filepath)
+        self._flush_pending()
+        with profiling.span("data_handler.save", rows=len(self.data)) as s:
+            self.data.to_csv(self.filepath)
+            s.set(bytes=os.path.getsize(self.filepath))
+        # Readers of the file parse it again, except as a store, which is this frame
+        cache = default_cache()
+        cache.invalidate(self.filepath)
+        cache.put("store", self.filepath, self.data.copy(deep=False))
+
+    def _flush_pending(self):
+        """
+        Merge rows written by append() into the in-memory DataFrame in one concat.
+        """
+        if not self._pending:
+            return
+        pending = pd.DataFrame(self._pending).set_index("Datetime")
+        self._pending = []
+        if self.data.empty:
+            self.data = pending.reindex(columns=self.data.columns)
+        else:
+            self.data = pd.concat([self.data, pending], sort=False)
+
+    def _last_datetime(self):
+        if self._pending:
+            return self._pending[-1]["Datetime"]
+        if len(self.data.index) == 0:
+            return None
+        return int(self.data.index[-1])
+
+    def append(self, row):
+        """
+        Append a candle that is newer than everything stored.
+
+        The row is written as one line at the end of the CSV file and buffered in
+        memory, so live updates do not rewrite the whole file or copy the DataFrame
+        per candle. Rows that are not newer than the last stored candle fall back
+        to upsert() followed by a full save.
+
+        :param row: A dictionary representing a single row of data.
+        :return: "updated" or "created", like upsert().
+        """
+        datetime_index = to_epoch_ms(row["Datetime"])
+        last = self._last_datetime()
+
+        if last is not None and datetime_index <= last:
+            result = self.upsert(row)
+            self.save_data()
+            return result
+
+        values = [row.get(col) for col in self.data.columns]
+        with open(self.filepath, "a", newline="") as f:
+            csv.writer(f).writerow([datetime_index] + values)
+        default_cache().invalidate(self.filepath)
+
+        pending = dict(row)
+        pending["Datetime"] = datetime_index
+        self._pending.append(pending)
+        return "created"
 
     def upsert(self, row):
         """
@@ -71,8 +149,11 @@ class DataHandler:
         :param row: A dictionary representing a single row of data.
         :return: A string indicating whether the record was updated or created ("updated" or "created").
         """
+        self._flush_pending()
+
         # Convert Datetime to match DataFrame index
-        datetime_index = pd.to_datetime(row["Datetime"])
+        datetime_index = to_epoch_ms(row["Datetime"])
+        row = dict(row, Datetime=datetime_index)
 
         if datetime_index in self.data.index:
             # Update the existing record
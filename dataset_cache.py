@@ -0,0 +1,184 @@
+"""
+Process-wide cache of loaded datasets: candle frames, signal frames and
+chart series, parsed once per file version and shared by the backtest, the
+data viewer, the charts and the DataHandler.
+"""
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import profiling
+from frame_memory import frame_bytes
+
+# Memory the cached datasets may hold (MB), least recently used dropped first
+DATASET_CACHE_MB = float(os.environ.get("BACKTEST_DATASET_CACHE_MB", "1024"))
+
+
+def file_version(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _size_of(value):
+    if isinstance(value, pd.DataFrame):
+        return frame_bytes(value)
+    return sum(array.nbytes for array in vars(value).values() if isinstance(array, np.ndarray))
+
+
+def _freeze(value):
+    # Arrays of cached objects are shared by every caller
+    if not isinstance(value, pd.DataFrame):
+        for array in vars(value).values():
+            if isinstance(array, np.ndarray):
+                array.flags.writeable = False
+    return value
+
+
+# Cached frames are shared as shallow copies, which only copy-on-write keeps
+# apart from the cache: the default from pandas 3, an option before it
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+
+def _view(value):
+    # A shallow copy shares the data, changes made to it copy first instead
+    # of reaching the cached frame
+    return value.copy(deep=False) if isinstance(value, pd.DataFrame) else value
+
+
+class DatasetCache:
+    """
+    Datasets by kind and file path, valid while the file's modification time
+    and size are unchanged. Frames are handed out as copy-on-write views
+    (pandas 3, or pandas 2 with mode.copy_on_write, which this module turns
+    on) and the arrays of other datasets are read-only.
+
+    A file is parsed once even when several threads ask for it together.
+    """
+
+    def __init__(self, max_bytes=int(DATASET_CACHE_MB * 2**20)):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # (kind, path) -> (version, value, bytes)
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self.lock = threading.Lock()
+        self.loading = {}
+
+    def get(self, kind, path, loader):
+        """
+        The dataset loader(path) gives, loaded again only when the file changed.
+        """
+        try:
+            version = file_version(path)
+        except (OSError, TypeError):
+            return loader(path)  # The loader reports the missing file
+        key = (kind, os.path.abspath(path))
+
+        with self.lock:
+            value = self._lookup(key, version)
+            if value is not None:
+                return _view(value)
+            key_lock = self.loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self.lock:
+                # Another thread may have loaded it meanwhile
+                value = self._lookup(key, version)
+                if value is not None:
+                    return _view(value)
+                self.misses += 1
+
+            with profiling.span("dataset_cache.load", kind=kind) as s:
+                value = _freeze(loader(path))
+                size = _size_of(value)
+                s.set(bytes=size)
+            with self.lock:
+                self._store(key, version, value, size)
+                self.loading.pop(key, None)
+        return _view(value)
+
+    def put(self, kind, path, value):
+        """
+        Cache value as the current version of path, e.g. after writing it.
+        """
+        value = _freeze(value)
+        with self.lock:
+            self._store((kind, os.path.abspath(path)), file_version(path), value, _size_of(value))
+
+    def _lookup(self, key, version):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def _store(self, key, version, value, size):
+        self._drop(key)
+        if size > self.max_bytes:
+            return  # Would push everything else out, handed out uncached
+        self.entries[key] = (version, value, size)
+        self.bytes += size
+        self._evict()
+
+    def _drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self.entries:
+            _, (_, _, size) = self.entries.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def resize(self, max_bytes):
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def invalidate(self, path=None):
+        """
+        Forget every dataset of path, or everything.
+        """
+        with self.lock:
+            if path is None:
+                self.entries.clear()
+                self.bytes = 0
+                return
+            path = os.path.abspath(path)
+            for key in [key for key in self.entries if key[1] == path]:
+                self._drop(key)
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.bytes,
+                    "max_bytes": self.max_bytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+    # Datasets of the app, also the datasets argument of backtest.run_pipeline
+
+    def candles(self, path):
+        from backtest import load_candles
+        return self.get("candles", path, load_candles)
+
+    def signals(self, path):
+        from backtest import load_signals
+        return self.get("signals", path, load_signals)
+
+    def candle_series(self, path):
+        from chart_data import CandleSeries
+        return self.get("series", path, lambda path: CandleSeries(self.candles(path)))
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = DatasetCache()
+        return _default
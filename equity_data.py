@@ -0,0 +1,82 @@
+import numpy as np
+from time_axis import to_epoch_ms
+
+
+def trade_equity(trades_df, initial_capital):
+    """
+    Realized equity after each trade, stepping at the trades' close times.
+
+    Equity is the initial capital plus the running sum of Profit_Loss, which
+    equals the recorded capital path when compounding and stays meaningful
+    without it (where capital is reset before every trade).
+
+    :return: (times in epoch ms, equity), starting with the initial capital
+        at the first trade's open time.
+    """
+    if trades_df is None or trades_df.empty:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    close_times = to_epoch_ms(trades_df["Close_Time"])
+    order = np.argsort(close_times, kind="stable")
+    equity = initial_capital + np.cumsum(
+        trades_df["Profit_Loss"].to_numpy(np.float64)[order])
+
+    first_open = to_epoch_ms(trades_df["Datetime"]).min()
+    times = np.concatenate([[first_open], close_times[order]])
+    return times, np.concatenate([[initial_capital], equity])
+
+
+def mark_to_market_equity(series, trades_df, initial_capital, leverage, with_compounding=True):
+    """
+    Equity on every candle of series: realized P&L of closed trades plus the
+    unrealized P&L of trades open on that candle, valued at its close.
+
+    Each open trade contributes a * close + b with a = size * side / entry and
+    b = -size * side, so all trades are summed with two difference arrays and a
+    cumulative sum instead of a loop over candles. Position size uses the
+    realized equity at the trade's open (or the initial capital without
+    compounding), which approximates the size the engine applies at close.
+
+    :return: (times in epoch ms, equity) aligned with series.times.
+    """
+    n = len(series)
+    if trades_df is None or trades_df.empty or n == 0:
+        return series.times, np.full(n, float(initial_capital))
+
+    open_idx = np.searchsorted(series.times, to_epoch_ms(trades_df["Datetime"]))
+    close_idx = np.searchsorted(series.times, to_epoch_ms(trades_df["Close_Time"]))
+    profit = trades_df["Profit_Loss"].to_numpy(np.float64)
+    entry = trades_df["Trade Open Price"].to_numpy(np.float64)
+    side = np.where(trades_df["Direction"].astype(str).to_numpy() == "BUY", 1.0, -1.0)
+
+    # Realized equity steps up on each trade's close candle
+    realized_steps = np.zeros(n + 1)
+    np.add.at(realized_steps, close_idx, profit)
+    realized = initial_capital + np.cumsum(realized_steps[:n])
+
+    if with_compounding:
+        capital_at_open = realized[np.minimum(open_idx, n - 1)]
+    else:
+        capital_at_open = np.full(len(entry), float(initial_capital))
+    size = capital_at_open * leverage
+
+    # Unrealized P&L while open: candles open_idx .. close_idx - 1
+    slope = np.zeros(n + 1)
+    offset = np.zeros(n + 1)
+    np.add.at(slope, open_idx, size * side / entry)
+    np.add.at(slope, close_idx, -size * side / entry)
+    np.add.at(offset, open_idx, -size * side)
+    np.add.at(offset, close_idx, size * side)
+    unrealized = np.cumsum(slope[:n]) * series.close + np.cumsum(offset[:n])
+
+    return series.times, realized + unrealized
+
+
+def drawdown(equity):
+    """
+    Fractional drawdown from the running peak (0 at new highs, negative below).
+    """
+    if len(equity) == 0:
+        return np.empty(0)
+    peak = np.maximum.accumulate(equity)
+    return np.where(peak > 0, equity / peak - 1.0, 0.0)
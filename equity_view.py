@@ -0,0 +1,111 @@
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_qt5agg import (
+    FigureCanvasQTAgg, NavigationToolbar2QT
+)
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QCheckBox
+from PyQt5.QtCore import QTimer
+from chart_data import minmax_downsample
+from equity_data import trade_equity, mark_to_market_equity, drawdown
+
+MS_PER_DAY = 86400000.0
+
+
+class EquityPanel(QDialog):
+    """
+    Equity and drawdown of a backtest with zoom and pan. Only a min/max
+    reduction of the visible range is drawn, recomputed for the current
+    pixel width whenever the x range changes.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Equity & Drawdown")
+        self.resize(1200, 700)
+
+        self.figure = Figure(facecolor="#111111")
+        self.canvas = FigureCanvasQTAgg(self.figure)
+        self.equityAxes = self.figure.add_subplot(2, 1, 1)
+        self.drawdownAxes = self.figure.add_subplot(
+            2, 1, 2, sharex=self.equityAxes)
+        for axes in (self.equityAxes, self.drawdownAxes):
+            axes.set_facecolor("#111111")
+            axes.tick_params(colors="white")
+            axes.grid(color="#283442")
+            axes.xaxis_date()
+        self.equityAxes.set_ylabel("Equity", color="white")
+        self.drawdownAxes.set_ylabel("Drawdown %", color="white")
+        self.equityLine, = self.equityAxes.plot([], [], color="limegreen", lw=1)
+        self.drawdownLine, = self.drawdownAxes.plot([], [], color="tomato", lw=1)
+
+        self.markToMarketCheck = QCheckBox("Mark to market per candle")
+        self.markToMarketCheck.toggled.connect(self.recompute)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(NavigationToolbar2QT(self.canvas, self))
+        layout.addWidget(self.markToMarketCheck)
+        layout.addWidget(self.canvas)
+
+        # Coalesce the burst of limit changes a pan or zoom produces
+        self.lodTimer = QTimer(self)
+        self.lodTimer.setSingleShot(True)
+        self.lodTimer.setInterval(30)
+        self.lodTimer.timeout.connect(self.updateLevelOfDetail)
+        self.equityAxes.callbacks.connect(
+            "xlim_changed", lambda axes: self.lodTimer.start())
+
+        self.x = np.empty(0)
+        self.equity = np.empty(0)
+        self.drawdown = np.empty(0)
+        self.trades_df = None
+        self.series = None
+
+    def setRun(self, trades_df, series, initial_capital, leverage, with_compounding):
+        """
+        :param series: CandleSeries of the run's candle file, used for mark to market.
+        """
+        self.trades_df = trades_df
+        self.series = series
+        self.initial_capital = initial_capital
+        self.leverage = leverage
+        self.with_compounding = with_compounding
+        self.markToMarketCheck.setEnabled(series is not None)
+        self.recompute()
+
+    def recompute(self):
+        if self.markToMarketCheck.isChecked() and self.series is not None:
+            times, equity = mark_to_market_equity(
+                self.series, self.trades_df, self.initial_capital,
+                self.leverage, self.with_compounding)
+        else:
+            times, equity = trade_equity(self.trades_df, self.initial_capital)
+
+        if self.series is not None and len(times):
+            times = self.series.wall_clock_ms(times)
+        self.x = times / MS_PER_DAY  # matplotlib date numbers
+        self.equity = equity
+        self.drawdown = drawdown(equity) * 100
+
+        if len(self.x):
+            self.equityAxes.set_xlim(self.x[0], self.x[-1] if len(self.x) > 1 else self.x[0] + 1)
+        self.updateLevelOfDetail()
+
+    def updateLevelOfDetail(self):
+        if len(self.x) == 0:
+            self.equityLine.set_data([], [])
+            self.drawdownLine.set_data([], [])
+            self.canvas.draw_idle()
+            return
+
+        x_start, x_end = self.equityAxes.get_xlim()
+        buckets = max(int(self.equityAxes.bbox.width), 100)
+        x, equity = minmax_downsample(self.x, self.equity, x_start, x_end, buckets)
+        self.equityLine.set_data(x, equity)
+        x, dd = minmax_downsample(self.x, self.drawdown, x_start, x_end, buckets)
+        self.drawdownLine.set_data(x, dd)
+
+        self.equityAxes.relim()
+        self.equityAxes.autoscale_view(scalex=False)
+        self.drawdownAxes.relim()
+        self.drawdownAxes.autoscale_view(scalex=False)
+        self.canvas.draw_idle()
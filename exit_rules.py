@@ -0,0 +1,216 @@
+import numpy as np
+import pandas as pd
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+class ExitRule:
+    """
+    An exit on top of a trade's fixed TP and SL.
+
+    Rules work on a block of the trade's candles at once. A rule either moves
+    the stop (stop() returns a stop level per candle, NaN where it has none)
+    or closes the trade at a candle's Close (close_exit() returns a mask).
+    Stops are worked out from the best price of the candles before, the order
+    of prices within a candle is unknown.
+    """
+    name = None
+    uses_close = False
+
+    def stop(self, trade, best):
+        """
+        :param best: Highest High (BUY) or lowest Low (SELL) since the trade
+            opened, before each candle, starting at the entry price.
+        """
+        return None
+
+    def close_exit(self, trade, window):
+        return None
+
+    def config(self):
+        return {"rule": self.name, **vars(self)}
+
+
+class TrailingStop(ExitRule):
+    name = "trailing_stop"
+
+    def __init__(self, percent):
+        self.percent = float(percent)
+
+    def stop(self, trade, best):
+        if trade['Direction'] == "BUY":
+            return best * (1 - self.percent / 100)
+        return best * (1 + self.percent / 100)
+
+
+class BreakEven(ExitRule):
+    """
+    Moves the stop to the entry price (plus offset_percent) once the price
+    has gone trigger_percent in the trade's favour.
+    """
+    name = "break_even"
+
+    def __init__(self, trigger_percent, offset_percent=0.0):
+        self.trigger_percent = float(trigger_percent)
+        self.offset_percent = float(offset_percent)
+
+    def stop(self, trade, best):
+        entry = trade['Entry_Price']
+        if trade['Direction'] == "BUY":
+            reached = best >= entry * (1 + self.trigger_percent / 100)
+            return np.where(reached, entry * (1 + self.offset_percent / 100), np.nan)
+        reached = best <= entry * (1 - self.trigger_percent / 100)
+        return np.where(reached, entry * (1 - self.offset_percent / 100), np.nan)
+
+
+class MaxBars(ExitRule):
+    """
+    Closes the trade at the Close of its bars-th candle after the one it opened on.
+    """
+    name = "max_bars"
+    uses_close = True
+
+    def __init__(self, bars):
+        self.bars = int(bars)
+
+    def close_exit(self, trade, window):
+        return window.bars >= self.bars
+
+
+class SessionClose(ExitRule):
+    """
+    Closes the trade at the Close of the candle the session ends in.
+
+    :param time: Session end as "HH:MM".
+    :param tz: Timezone the session end is in.
+    """
+    name = "session_close"
+    uses_close = True
+
+    def __init__(self, time="00:00", tz="UTC"):
+        self.time = time
+        self.tz = tz
+        hours, minutes = (int(part) for part in time.split(":"))
+        self._offset_ms = (hours * 60 + minutes) * 60 * 1000
+
+    def config(self):
+        return {"rule": self.name, "time": self.time, "tz": self.tz}
+
+    def close_exit(self, trade, window):
+        local = window.times
+        if self.tz != "UTC":
+            wall = pd.to_datetime(local, unit="ms", utc=True).tz_convert(self.tz).tz_localize(None)
+            local = ((wall - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1)).to_numpy(np.int64)
+        # The session end falls within (open, open + interval]
+        start_day = (local - self._offset_ms) // DAY_MS
+        end_day = (local + window.interval_ms - self._offset_ms) // DAY_MS
+        return end_day > start_day
+
+
+RULES = {rule.name: rule for rule in (TrailingStop, BreakEven, MaxBars, SessionClose)}
+
+
+def from_config(configs):
+    """
+    Exit rules from their declarative form, e.g.
+    [{"rule": "trailing_stop", "percent": 1.5}, {"rule": "max_bars", "bars": 48}]
+    """
+    rules = []
+    for config in configs or []:
+        config = dict(config)
+        name = config.pop("rule")
+        if name not in RULES:
+            raise ValueError(f"Unknown exit rule {name!r}")
+        rules.append(RULES[name](**config))
+    return rules
+
+
+class _Window:
+    __slots__ = ("times", "bars", "interval_ms")
+
+    def __init__(self, times, bars, interval_ms):
+        self.times = times
+        self.bars = bars
+        self.interval_ms = interval_ms
+
+
+class ExitScan:
+    """
+    Finds the candle an open trade exits on under its TP, SL and the exit
+    rules, looking ahead over blocks of candles with array operations rather
+    than one candle at a time. Blocks grow while the trade stays open.
+
+    What the scan has seen so far (best price, bar count) is kept, so a scan
+    that reaches the end of one chunk of candles picks up at the start of the
+    next.
+    """
+    FIRST_BLOCK = 64
+    MAX_BLOCK = 1 << 16
+
+    def __init__(self, trade, rules, interval_ms, skip_until):
+        """
+        :param skip_until: Candles at or before this time are in the trade's
+            skip window and can't close it.
+        """
+        self.trade = trade
+        self.rules = rules
+        self.interval_ms = interval_ms
+        self.skip_until = skip_until
+        self.buy = trade['Direction'] == "BUY"
+        self.best = trade['Entry_Price']
+        self.bars = 1  # Bars since the open candle, of the next candle scanned
+        self.block = self.FIRST_BLOCK
+
+    def scan(self, times, high, low, close, start):
+        """
+        :return: (position, price, reason) of the exit at or after start,
+            or None when the trade is still open after the last candle.
+            reason is "Take_Profit", "Stop_Loss" or "Close".
+        """
+        trade = self.trade
+        take_profit = trade['Take_Profit']
+        while start < len(times):
+            stop_at = min(start + self.block, len(times))
+            self.block = min(self.block * 2, self.MAX_BLOCK)
+            block_times = times[start:stop_at]
+            block_high = high[start:stop_at]
+            block_low = low[start:stop_at]
+            eligible = block_times > self.skip_until
+
+            if self.buy:
+                moves = np.where(eligible, block_high, -np.inf)
+                best = np.maximum.accumulate(np.concatenate([[self.best], moves[:-1]]))
+                tp_hit = block_high >= take_profit
+            else:
+                moves = np.where(eligible, block_low, np.inf)
+                best = np.minimum.accumulate(np.concatenate([[self.best], moves[:-1]]))
+                tp_hit = block_low <= take_profit
+
+            stop = np.full(len(block_times), trade['Stop_Loss'], dtype=np.float64)
+            window = None
+            close_hit = np.zeros(len(block_times), dtype=bool)
+            for rule in self.rules:
+                levels = rule.stop(trade, best)
+                if levels is not None:
+                    stop = np.fmax(stop, levels) if self.buy else np.fmin(stop, levels)
+                if window is None:
+                    window = _Window(
+                        block_times, self.bars + np.arange(len(block_times)), self.interval_ms)
+                mask = rule.close_exit(trade, window)
+                if mask is not None:
+                    close_hit |= mask
+            stop_hit = block_low <= stop if self.buy else block_high >= stop
+
+            exits = eligible & (tp_hit | stop_hit | close_hit)
+            if exits.any():
+                k = int(np.argmax(exits))
+                if tp_hit[k]:
+                    return start + k, take_profit, "Take_Profit"
+                if stop_hit[k]:
+                    return start + k, float(stop[k]), "Stop_Loss"
+                return start + k, float(close[start + k]), "Close"
+
+            self.best = max(best[-1], moves[-1]) if self.buy else min(best[-1], moves[-1])
+            self.bars += len(block_times)
+            start = stop_at
+        return None
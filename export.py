@@ -0,0 +1,279 @@
+import io
+import os
+import json
+import shutil
+import datetime
+import numpy as np
+import pandas as pd
+import profiling
+from time_axis import format_times
+
+CHUNK_ROWS = 100_000
+
+# Columnar format: a directory per table with one .npy file per column and a schema.json
+COLUMNAR_EXTENSION = ".btcol"
+FORMATS = ("csv", "columnar")
+
+
+class ExportCancelled(Exception):
+    """Raised when an export is stopped through its should_stop callback."""
+
+
+def _chunks(total, chunk_rows):
+    for start in range(0, total, chunk_rows):
+        yield start, min(start + chunk_rows, total)
+
+
+class _Progress:
+    """
+    Rows written across every table of an export, reported to a
+    callback(rows_written, rows_total).
+    """
+
+    def __init__(self, total, progress=None, should_stop=None):
+        self.total = total
+        self.done = 0
+        self.progress = progress
+        self.should_stop = should_stop
+
+    def advance(self, rows):
+        if self.should_stop is not None and self.should_stop():
+            raise ExportCancelled()
+        self.done += rows
+        if self.progress is not None:
+            self.progress(self.done, self.total)
+
+
+def write_csv(path, frame, tracker=None, chunk_rows=CHUNK_ROWS):
+    """
+    Stream frame to a CSV file chunk by chunk, only one chunk is ever
+    formatted in memory.
+    """
+    tz_columns = [
+        name for name, dtype in frame.dtypes.items() if isinstance(dtype, pd.DatetimeTZDtype)]
+
+    with profiling.span("export.csv", rows=len(frame)), open(path, "w", newline="") as f:
+        if frame.empty:
+            frame.to_csv(f, index=False)
+        for start, stop in _chunks(len(frame), chunk_rows):
+            chunk = frame.iloc[start:stop]
+            if tz_columns:
+                formatted = {name: format_times(chunk[name]) for name in tz_columns}
+                formatted = {name: text for name, text in formatted.items() if text is not None}
+                if formatted:
+                    chunk = chunk.assign(**formatted)
+            chunk.to_csv(f, index=False, header=start == 0)
+            if tracker is not None:
+                tracker.advance(stop - start)
+
+
+def _column_encoding(series):
+    """
+    How a column is stored: (kind, numpy dtype, extra schema fields).
+    """
+    dtype = series.dtype
+    if isinstance(dtype, pd.DatetimeTZDtype):
+        return "datetime", np.dtype("datetime64[ns]"), {"tz": str(dtype.tz)}
+    if pd.api.types.is_datetime64_dtype(dtype):
+        return "datetime", np.dtype("datetime64[ns]"), {"tz": None}
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_numeric_dtype(dtype):
+        # Nullable extension types are stored as float64 with NaN for missing values
+        return "numeric", dtype if isinstance(dtype, np.dtype) else np.dtype(np.float64), {}
+    # Strings and anything else are dictionary encoded
+    return "category", np.dtype(np.int32), {}
+
+
+def _encode_chunk(kind, dtype, chunk, categories):
+    if kind == "datetime":
+        if isinstance(chunk.dtype, pd.DatetimeTZDtype):
+            chunk = chunk.dt.tz_convert("UTC").dt.tz_localize(None)
+        return chunk.to_numpy().astype("datetime64[ns]")
+    if kind == "numeric":
+        return chunk.to_numpy(dtype=dtype, na_value=np.nan) if dtype.kind == "f" else chunk.to_numpy()
+    # Codes within the chunk, then the chunk's few distinct values mapped onto
+    # the table-wide categories; missing values are a null category
+    chunk_codes, uniques = pd.factorize(chunk, use_na_sentinel=False)
+    mapping = np.empty(len(uniques), dtype=np.int32)
+    for i, value in enumerate(np.asarray(uniques, dtype=object)):
+        key = None if pd.isna(value) else str(value)
+        mapping[i] = categories.setdefault(key, len(categories))
+    return mapping[chunk_codes]
+
+
+def write_columnar(directory, frame, tracker=None, chunk_rows=CHUNK_ROWS):
+    """
+    Write frame as a columnar table: one preallocated .npy per column, filled
+    chunk by chunk, plus schema.json. Tables can be read back memory mapped.
+    """
+    os.makedirs(directory, exist_ok=True)
+    total = len(frame)
+    schema = {"rows": total, "columns": []}
+
+    with profiling.span("export.columnar", rows=total):
+        encodings = []
+        for position, name in enumerate(frame.columns):
+            kind, dtype, extra = _column_encoding(frame[name])
+            filename = f"{position:03d}.npy"
+            column_path = os.path.join(directory, filename)
+            if total:
+                column = np.lib.format.open_memmap(
+                    column_path, mode="w+", dtype=dtype, shape=(total,))
+            else:
+                # An empty file can't be memory mapped
+                column = np.empty(0, dtype=dtype)
+                np.save(column_path, column)
+            encodings.append((name, kind, dtype, column, {}))
+            schema["columns"].append(dict(name=str(name), kind=kind, file=filename, **extra))
+
+        for start, stop in _chunks(total, chunk_rows):
+            for position, (name, kind, dtype, column, categories) in enumerate(encodings):
+                column[start:stop] = _encode_chunk(
+                    kind, dtype, frame.iloc[start:stop, position], categories)
+            if tracker is not None:
+                tracker.advance(stop - start)
+
+        for spec, (_, kind, _, column, categories) in zip(schema["columns"], encodings):
+            if isinstance(column, np.memmap):
+                column.flush()
+            if kind == "category":
+                spec["categories"] = list(categories)
+        del encodings
+
+    with open(os.path.join(directory, "schema.json"), "w") as f:
+        json.dump(schema, f, indent=2)
+
+
+def read_columnar(directory, mmap=True):
+    """
+    Load a table written by write_columnar back into a DataFrame.
+    """
+    with open(os.path.join(directory, "schema.json"), "r") as f:
+        schema = json.load(f)
+
+    columns = {}
+    for spec in schema["columns"]:
+        values = np.load(os.path.join(directory, spec["file"]),
+                         mmap_mode="r" if mmap else None)
+        if spec["kind"] == "datetime":
+            values = pd.DatetimeIndex(values)
+            if spec["tz"]:
+                values = values.tz_localize("UTC").tz_convert(spec["tz"])
+        elif spec["kind"] == "category":
+            values = np.asarray(spec["categories"], dtype=object)[values]
+        columns[spec["name"]] = values
+    return pd.DataFrame(columns)
+
+
+def npz_bytes(frame):
+    """
+    frame as an uncompressed .npz archive with one array per column, which
+    numpy.load reads without pickle: times as UTC datetime64[ns], text as
+    unicode arrays.
+    """
+    arrays = {}
+    for name in frame.columns:
+        kind, dtype, _ = _column_encoding(frame[name])
+        if kind == "category":
+            arrays[str(name)] = frame[name].astype(str).to_numpy(dtype=str)
+        else:
+            arrays[str(name)] = _encode_chunk(kind, dtype, frame[name], None)
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def run_metadata(formData=None, summary=None, **extra):
+    from trade_simulation import ENGINE_VERSION
+
+    meta = {
+        "exported_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "engine_version": ENGINE_VERSION,
+        "parameters": formData or {},
+        "summary": summary or {},
+    }
+    meta.update(extra)
+    return meta
+
+
+def _run_paths(path, fmt):
+    """
+    Files of a single run export. For CSV, path is the trades file and the
+    stats and metadata sit next to it; for columnar, path is a directory.
+    """
+    if fmt == "csv":
+        stem = os.path.splitext(path)[0]
+        return path, f"{stem}_stats.csv", f"{stem}_meta.json"
+    return (os.path.join(path, "trades"), os.path.join(path, "stats"),
+            os.path.join(path, "meta.json"))
+
+
+def export_run(path, trades_df, stats, meta, fmt="csv", progress=None, should_stop=None,
+               chunk_rows=CHUNK_ROWS, tracker=None):
+    """
+    Write the trade log, stats rows and metadata of one backtest.
+
+    :param fmt: "csv" or "columnar".
+    :param progress: Optional callback(rows_written, rows_total).
+    :param should_stop: Optional callable; the export raises ExportCancelled
+        at the next chunk after it returns True.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}")
+    trades_df = trades_df if trades_df is not None else pd.DataFrame()
+    stats_df = pd.DataFrame(stats or [])
+    if tracker is None:
+        tracker = _Progress(len(trades_df) + len(stats_df), progress, should_stop)
+
+    trades_path, stats_path, meta_path = _run_paths(path, fmt)
+    if fmt == "csv":
+        write_csv(trades_path, trades_df, tracker, chunk_rows)
+        write_csv(stats_path, stats_df, tracker, chunk_rows)
+    else:
+        write_columnar(trades_path, trades_df, tracker, chunk_rows)
+        write_columnar(stats_path, stats_df, tracker, chunk_rows)
+
+    meta = dict(meta, trades=len(trades_df), format=fmt)
+    with open(meta_path, "w") as f:
+        json.dump(meta, f, indent=2, default=str)
+    return path
+
+
+def export_sweep(directory, runs, fmt="csv", progress=None, should_stop=None,
+                 chunk_rows=CHUNK_ROWS):
+    """
+    Write many runs as one dataset partitioned by run: run=<id>/ holds each
+    run's export and runs.csv lists every run's parameters and summary.
+
+    :param runs: Iterable of dicts with run_id, formData, summary, stats and
+        trades_df. It is consumed lazily, so it can be a generator loading one
+        run at a time.
+    :param progress: Optional callback(rows_written, runs_written).
+    """
+    os.makedirs(directory, exist_ok=True)
+    index = []
+    rows_written = 0
+
+    for count, run in enumerate(runs, 1):
+        partition = os.path.join(directory, f"run={run['run_id']}")
+        if os.path.isdir(partition):
+            shutil.rmtree(partition)
+        os.makedirs(partition)
+
+        trades_df = run.get("trades_df")
+        tracker = _Progress(0, None, should_stop)
+        target = os.path.join(partition, "trades.csv") if fmt == "csv" else partition
+        export_run(target, trades_df, run.get("stats"),
+                   run_metadata(run.get("formData"), run.get("summary"), run_id=run["run_id"]),
+                   fmt=fmt, chunk_rows=chunk_rows, tracker=tracker)
+
+        rows_written += tracker.done
+        entry = {"run_id": run["run_id"]}
+        entry.update({f"param.{k}": v for k, v in (run.get("formData") or {}).items()})
+        entry.update(run.get("summary") or {})
+        index.append(entry)
+        if progress is not None:
+            progress(rows_written, count)
+
+    with profiling.span("export.sweep_index", rows=len(index)):
+        pd.DataFrame(index).to_csv(os.path.join(directory, "runs.csv"), index=False)
+    return directory
@@ -0,0 +1,185 @@
+"""
+Compact in-memory layouts for candle and trade frames, and a memory budget
+report for candle files:
+
+    python frame_memory.py data/BTCUSDT--all.csv data/ETHUSDT--all.csv --budget 4g
+"""
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from time_axis import to_epoch_ms
+
+CANDLE_PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+MAX_DECIMALS = 8
+# float32 is exact to about 2^-24 relative; below 2^23 units of the last decimal
+# its error stays under half a unit, so rounding recovers the stored value
+FLOAT32_UNITS = 2 ** 23
+SAMPLE_ROWS = 100_000
+
+# Signal direction codes; DIRECTION_LABELS[code] is the label (-1 wraps to "SELL")
+NO_DIRECTION, BUY, SELL = 0, 1, -1
+DIRECTION_LABELS = np.array(["NaN", "BUY", "SELL"], dtype=object)
+
+TRADE_CATEGORIES = {
+    "Direction": ["BUY", "SELL"],
+    "Result": ["PROFIT", "LOSS"],
+    "Closed_Normally": ["yes", "no"],
+}
+
+
+def price_decimals(values):
+    """
+    Fewest decimals all values are written with, when float32 can hold them
+    exactly enough to be recovered by rounding; None otherwise.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    finite = values[np.isfinite(values)]
+    if not len(finite):
+        return None
+    largest = np.abs(finite).max()
+    # A sample rules out most decimals cheaply, the full column confirms the pick
+    sample = finite[::max(1, len(finite) // SAMPLE_ROWS)]
+    for decimals in range(MAX_DECIMALS + 1):
+        if largest * 10 ** decimals >= FLOAT32_UNITS:
+            return None
+        if np.array_equal(np.round(sample, decimals), sample) and \
+                np.array_equal(np.round(finite, decimals), finite):
+            return decimals
+    return None
+
+
+def compact_candles(candles_df):
+    """
+    Candles with Datetime as int64 epoch ms and each price column as float32
+    where price_decimals() allows it. The decimals of the float32 columns are
+    kept in attrs["price_decimals"]; read prices back with price_array().
+    """
+    columns = {}
+    decimals = {}
+    for column in candles_df.columns:
+        values = candles_df[column]
+        if column == "Datetime":
+            values = to_epoch_ms(values)
+        elif column in CANDLE_PRICE_COLUMNS and values.dtype == np.float64:
+            places = price_decimals(values.to_numpy())
+            if places is not None:
+                values = values.to_numpy(np.float32)
+                decimals[column] = places
+        columns[column] = values
+    compact = pd.DataFrame(columns)
+    compact.attrs["price_decimals"] = decimals
+    return compact
+
+
+def price_array(candles_df, column):
+    """
+    float64 prices of a column, the exact values read from the file even when
+    the column is held as float32.
+    """
+    values = candles_df[column].to_numpy(np.float64)
+    decimals = candles_df.attrs.get("price_decimals", {}).get(column)
+    if decimals is not None:
+        values = np.round(values, decimals)
+    return values
+
+
+def direction_codes(buy, sell):
+    """
+    int8 direction code per signal, BUY taking precedence like the engine.
+    """
+    return np.where(buy, BUY, np.where(sell, SELL, NO_DIRECTION)).astype(np.int8)
+
+
+def categorize_trades(trades_df):
+    """
+    Label columns of a trade frame as categoricals with fixed categories, so
+    frames of partial results still concatenate to categoricals.
+    """
+    for column, categories in TRADE_CATEGORIES.items():
+        if column in trades_df.columns:
+            trades_df[column] = pd.Categorical(trades_df[column], categories=categories)
+    return trades_df
+
+
+def frame_bytes(df):
+    """
+    Bytes held by a DataFrame, index and string contents included.
+    """
+    if df is None:
+        return 0
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def memory_report(**frames):
+    """
+    Rows, bytes and bytes per row of each named frame, plus a total row.
+    """
+    rows = []
+    for name, df in frames.items():
+        size = frame_bytes(df)
+        count = 0 if df is None else len(df)
+        rows.append({"Frame": name, "Rows": count, "Bytes": size,
+                     "Bytes/Row": size / count if count else 0.0})
+    rows.append({"Frame": "Total", "Rows": sum(r["Rows"] for r in rows),
+                 "Bytes": sum(r["Bytes"] for r in rows), "Bytes/Row": 0.0})
+    return rows
+
+
+def candle_file_bytes(path, chunk_rows=1_000_000):
+    """
+    (rows, bytes as read by pandas, bytes compacted) of a candle file, read
+    chunk by chunk so files larger than memory can be sized.
+    """
+    rows = loaded = 0
+    largest, decimals = {}, {}
+    for chunk in pd.read_csv(path, chunksize=chunk_rows):
+        rows += len(chunk)
+        loaded += frame_bytes(chunk)
+        for column in CANDLE_PRICE_COLUMNS:
+            if column not in chunk.columns:
+                continue
+            values = chunk[column].to_numpy(np.float64)
+            places = price_decimals(values) if chunk[column].dtype == np.float64 else None
+            largest[column] = max(largest.get(column, 0.0), float(np.nanmax(np.abs(values))))
+            decimals[column] = None if places is None or decimals.get(column, 0) is None \
+                else max(decimals.get(column, 0), places)
+
+    # 8 bytes for the int64 times and the RangeIndex's fixed overhead aside
+    per_row = 8
+    for column in largest:
+        float32 = decimals[column] is not None and largest[column] * 10 ** decimals[column] < FLOAT32_UNITS
+        per_row += 4 if float32 else 8
+    return rows, loaded, rows * per_row
+
+
+def _parse_bytes(text):
+    text = text.strip().lower().rstrip("b")
+    multiplier = {"k": 2**10, "m": 2**20, "g": 2**30, "t": 2**40}.get(text[-1:], 1)
+    return int(float(text.rstrip("kmgt")) * multiplier)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="+", help="Candle files")
+    parser.add_argument("--budget", type=_parse_bytes, help="Memory budget, e.g. 4g")
+    args = parser.parse_args(argv)
+
+    total_loaded = total_compact = 0
+    print(f"{'File':<40} {'Rows':>14} {'Loaded MiB':>12} {'Compact MiB':>12}")
+    for path in args.files:
+        rows, loaded, compact = candle_file_bytes(path)
+        total_loaded += loaded
+        total_compact += compact
+        print(f"{path:<40} {rows:>14,} {loaded / 2**20:>12,.1f} {compact / 2**20:>12,.1f}")
+    print(f"{'Total':<40} {'':>14} {total_loaded / 2**20:>12,.1f} {total_compact / 2**20:>12,.1f}")
+
+    if args.budget:
+        fits = total_compact <= args.budget
+        print(f"Compact candles {'fit' if fits else 'do not fit'} in {args.budget / 2**20:,.0f} MiB")
+        return 0 if fits else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,521 @@
+import os
+import copy
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import profiling
+from time_axis import to_epoch_ms
+from frame_memory import price_array
+
+
+# Kernels. Each works on whole arrays and can continue from the state the
+# previous call ended with, so a series can be extended by new candles only.
+
+def _ewm(values, alpha, prev=None):
+    values = np.asarray(values, dtype=np.float64)
+    if prev is not None and not np.isnan(prev):
+        # Seeding with the last value continues the recursion exactly
+        values = np.concatenate([[prev], values])
+        return pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()[1:]
+    return pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+
+
+def ema(values, length, prev=None):
+    """
+    Exponential moving average with alpha 2 / (length + 1).
+
+    :param prev: EMA of the value before values, to continue a series.
+    """
+    return _ewm(values, 2 / (length + 1), prev)
+
+
+def rma(values, length, prev=None):
+    """
+    Wilder's moving average (alpha 1 / length), as used by RSI and ATR.
+    """
+    return _ewm(values, 1 / length, prev)
+
+
+def rolling_mean_std(values, length, history=None):
+    """
+    Mean and population standard deviation over the last length values,
+    NaN until there are enough of them. Every window is computed on its own,
+    so extending a series gives the same numbers as computing it whole.
+
+    :param history: Up to length - 1 values before values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    skip = 0
+    if history is not None and len(history):
+        values = np.concatenate([history, values])
+        skip = len(history)
+
+    mean = np.full(len(values), np.nan)
+    std = np.full(len(values), np.nan)
+    if len(values) >= length:
+        windows = np.lib.stride_tricks.sliding_window_view(values, length)
+        mean[length - 1:] = windows.mean(axis=1)
+        std[length - 1:] = windows.std(axis=1)
+    return mean[skip:], std[skip:]
+
+
+def crossed_above(a, b, start=1):
+    """
+    Where a moves from at or below b to above it, for positions start onward.
+    """
+    start = max(start, 1)
+    cross = np.zeros(max(len(a) - start, 0), dtype=bool)
+    if len(cross):
+        cross = (a[start:] > b[start:]) & (a[start - 1:-1] <= b[start - 1:-1])
+    return cross
+
+
+def crossed_below(a, b, start=1):
+    return crossed_above(b, a, start)
+
+
+# Indicators keep the state their series ended with and extend it with new candles
+
+class Indicator:
+    name = None
+    columns = ()
+    params = ()
+
+    def key(self):
+        return (self.name,) + self.params
+
+    def extend(self, candles):
+        """
+        :param candles: dict of Open/High/Low/Close arrays of the new candles.
+        :return: dict of column name -> values for the new candles.
+        """
+        raise NotImplementedError
+
+
+class EMA(Indicator):
+    name = "ema"
+
+    def __init__(self, length, source="Close"):
+        self.length = int(length)
+        self.source = source
+        self.params = (self.length, source)
+        self.columns = (f"ema_{self.length}",)
+        self._last = None
+
+    def extend(self, candles):
+        values = ema(candles[self.source], self.length, self._last)
+        if len(values):
+            self._last = values[-1]
+        return {self.columns[0]: values}
+
+
+class RSI(Indicator):
+    name = "rsi"
+
+    def __init__(self, length=14):
+        self.length = int(length)
+        self.params = (self.length,)
+        self.columns = (f"rsi_{self.length}",)
+        self._close = None
+        self._gain = None
+        self._loss = None
+
+    def extend(self, candles):
+        close = np.asarray(candles["Close"], dtype=np.float64)
+        previous = np.concatenate([[np.nan if self._close is None else self._close], close[:-1]])
+        change = close - previous
+        gain = rma(np.where(change > 0, change, np.where(np.isnan(change), np.nan, 0.0)),
+                   self.length, self._gain)
+        loss = rma(np.where(change < 0, -change, np.where(np.isnan(change), np.nan, 0.0)),
+                   self.length, self._loss)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = np.where(loss == 0, 100.0, 100 - 100 / (1 + gain / loss))
+        values[np.isnan(gain) | np.isnan(loss)] = np.nan
+        if len(close):
+            self._close, self._gain, self._loss = close[-1], gain[-1], loss[-1]
+        return {self.columns[0]: values}
+
+
+class ATR(Indicator):
+    name = "atr"
+
+    def __init__(self, length=14):
+        self.length = int(length)
+        self.params = (self.length,)
+        self.columns = (f"atr_{self.length}",)
+        self._close = None
+        self._atr = None
+
+    def extend(self, candles):
+        high = np.asarray(candles["High"], dtype=np.float64)
+        low = np.asarray(candles["Low"], dtype=np.float64)
+        close = np.asarray(candles["Close"], dtype=np.float64)
+        previous = np.concatenate([[np.nan if self._close is None else self._close], close[:-1]])
+        true_range = np.fmax(high - low, np.fmax(np.abs(high - previous), np.abs(low - previous)))
+        values = rma(true_range, self.length, self._atr)
+        if len(close):
+            self._close, self._atr = close[-1], values[-1]
+        return {self.columns[0]: values}
+
+
+class Bollinger(Indicator):
+    name = "bollinger"
+
+    def __init__(self, length=20, mult=2.0):
+        self.length = int(length)
+        self.mult = float(mult)
+        self.params = (self.length, self.mult)
+        self.columns = tuple(f"bb_{part}_{self.length}_{self.mult:g}"
+                             for part in ("middle", "upper", "lower"))
+        self._history = np.empty(0)
+
+    def extend(self, candles):
+        close = np.asarray(candles["Close"], dtype=np.float64)
+        mean, std = rolling_mean_std(close, self.length, self._history)
+        self._history = np.concatenate([self._history, close])[-(self.length - 1):] \
+            if self.length > 1 else np.empty(0)
+        middle, upper, lower = self.columns
+        return {middle: mean, upper: mean + self.mult * std, lower: mean - self.mult * std}
+
+
+class _Buffer:
+    """
+    Growable array, appends are amortized O(new values).
+    """
+
+    def __init__(self, dtype):
+        self.data = np.empty(1024, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values):
+        needed = self.size + len(values)
+        if needed > len(self.data):
+            grown = np.empty(max(needed, 2 * len(self.data)), dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:needed] = values
+        self.size = needed
+
+    @property
+    def values(self):
+        return self.data[:self.size]
+
+
+class _Entry:
+    def __init__(self, indicator):
+        self.indicator = indicator
+        self.times = _Buffer(np.int64)
+        self.last_close = None
+        self.columns = {name: _Buffer(np.float64) for name in indicator.columns}
+
+
+class IndicatorCache:
+    """
+    Indicator series per (symbol, timeframe, indicator parameters).
+
+    A series is extended when it is asked for again with more candles, as
+    long as the candles it was computed on are still the start of the new
+    ones (same first time, same time and close at its last candle).
+    Otherwise it is computed again from the start.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def series(self, symbol, timeframe, indicator, candles):
+        """
+        :param candles: dict with Datetime (epoch ms) and Open/High/Low/Close arrays.
+        :return: dict of column name -> values for every candle.
+        """
+        key = (symbol, str(timeframe), indicator.key())
+        times = candles["Datetime"]
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and not self._extends(entry, times, candles["Close"]):
+                entry = None
+            if entry is None:
+                # The cache keeps its own copy, with its own state
+                entry = _Entry(copy.deepcopy(indicator))
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+            start = entry.times.size
+            if start < len(times):
+                with profiling.span("indicators.extend", candles=len(times) - start,
+                                    indicator=indicator.name):
+                    new = {name: values[start:] for name, values in candles.items()}
+                    values = entry.indicator.extend(new)
+                    for name, buffer in entry.columns.items():
+                        buffer.extend(values[name])
+                    entry.times.extend(new["Datetime"])
+                    entry.last_close = new["Close"][-1]
+            return {name: buffer.values[:len(times)] for name, buffer in entry.columns.items()}
+
+    @staticmethod
+    def _extends(entry, times, close):
+        size = entry.times.size
+        if size == 0 or size > len(times):
+            return False
+        cached = entry.times.values
+        return (cached[0] == times[0] and cached[-1] == times[size - 1]
+                and entry.last_close == close[size - 1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_default = None
+
+
+def default_cache():
+    global _default
+    if _default is None:
+        _default = IndicatorCache()
+    return _default
+
+
+# Strategies turn indicator series into Buy/Sell signals
+
+class Strategy:
+    """
+    :param min_atr_percent: Only signal where ATR is at least this percent
+        of the close, 0 to signal regardless of volatility.
+    """
+    name = None
+
+    def __init__(self, min_atr_percent=0.0, atr_length=14):
+        self.min_atr_percent = float(min_atr_percent)
+        self.atr_length = int(atr_length)
+
+    def indicators(self):
+        if self.min_atr_percent > 0:
+            return [ATR(self.atr_length)]
+        return []
+
+    def rules(self, values, close, start):
+        """
+        :return: (buy, sell) boolean arrays for the candles from start on.
+        """
+        raise NotImplementedError
+
+    def signals(self, values, close, start):
+        buy, sell = self.rules(values, close, start)
+        if self.min_atr_percent > 0:
+            atr = values[ATR(self.atr_length).columns[0]][start:]
+            with np.errstate(invalid="ignore"):
+                active = atr / close[start:] * 100 >= self.min_atr_percent
+            buy, sell = buy & active, sell & active
+        return buy, sell
+
+
+class EmaCross(Strategy):
+    """
+    Buy when the fast EMA crosses above the slow one, sell when it crosses below.
+    """
+    name = "ema_cross"
+
+    def __init__(self, fast=9, slow=21, **kwargs):
+        super().__init__(**kwargs)
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+
+    def indicators(self):
+        return [self.fast, self.slow] + super().indicators()
+
+    def rules(self, values, close, start):
+        fast = values[self.fast.columns[0]]
+        slow = values[self.slow.columns[0]]
+        return _pad(crossed_above(fast, slow, start), start), _pad(crossed_below(fast, slow, start), start)
+
+
+class RsiReversal(Strategy):
+    """
+    Buy when RSI climbs back above oversold, sell when it drops back below overbought.
+    """
+    name = "rsi"
+
+    def __init__(self, length=14, oversold=30, overbought=70, **kwargs):
+        super().__init__(**kwargs)
+        self.rsi = RSI(length)
+        self.oversold = float(oversold)
+        self.overbought = float(overbought)
+
+    def indicators(self):
+        return [self.rsi] + super().indicators()
+
+    def rules(self, values, close, start):
+        rsi = values[self.rsi.columns[0]]
+        buy = crossed_above(rsi, np.full(len(rsi), self.oversold), start)
+        sell = crossed_below(rsi, np.full(len(rsi), self.overbought), start)
+        return _pad(buy, start), _pad(sell, start)
+
+
+class BollingerReversal(Strategy):
+    """
+    Buy when the close drops below the lower band, sell when it rises above the upper.
+    """
+    name = "bollinger"
+
+    def __init__(self, length=20, mult=2.0, **kwargs):
+        super().__init__(**kwargs)
+        self.bands = Bollinger(length, mult)
+
+    def indicators(self):
+        return [self.bands] + super().indicators()
+
+    def rules(self, values, close, start):
+        _, upper, lower = (values[name] for name in self.bands.columns)
+        return (_pad(crossed_below(close, lower, start), start),
+                _pad(crossed_above(close, upper, start), start))
+
+
+def _pad(cross, start):
+    # crossed_*() can't say anything about the very first candle
+    return np.concatenate([np.zeros(1, dtype=bool), cross]) if start == 0 else cross
+
+
+STRATEGIES = {strategy.name: strategy for strategy in (EmaCross, RsiReversal, BollingerReversal)}
+
+
+def from_config(config):
+    """
+    Strategy from its declarative form, e.g. {"strategy": "ema_cross", "fast": 9, "slow": 21}
+    """
+    config = dict(config)
+    name = config.pop("strategy")
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown signal strategy {name!r}")
+    return STRATEGIES[name](**config)
+
+
+def candle_arrays(candles):
+    """
+    Datetime (epoch ms) and Open/High/Low/Close arrays of a candle frame,
+    with Datetime as a column or as the index.
+    """
+    times = candles["Datetime"] if "Datetime" in candles.columns else candles.index.to_series()
+    arrays = {"Datetime": to_epoch_ms(times)}
+    for column in ("Open", "High", "Low", "Close"):
+        if column in candles.columns:
+            arrays[column] = price_array(candles, column)
+
+    if len(arrays["Datetime"]) > 1 and (np.diff(arrays["Datetime"]) < 0).any():
+        order = np.argsort(arrays["Datetime"], kind="stable")
+        arrays = {name: values[order] for name, values in arrays.items()}
+    return arrays
+
+
+def symbol_for(candles_path):
+    """
+    Cache symbol of a candle file, its name without the extension.
+    """
+    return os.path.splitext(os.path.basename(candles_path))[0]
+
+
+class SignalGenerator:
+    """
+    Buy/Sell signals of a strategy computed from candles, in the
+    time/Entry/Buy/Sell frame TradeSimulation expects (Entry is the close).
+
+    The candles of the last signals() call are kept, so push() can give the
+    signal of each new candle without the whole history being passed again.
+    """
+
+    def __init__(self, config, symbol, timeframe, cache=None):
+        self.strategy = from_config(config)
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.cache = cache if cache is not None else default_cache()
+        self._candles = {}
+
+    def _values(self, candles):
+        values = {}
+        for indicator in self.strategy.indicators():
+            values.update(self.cache.series(self.symbol, self.timeframe, indicator, candles))
+        return values
+
+    @profiling.traced("indicators.signals")
+    def signals(self, candles):
+        """
+        Every signal over the candle frame.
+        """
+        candles = candle_arrays(candles)
+        self._candles = {}
+        for name, values in candles.items():
+            self._candles[name] = _Buffer(values.dtype)
+            self._candles[name].extend(values)
+
+        close = candles["Close"]
+        buy, sell = self.strategy.signals(self._values(candles), close, 0)
+        rows = buy | sell
+        return pd.DataFrame({
+            "time": candles["Datetime"][rows],
+            "Entry": close[rows],
+            "Buy": buy[rows].astype(int),
+            "Sell": sell[rows].astype(int),
+        })
+
+    @profiling.traced("indicators.signals_chunked")
+    def signals_chunked(self, chunks):
+        """
+        Every signal over candle frames that follow each other in time, e.g. a
+        file read chunk by chunk. Only one chunk is held at a time: the
+        indicators are extended chunk by chunk from the state the previous
+        one ended with, instead of being cached for the whole file.
+        """
+        indicators = copy.deepcopy(self.strategy.indicators())
+        last = None  # Values and close of the previous chunk's last candle
+        frames = []
+        for chunk in chunks:
+            candles = candle_arrays(chunk)
+            if not len(candles["Datetime"]):
+                continue
+            values = {}
+            for indicator in indicators:
+                values.update(indicator.extend(candles))
+            close = candles["Close"]
+            # The previous candle goes first, so crosses at the chunk's start are seen
+            start = 0 if last is None else 1
+            if last is not None:
+                values = {name: np.concatenate([[last[0][name]], series])
+                          for name, series in values.items()}
+                close = np.concatenate([[last[1]], close])
+            buy, sell = self.strategy.signals(values, close, start)
+            last = ({name: series[-1] for name, series in values.items()}, close[-1])
+
+            rows = buy | sell
+            frames.append(pd.DataFrame({
+                "time": candles["Datetime"][rows],
+                "Entry": close[start:][rows],
+                "Buy": buy[rows].astype(int),
+                "Sell": sell[rows].astype(int),
+            }))
+        if not frames:
+            return pd.DataFrame({"time": np.empty(0, dtype=np.int64), "Entry": np.empty(0),
+                                 "Buy": np.empty(0, dtype=int), "Sell": np.empty(0, dtype=int)})
+        return pd.concat(frames, ignore_index=True)
+
+    def push(self, row):
+        """
+        Signal of a candle following the candles seen so far, as a dict with
+        Entry, Buy and Sell (both 0 without a signal) for
+        TradeSimulation.push_candle.
+
+        :param row: dict with Datetime, High, Low and Close.
+        """
+        if not self._candles:
+            for name, dtype in (("Datetime", np.int64), ("High", np.float64),
+                                ("Low", np.float64), ("Close", np.float64)):
+                self._candles[name] = _Buffer(dtype)
+        for name, buffer in self._candles.items():
+            buffer.extend([to_epoch_ms(row[name]) if name == "Datetime" else row[name]])
+
+        candles = {name: buffer.values for name, buffer in self._candles.items()}
+        close = candles["Close"]
+        buy, sell = self.strategy.signals(self._values(candles), close, len(close) - 1)
+        return {"Entry": float(close[-1]), "Buy": int(buy[-1]), "Sell": int(sell[-1])}
@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import socket
+import threading
+
+# A claimed shard whose worker hasn't renewed its lease for this long goes back to pending
+LEASE_SECONDS = float(os.environ.get("BACKTEST_LEASE_SECONDS", "300"))
+
+PENDING = "pending"
+CLAIMED = "claimed"
+RESULTS = "results"
+DONE = "done"
+
+
+def worker_name():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaseLost(Exception):
+    """Raised when a worker's shard was reclaimed after its lease ran out."""
+
+
+class JobQueue:
+    """
+    Job queue in a directory every machine can reach (NFS, SMB or a local
+    path), built on atomic renames only:
+
+        pending/<shard>.json   waiting to be claimed
+        claimed/<shard>.json   being worked on, its mtime is the lease
+        results/<shard>.json   result shard
+        done/<shard>.json      completion manifest, written after the result
+
+    A worker claims a shard by renaming it from pending/ to claimed/; when
+    two workers race for one, only one rename succeeds. Workers renew the
+    lease by touching the claimed file. Shards with an expired lease are
+    renamed back to pending/ by whichever worker notices first. Leases are
+    compared with the shared directory's clock, not the worker's.
+    """
+
+    def __init__(self, root, lease_seconds=LEASE_SECONDS):
+        self.root = root
+        self.lease_seconds = lease_seconds
+        for name in (PENDING, CLAIMED, RESULTS, DONE, "tmp"):
+            os.makedirs(os.path.join(root, name), exist_ok=True)
+
+    def _path(self, state, shard_id):
+        return os.path.join(self.root, state, f"{shard_id}.json")
+
+    def _write(self, path, data):
+        # Written aside and renamed into place, readers never see a partial file
+        tmp_path = os.path.join(self.root, "tmp", f"{os.path.basename(path)}.{worker_name()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2, default=str)
+        os.replace(tmp_path, path)
+
+    def _read(self, path):
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _ids(self, state):
+        try:
+            names = os.listdir(os.path.join(self.root, state))
+        except OSError:
+            return []
+        return sorted(name[:-len(".json")] for name in names if name.endswith(".json"))
+
+    def shared_now(self):
+        """
+        Current time by the shared directory's clock.
+        """
+        clock = os.path.join(self.root, "tmp", f"clock.{worker_name()}")
+        with open(clock, "w"):
+            pass
+        now = os.path.getmtime(clock)
+        os.remove(clock)
+        return now
+
+    def submit(self, shard_id, shard):
+        self._write(self._path(PENDING, shard_id), shard)
+
+    def claim(self):
+        """
+        :return: (shard_id, shard) of a claimed shard, or None when nothing is pending.
+        """
+        self.reclaim_expired()
+        for shard_id in self._ids(PENDING):
+            pending = self._path(PENDING, shard_id)
+            claimed = self._path(CLAIMED, shard_id)
+            try:
+                # The lease starts now: rename keeps the mtime, and a stale one
+                # would let another worker reclaim the shard right away
+                os.utime(pending)
+                os.rename(pending, claimed)
+            except OSError:
+                continue  # Another worker got it first
+            try:
+                return shard_id, self._read(claimed)
+            except (OSError, ValueError):
+                continue  # Reclaimed meanwhile
+        return None
+
+    def release(self, shard_id):
+        """
+        Put a claimed shard back in pending/ for another worker.
+        """
+        try:
+            os.rename(self._path(CLAIMED, shard_id), self._path(PENDING, shard_id))
+        except FileNotFoundError:
+            pass  # Reclaimed meanwhile
+
+    def renew(self, shard_id):
+        """
+        Extend the lease on a claimed shard.
+
+        :raises LeaseLost: when the shard was reclaimed meanwhile.
+        """
+        try:
+            os.utime(self._path(CLAIMED, shard_id))
+        except FileNotFoundError:
+            raise LeaseLost(shard_id)
+
+    def complete(self, shard_id, result, manifest=None):
+        """
+        Store a shard's result, then its completion manifest. A shard that was
+        reclaimed and run twice ends up with the result of whichever run
+        finished last, runs are deterministic so both are the same.
+        """
+        self._write(self._path(RESULTS, shard_id), result)
+        manifest = dict(manifest or {}, shard_id=shard_id, worker=worker_name(),
+                        finished=time.time(), result=os.path.join(RESULTS, f"{shard_id}.json"))
+        self._write(self._path(DONE, shard_id), manifest)
+        try:
+            os.remove(self._path(CLAIMED, shard_id))
+        except FileNotFoundError:
+            pass
+
+    def reclaim_expired(self):
+        """
+        Put shards whose lease expired back in pending/.
+
+        :return: ids of the reclaimed shards.
+        """
+        reclaimed = []
+        claimed_ids = self._ids(CLAIMED)
+        if not claimed_ids:
+            return reclaimed
+        now = self.shared_now()
+        done = set(self._ids(DONE))
+        for shard_id in claimed_ids:
+            claimed = self._path(CLAIMED, shard_id)
+            try:
+                if now - os.path.getmtime(claimed) < self.lease_seconds:
+                    continue
+                if shard_id in done:
+                    os.remove(claimed)
+                else:
+                    os.rename(claimed, self._path(PENDING, shard_id))
+                    reclaimed.append(shard_id)
+            except OSError:
+                continue  # Completed, renewed or reclaimed by someone else meanwhile
+        return reclaimed
+
+    def status(self):
+        return {state: len(self._ids(state)) for state in (PENDING, CLAIMED, DONE)}
+
+    def completed(self):
+        """
+        Completion manifests and result shards of the finished shards, as
+        (manifest, result) pairs.
+        """
+        for shard_id in self._ids(DONE):
+            manifest = self._read(self._path(DONE, shard_id))
+            yield manifest, self._read(os.path.join(self.root, manifest["result"]))
+
+    def write_manifest(self, name, data):
+        self._write(os.path.join(self.root, name), data)
+
+    def read_manifest(self, name):
+        return self._read(os.path.join(self.root, name))
+
+
+class LeaseKeeper:
+    """
+    Renews a shard's lease from a background thread while it is worked on.
+    lost is set when the shard was reclaimed meanwhile.
+    """
+
+    def __init__(self, queue, shard_id):
+        self.queue = queue
+        self.shard_id = shard_id
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.queue.lease_seconds / 3):
+            try:
+                self.queue.renew(self.shard_id)
+            except LeaseLost:
+                self.lost = True
+                return
+            except OSError as e:
+                print(f"Could not renew lease on {self.shard_id}: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        return False
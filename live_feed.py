@@ -0,0 +1,140 @@
+import json
+import time
+import pandas as pd
+from binance_data import kline_to_row
+from time_axis import to_epoch_ms
+
+
+class BinanceStreamTransport:
+    """
+    Closed klines from the Binance futures websocket stream.
+    """
+
+    def __init__(self, symbol: str, interval: str = "1m",
+                 ws_url: str = "wss://fstream.binance.com/ws"):
+        self.url = f"{ws_url}/{symbol.lower()}@kline_{interval}"
+        self.connection = None
+        self.closed = False
+
+    def stream(self):
+        """
+        Yield each closed kline as [open_time, open, high, low, close, volume],
+        the same layout the REST endpoint returns. Reconnects on drops.
+        """
+        import websocket
+
+        while not self.closed:
+            try:
+                self.connection = websocket.create_connection(
+                    self.url, timeout=30)
+                while not self.closed:
+                    message = json.loads(self.connection.recv())
+                    k = message.get("k")
+                    if not k or not k.get("x"):
+                        continue  # Still forming, only closed candles are stored
+                    yield [k["t"], k["o"], k["h"], k["l"], k["c"], k["v"]]
+            except Exception as e:
+                if self.closed:
+                    break
+                print(f"Stream error, reconnecting: {e}")
+                time.sleep(1)
+            finally:
+                if self.connection is not None:
+                    self.connection.close()
+                    self.connection = None
+
+    def close(self):
+        self.closed = True
+        if self.connection is not None:
+            self.connection.close()
+
+
+class ReplayTransport:
+    """
+    Replays a candle CSV as if it were arriving from the exchange.
+    Useful for testing the live path offline.
+    """
+
+    def __init__(self, filepath: str, delay: float = 0.0, start=None):
+        """
+        :param filepath: Candle CSV in the DataHandler format.
+        :param delay: Seconds to wait between candles.
+        :param start: Only replay candles at or after this datetime.
+        """
+        self.filepath = filepath
+        self.delay = delay
+        self.start = start
+        self.closed = False
+
+    def stream(self):
+        candles = pd.read_csv(self.filepath)
+        open_times = to_epoch_ms(candles["Datetime"])
+        if self.start is not None:
+            keep = open_times >= to_epoch_ms(self.start)
+            candles = candles[keep]
+            open_times = open_times[keep]
+
+        columns = ["Open", "High", "Low", "Close", "Volume"]
+        for open_time, values in zip(open_times, candles[columns].itertuples(index=False)):
+            if self.closed:
+                break
+            yield [int(open_time), *values]
+            if self.delay:
+                time.sleep(self.delay)
+
+    def close(self):
+        self.closed = True
+
+
+class LiveFeed:
+    """
+    Keeps a candle store current from a kline transport and optionally pushes
+    each new candle through an incremental TradeSimulation.
+    """
+
+    def __init__(self, transport, data_handler, simulation=None, on_candle=None, signals=None):
+        """
+        :param transport: Any object with stream() yielding closed klines and close().
+        :param data_handler: DataHandler of the candle file to keep current.
+        :param simulation: Optional TradeSimulation that already ran over history.
+        :param on_candle: Optional callback(row, completed_trades) per stored candle.
+        :param signals: Optional indicators.SignalGenerator deciding each new
+            candle's signal, instead of looking it up in the simulation's
+            signals. Its signals() should have run over the stored history.
+        """
+        self.transport = transport
+        self.data_handler = data_handler
+        self.simulation = simulation
+        self.on_candle = on_candle
+        self.signals = signals
+        self.running = False
+
+    def run(self):
+        """
+        Consume the transport until stop() is called or the stream ends.
+        """
+        self.running = True
+        try:
+            for kline in self.transport.stream():
+                if not self.running:
+                    break
+                self.handle_kline(kline)
+        finally:
+            self.running = False
+
+    def handle_kline(self, kline):
+        row = kline_to_row(kline)
+        self.data_handler.append(row)
+
+        completed = []
+        if self.simulation is not None:
+            signal = self.signals.push(row) if self.signals is not None else None
+            completed = self.simulation.push_candle(row, signal)
+
+        if self.on_candle is not None:
+            self.on_candle(row, completed)
+        return completed
+
+    def stop(self):
+        self.running = False
+        self.transport.close()
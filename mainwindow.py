@@ -1,10 +1,72 @@
-import os
-import csv
-import pandas as pd
-from PyQt5.QtWidgets import QMainWindow, QStackedWidget, QMessageBox
+import time
+import threading
+import traceback
+from PyQt5.QtWidgets import QMainWindow, QStackedWidget, QMessageBox, QShortcut
+from PyQt5.QtCore import QThread, QTimer, pyqtSignal
+from PyQt5.QtGui import QKeySequence
+import startup_timing
 from screen1 import Screen1
-from screen2 import Screen2
-from trade_simulation import TradeSimulation
+
+
+class BacktestWorker(QThread):
+    progress_signal = pyqtSignal(str, float, float)
+    partial_signal = pyqtSignal(object)
+    finished_signal = pyqtSignal(object, object, object)
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, candles_path, formData):
+        super().__init__()
+        self.candles_path = candles_path
+        self.formData = formData
+        self.cancel_requested = False
+
+    def run(self):
+        """Run the whole load/backtest/stats pipeline off the GUI thread."""
+        from backtest import run_pipeline, BacktestError, BacktestCancelled, CACHED_STAGE
+        from result_cache import default_cache
+
+        stages = set()
+
+        def progress(stage, percent, rate):
+            stages.add(stage)
+            self.progress_signal.emit(stage, percent, rate)
+
+        try:
+            started = time.perf_counter()
+            monthly_stats, trades_df, summary = run_pipeline(
+                self.candles_path,
+                self.formData,
+                progress=progress,
+                should_stop=lambda: self.cancel_requested,
+                on_trades=self.partial_signal.emit,
+                cache=default_cache()
+            )
+            seconds = time.perf_counter() - started
+            self.finished_signal.emit(monthly_stats, trades_df, summary)
+        except BacktestCancelled:
+            pass  # The UI already moved on when cancel() was requested
+        except BacktestError as e:
+            self.error_signal.emit(str(e))
+        except Exception as e:
+            self.error_signal.emit(
+                f"Error during backtest: {e}\n{traceback.format_exc()}")
+        else:
+            # A cached result was recorded when it was first computed
+            if CACHED_STAGE not in stages:
+                self.record(monthly_stats, trades_df, summary, seconds)
+
+    def record(self, monthly_stats, trades_df, summary, seconds):
+        """Add the run to the history after its results were handed over."""
+        from run_history import record_backtest
+
+        try:
+            record_backtest(self.candles_path, self.formData, monthly_stats, trades_df, seconds,
+                            summary=summary)
+        except Exception as e:
+            print(f"Could not record the run in the history: {e}")
+
+    def cancel(self):
+        self.cancel_requested = True
 
 
 class MainWindow(QMainWindow):
@@ -12,126 +74,111 @@ class MainWindow(QMainWindow):
         super().__init__()
         self.setWindowTitle("Backtest Application")
         self.stack = QStackedWidget()
+        self.backtestWorker = None
+        self.backtestThreads = []
 
         self.screen1 = Screen1(self)
-        self.screen2 = Screen2(self)
-
         self.stack.addWidget(self.screen1)
-        self.stack.addWidget(self.screen2)
         self.setCentralWidget(self.stack)
 
+        self.profileDialog = None
+        QShortcut(QKeySequence("Ctrl+Shift+P"), self, activated=self.showProfile)
+
+    def showProfile(self):
+        # Also reachable from any screen with Ctrl+Shift+P, to switch recording on before a run
+        if self.profileDialog is None:
+            from profile_view import ProfileDialog
+            self.profileDialog = ProfileDialog(self)
+        self.profileDialog.show()
+        self.profileDialog.raise_()
+
+    def ensureScreen2(self):
+        # Screen2 pulls in pandas, the table models and the chart modules
+        if not hasattr(self, 'screen2'):
+            from screen2 import Screen2
+            self.screen2 = Screen2(self)
+            self.stack.addWidget(self.screen2)
+        return self.screen2
+
+    def prewarm(self, on_done=None):
+        """
+        Import the modules behind Screen2, the charts and the simulation in
+        the background after the window is up, so the first Submit doesn't
+        pay for them.
+
+        :param on_done: Optional callable run on the GUI thread when finished.
+        """
+        def import_heavy_modules():
+            import pandas  # noqa: F401
+            import plotly.graph_objects  # noqa: F401
+            import backtest  # noqa: F401
+            import table_models  # noqa: F401
+            import chart_data  # noqa: F401
+
+        def build_screens():
+            if worker.is_alive():
+                QTimer.singleShot(50, build_screens)
+                return
+            # Qt widgets must be created on the GUI thread
+            try:
+                import PyQt5.QtWebEngineWidgets  # noqa: F401
+            except ImportError as e:
+                print(f"Charts unavailable, skipped pre-warming QtWebEngine: {e}")
+            self.ensureScreen2()
+            startup_timing.mark("prewarm_done")
+            if on_done is not None:
+                on_done()
+
+        worker = threading.Thread(target=import_heavy_modules, daemon=True)
+        worker.start()
+        QTimer.singleShot(50, build_screens)
+
     def showScreen2(self, formData):
+        self.cancelBacktest()
+        self.ensureScreen2()
+
         self.screen2.updateUserInputs(formData)
-        monthly_stats, trades_df = self.simulateTrades(formData)
-        self.screen2.updateTable(monthly_stats, trades_df)
+        self.screen2.beginRun()
         self.stack.setCurrentWidget(self.screen2)
 
-    def simulateTrades(self, formData):
-        candles_path = self.screen1.candleFileCombo.currentText()
-
-        if not candles_path or not os.path.exists(candles_path):
-            QMessageBox.warning(
-                self, "Error", "Invalid or missing Candle File.")
-            return [], pd.DataFrame()
-
-        try:
-            candles_df = pd.read_csv(candles_path, parse_dates=["Datetime"])
-        except Exception as e:
-            QMessageBox.warning(
-                self, "Error", f"Error loading Candle File: {e}")
-            return [], pd.DataFrame()
-
-        if not formData.get("File"):
-            QMessageBox.warning(self, "Error", "No Signals File provided.")
-            return [], pd.DataFrame()
-
-        try:
-            signals_raw = pd.read_csv(formData["File"])
-            signals_raw.columns = signals_raw.columns.str.strip()
-            signals_raw['Entry'] = signals_raw['close'].astype(float)
-            signals_raw = signals_raw.dropna(
-                subset=['Buy Normal', 'Buy Smart', 'Sell Normal', 'Sell Smart'])
-            signals_raw['sum'] = signals_raw[['Buy Normal',
-                                              'Buy Smart', 'Sell Normal', 'Sell Smart']].sum(axis=1)
-            filter_data = signals_raw[signals_raw['sum'] > 0].copy()
-
-            buy_mask = (filter_data["Buy Normal"] > 0) | (
-                filter_data["Buy Smart"] > 0)
-            sell_mask = (filter_data["Sell Normal"] > 0) | (
-                filter_data["Sell Smart"] > 0)
-            filter_data['Buy'] = buy_mask.astype(int)
-            filter_data['Sell'] = sell_mask.astype(int)
-
-            columns_to_select = ["time", "Entry", "Buy", "Sell"]
-            signals_df = filter_data[columns_to_select]
-        except Exception as e:
-            QMessageBox.warning(
-                self, "Error", f"Error processing Signals File: {e}")
-            return [], pd.DataFrame()
-
-        if signals_df.empty:
-            QMessageBox.warning(
-                self, "Error", "No valid signals in the Signals File.")
-            return [], pd.DataFrame()
-
-        capital = formData.get("Capital", 1000)
-        leverage = formData.get("Leverage", 1)
-        maker_fee_rate = formData.get("MakerFees", 0.02) / 100
-        taker_fee_rate = formData.get("TakerFees", 0.055) / 100
-        tp_percent = formData.get("TP_percent", 0)
-        sl_percent = formData.get("SL_percent", 0)
-        with_compounding = formData.get("WithCompounding", False)
-        use_alternate_signall = formData.get("useAlternateSignal", False)
-        interval = formData.get("interval", False)
-
-        simulation = TradeSimulation(
-            candles_df,
-            signals_df,
-            capital,
-            leverage,
-            maker_fee_rate,
-            taker_fee_rate,
-            tp_percent,
-            sl_percent,
-            with_compounding,
-            use_alternate_signall,
-            interval
-        )
-
-        simulation.tranform()
-        simulation.run_backtest()
-        completed_trades = simulation.completed_trades
-
-        monthly_stats = []
-        if not completed_trades:
-            return monthly_stats, pd.DataFrame()
-
-        trades_df = pd.DataFrame(completed_trades)
-
-        trades_df["Datetime"] = pd.to_datetime(trades_df["Datetime"])
-        trades_df["Month"] = trades_df["Datetime"].dt.to_period(
-            "M").astype(str)
-
-        grouped = trades_df.groupby("Month")
-        for month, group in grouped:
-            winning_trades = group[group["Result"] == "PROFIT"].shape[0]
-            losing_trades = group[group["Result"] == "LOSS"].shape[0]
-            total_trades = winning_trades + losing_trades
-            net_profit_loss = group["Profit_Loss"].sum()
-            total_profit = group[group["Result"]
-                                 == "PROFIT"]["Profit_Loss"].sum()
-            total_loss = group[group["Result"] == "LOSS"]["Profit_Loss"].sum()
-            monthly_stats.append({
-                "Month": month,
-                "Winning Trades": winning_trades,
-                "Losing Trades": losing_trades,
-                "Total Trades": total_trades,
-                "Total Profit": total_profit,
-                "Total Loss": total_loss,
-                "Net Profit/Loss": net_profit_loss
-            })
-
-        return monthly_stats, trades_df
+        worker = BacktestWorker(
+            self.screen1.candleFileCombo.currentText(), formData)
+        worker.progress_signal.connect(self.onBacktestProgress)
+        worker.partial_signal.connect(self.onBacktestPartial)
+        worker.finished_signal.connect(self.onBacktestFinished)
+        worker.error_signal.connect(self.onBacktestError)
+        # Keep a reference until the thread ends, a cancelled run may still be winding down
+        worker.finished.connect(lambda: self.backtestThreads.remove(worker))
+        self.backtestThreads.append(worker)
+        self.backtestWorker = worker
+        worker.start()
+
+    def cancelBacktest(self):
+        if self.backtestWorker is not None:
+            self.backtestWorker.cancel()
+            self.backtestWorker = None
+
+    # Signals from a run that was cancelled or replaced are ignored
+    def onBacktestProgress(self, stage, percent, rate):
+        if self.sender() is self.backtestWorker:
+            self.screen2.updateProgress(stage, percent, rate)
+
+    def onBacktestPartial(self, trades):
+        if self.sender() is self.backtestWorker:
+            self.screen2.appendTrades(trades)
+
+    def onBacktestFinished(self, monthly_stats, trades_df, summary):
+        if self.sender() is self.backtestWorker:
+            self.backtestWorker = None
+            self.screen2.updateTable(monthly_stats, trades_df, summary)
+            self.screen2.endRun()
+
+    def onBacktestError(self, message):
+        if self.sender() is self.backtestWorker:
+            self.backtestWorker = None
+            self.screen2.endRun()
+            QMessageBox.warning(self, "Error", message)
+            self.screen2.goBack()
 
     def showScreen3(self):
         if not hasattr(self, 'screen3'):
@@ -139,3 +186,18 @@ class MainWindow(QMainWindow):
             self.screen3 = Screen3(self)
             self.stack.addWidget(self.screen3)
         self.stack.setCurrentWidget(self.screen3)
+
+    def showScreen4(self):
+        if not hasattr(self, 'screen4'):
+            from screen4 import Screen4
+            self.screen4 = Screen4(self)
+            self.stack.addWidget(self.screen4)
+        self.screen4.refresh()
+        self.stack.setCurrentWidget(self.screen4)
+
+    def showScreen5(self):
+        if not hasattr(self, 'screen5'):
+            from screen5 import Screen5
+            self.screen5 = Screen5(self)
+            self.stack.addWidget(self.screen5)
+        self.stack.setCurrentWidget(self.screen5)
@@ -0,0 +1,131 @@
+import heapq
+from collections import deque
+
+
+class PositionBook:
+    """
+    Open positions indexed by their TP and SL levels, for simulations that
+    allow more than one position at a time.
+
+    Each side keeps a heap of take-profit levels and one of stop-loss levels,
+    ordered so the level a candle reaches first is on top. A candle only pops
+    the entries its High/Low crossed, so it costs O(k log n) for k closed out
+    of n open positions. Entries of positions closed another way are left in
+    the heaps and dropped when they come up.
+
+    A new position can't be closed before its skip window has passed, until
+    then it waits in a queue and is not in the heaps. Positions open in time
+    order, so the queue is FIFO.
+
+    Behaves like the active_trades list for the rest of the engine: len(),
+    iteration in open order, append() to open and remove() to close.
+    """
+
+    def __init__(self, skip_ms):
+        """
+        :param skip_ms: Time after opening during which a position can't be
+            closed; it becomes closable on the first candle after open + skip_ms.
+        """
+        self.skip_ms = skip_ms
+        self._trades = {}     # Position id -> trade, in open order
+        self._active = {}     # The same for positions past their skip window
+        self._pending = deque()
+        self._next_id = 0
+        # (level, id), negated levels where the highest has to come first
+        self._buy_tp = []     # Lowest TP first, hit when High >= TP
+        self._buy_sl = []     # Highest SL first, hit when Low <= SL
+        self._sell_tp = []    # Highest TP first, hit when Low <= TP
+        self._sell_sl = []    # Lowest SL first, hit when High >= SL
+
+    def __len__(self):
+        return len(self._trades)
+
+    def __iter__(self):
+        return iter(list(self._trades.values()))
+
+    def append(self, trade):
+        trade['Position'] = self._next_id
+        self._trades[self._next_id] = trade
+        self._pending.append(self._next_id)
+        self._next_id += 1
+
+    def remove(self, trade):
+        position = trade['Position']
+        del self._trades[position]
+        if self._active.pop(position, None) is not None and self._entries() > 4 * len(self._active) + 256:
+            self._compact()
+
+    def activate(self, index):
+        """
+        Make the positions whose skip window has passed at candle time index closable.
+        """
+        while self._pending:
+            trade = self._trades.get(self._pending[0])
+            if trade is not None and index <= trade['Datetime'] + self.skip_ms:
+                break
+            position = self._pending.popleft()
+            if trade is not None:
+                self._push(position, trade)
+
+    def active(self, direction=None):
+        """
+        Closable positions in open order, optionally only those in direction.
+        """
+        return [
+            trade for trade in self._active.values()
+            if direction is None or trade['Direction'] == direction
+        ]
+
+    def crossed(self, high, low):
+        """
+        Closable positions whose TP or SL the candle reached, in open order,
+        as (trade, price) pairs. A position reaching both closes at its TP.
+        """
+        hits = {}
+        for position in self._pop_while(self._buy_tp, lambda level: high >= level):
+            hits[position] = 'Take_Profit'
+        for position in self._pop_while(self._sell_tp, lambda level: low <= -level):
+            hits[position] = 'Take_Profit'
+        for position in self._pop_while(self._buy_sl, lambda level: low <= -level):
+            hits.setdefault(position, 'Stop_Loss')
+        for position in self._pop_while(self._sell_sl, lambda level: high >= level):
+            hits.setdefault(position, 'Stop_Loss')
+
+        return [
+            (self._active[position], self._active[position][level])
+            for position, level in sorted(hits.items())
+        ]
+
+    def _push(self, position, trade):
+        self._active[position] = trade
+        take_profit, stop_loss = trade['Take_Profit'], trade['Stop_Loss']
+        # A NaN level is never reached, it stays out of the heaps
+        if trade['Direction'] == "BUY":
+            if take_profit == take_profit:
+                heapq.heappush(self._buy_tp, (take_profit, position))
+            if stop_loss == stop_loss:
+                heapq.heappush(self._buy_sl, (-stop_loss, position))
+        else:
+            if take_profit == take_profit:
+                heapq.heappush(self._sell_tp, (-take_profit, position))
+            if stop_loss == stop_loss:
+                heapq.heappush(self._sell_sl, (stop_loss, position))
+
+    def _pop_while(self, heap, reached):
+        positions = []
+        while heap and reached(heap[0][0]):
+            _, position = heapq.heappop(heap)
+            if position in self._active:
+                positions.append(position)
+        return positions
+
+    def _heaps(self):
+        return (self._buy_tp, self._buy_sl, self._sell_tp, self._sell_sl)
+
+    def _entries(self):
+        return sum(len(heap) for heap in self._heaps())
+
+    def _compact(self):
+        for heap in self._heaps():
+            heap[:] = [entry for entry in heap if entry[1] in self._active]
+            heapq.heapify(heap)
@@ -0,0 +1,85 @@
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QCheckBox, QPushButton,
+    QTableWidget, QTableWidgetItem, QHeaderView, QFileDialog, QMessageBox
+)
+import profiling
+
+COLUMNS = ["Stage", "Calls", "Total (ms)", "Mean (ms)", "Max (ms)", "Counters"]
+
+
+class ProfileDialog(QDialog):
+    """
+    Timing spans recorded by the profiling module, aggregated per stage,
+    with export to a Chrome trace file.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Profile")
+        self.resize(1000, 500)
+
+        self.enabledCheck = QCheckBox("Record timings")
+        self.enabledCheck.setChecked(profiling.is_enabled())
+        self.enabledCheck.toggled.connect(profiling.enable)
+
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setStretchLastSection(True)
+
+        refreshButton = QPushButton("Refresh")
+        refreshButton.clicked.connect(self.refresh)
+        clearButton = QPushButton("Clear")
+        clearButton.clicked.connect(self.clear)
+        exportButton = QPushButton("Export Chrome Trace")
+        exportButton.clicked.connect(self.exportTrace)
+
+        buttonLayout = QHBoxLayout()
+        buttonLayout.addWidget(self.enabledCheck)
+        buttonLayout.addStretch(1)
+        buttonLayout.addWidget(refreshButton)
+        buttonLayout.addWidget(clearButton)
+        buttonLayout.addWidget(exportButton)
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(buttonLayout)
+        layout.addWidget(self.table)
+
+    def refresh(self):
+        rows = profiling.summary()
+        self.table.setRowCount(len(rows))
+        for r, row in enumerate(rows):
+            counters = ", ".join(
+                f"{key}={value:,}" for key, value in row["Counters"].items())
+            values = [
+                row["Stage"],
+                str(row["Calls"]),
+                f"{row['Total (ms)']:,.1f}",
+                f"{row['Mean (ms)']:,.1f}",
+                f"{row['Max (ms)']:,.1f}",
+                counters,
+            ]
+            for c, value in enumerate(values):
+                self.table.setItem(r, c, QTableWidgetItem(value))
+
+    def clear(self):
+        profiling.clear()
+        self.refresh()
+
+    def exportTrace(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Chrome Trace", "backtest_trace.json", "JSON Files (*.json)")
+        if not path:
+            return
+        try:
+            profiling.export_chrome_trace(path)
+        except OSError as e:
+            QMessageBox.warning(self, "Error", f"Could not write trace: {e}")
+            return
+        QMessageBox.information(
+            self, "Success", f"Trace saved to {path}\nOpen it in chrome://tracing or ui.perfetto.dev")
+
+    def showEvent(self, event):
+        self.enabledCheck.setChecked(profiling.is_enabled())
+        self.refresh()
+        super().showEvent(event)
@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import threading
+import functools
+from collections import deque
+
+# Set BACKTEST_PROFILE=1 to record from startup, or toggle it from the profile dialog
+_enabled = os.environ.get("BACKTEST_PROFILE", "0") == "1"
+# Oldest spans are dropped past this many, so a long session can't grow without bound
+MAX_EVENTS = 200_000
+_events = deque(maxlen=MAX_EVENTS)
+_threads = {}
+_lock = threading.Lock()
+_origin = time.perf_counter()
+
+
+class Span:
+    """
+    A named, timed section of work with counters (rows, trades, bytes ...)
+    attached. Use through span().
+    """
+    __slots__ = ("name", "counters", "started")
+
+    def __init__(self, name, counters):
+        self.name = name
+        self.counters = counters
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ended = time.perf_counter()
+        if exc_type is not None:
+            self.counters["error"] = exc_type.__name__
+        _record(self.name, self.started, ended, self.counters)
+        return False
+
+    def count(self, key, amount=1):
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, **counters):
+        self.counters.update(counters)
+
+
+class _NullSpan:
+    """
+    Stands in for Span while profiling is off, so instrumented code pays for
+    one flag check and nothing else.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def count(self, key, amount=1):
+        pass
+
+    def set(self, **counters):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = bool(on)
+
+
+def is_enabled():
+    return _enabled
+
+
+def span(name, **counters):
+    """
+    Time a block of work:
+
+        with profiling.span("load_candles", bytes=size) as s:
+            df = pd.read_csv(path)
+            s.set(rows=len(df))
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, counters)
+
+
+def traced(name):
+    """
+    Decorator form of span() for whole functions.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _record(name, started, ended, counters):
+    thread = threading.current_thread()
+    with _lock:
+        _threads.setdefault(thread.ident, thread.name)
+        _events.append((name, started, ended, thread.ident, counters))
+
+
+def clear():
+    with _lock:
+        _events.clear()
+        _threads.clear()
+
+
+def events():
+    with _lock:
+        return list(_events)
+
+
+def summary():
+    """
+    Aggregate recorded spans by name, in the order they first started.
+
+    :return: list of dicts with Stage, Calls, Total (ms), Mean (ms), Max (ms)
+        and Counters (numeric counters summed over the calls).
+    """
+    stages = {}
+    for name, started, ended, _, counters in sorted(events(), key=lambda e: e[1]):
+        ms = (ended - started) * 1000
+        stage = stages.setdefault(name, {
+            "Stage": name, "Calls": 0, "Total (ms)": 0.0, "Max (ms)": 0.0, "Counters": {}})
+        stage["Calls"] += 1
+        stage["Total (ms)"] += ms
+        stage["Max (ms)"] = max(stage["Max (ms)"], ms)
+        for key, value in counters.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                stage["Counters"][key] = stage["Counters"].get(key, 0) + value
+
+    rows = list(stages.values())
+    for stage in rows:
+        stage["Mean (ms)"] = stage["Total (ms)"] / stage["Calls"]
+    return rows
+
+
+def chrome_trace():
+    """
+    Recorded spans in the Chrome trace event format, viewable in
+    chrome://tracing or https://ui.perfetto.dev.
+    """
+    pid = os.getpid()
+    with _lock:
+        recorded = list(_events)
+        threads = dict(_threads)
+
+    trace = [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+        for tid, name in threads.items()
+    ]
+    for name, started, ended, tid, counters in recorded:
+        trace.append({
+            "name": name,
+            "cat": name.split(".")[0],
+            "ph": "X",
+            "ts": (started - _origin) * 1e6,
+            "dur": (ended - started) * 1e6,
+            "pid": pid,
+            "tid": tid,
+            "args": counters,
+        })
+    return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+
+def export_chrome_trace(path):
+    with open(path, "w") as f:
+        json.dump(chrome_trace(), f, default=str)
+    return path
@@ -0,0 +1,180 @@
+import os
+import json
+import pickle
+import hashlib
+import threading
+import profiling
+
+CACHE_DIR = os.environ.get("BACKTEST_CACHE_DIR", os.path.join("cache", "results"))
+# Size budget in MB, least recently used results are evicted above it (0 disables the cache)
+CACHE_MB = float(os.environ.get("BACKTEST_CACHE_MB", "512"))
+
+# Form fields that are inputs rather than parameters, they enter the key as content hashes
+INPUT_FIELDS = ("File",)
+
+DIGEST_INDEX = "digests.json"
+
+
+class ResultCache:
+    """
+    Content-addressed store for backtest results.
+
+    A result is keyed by the content of the candle and signal files, the
+    engine version and every parameter, and saved as one pickle per key.
+    Hits refresh the file's mtime, which is what eviction orders by.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MB * 2**20):
+        self.directory = directory
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._digests = None
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def file_digest(self, path):
+        """
+        blake2b of a file's content. Digests are remembered per (size, mtime),
+        so unchanged files are not read again.
+        """
+        stat = os.stat(path)
+        version = [stat.st_size, stat.st_mtime_ns]
+        path = os.path.abspath(path)
+
+        with self._lock:
+            digests = self._load_digests()
+            known = digests.get(path)
+            if known is not None and known["version"] == version:
+                return known["digest"]
+
+        with profiling.span("cache.hash_file", bytes=stat.st_size):
+            hasher = hashlib.blake2b(digest_size=20)
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    hasher.update(block)
+            digest = hasher.hexdigest()
+
+        with self._lock:
+            digests[path] = {"version": version, "digest": digest}
+            self._save_digests()
+        return digest
+
+    def key_for(self, candles_path, formData):
+        from trade_simulation import ENGINE_VERSION
+
+        params = {k: v for k, v in formData.items() if k not in INPUT_FIELDS}
+        identity = {
+            "engine": ENGINE_VERSION,
+            "candles": self.file_digest(candles_path),
+            # Generated signals are covered by the strategy in params
+            "signals": self.file_digest(formData["File"]) if formData.get("File") else None,
+            "params": params,
+        }
+        text = json.dumps(identity, sort_keys=True, default=str)
+        return hashlib.blake2b(text.encode(), digest_size=20).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key):
+        """
+        :return: (monthly_stats, trades_df, summary) or None on a miss; summary
+            is None for entries stored without one.
+        """
+        if not self.enabled:
+            return None
+        path = self._entry_path(key)
+        try:
+            with profiling.span("cache.get", bytes=os.path.getsize(path)):
+                with open(path, "rb") as f:
+                    entry = pickle.load(f)
+            os.utime(path)  # Mark as recently used
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+        return entry["monthly_stats"], entry["trades_df"], entry.get("summary")
+
+    def put(self, key, monthly_stats, trades_df, summary=None, meta=None):
+        if not self.enabled:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._entry_path(key)
+        entry = {"monthly_stats": monthly_stats, "trades_df": trades_df, "summary": summary,
+                 "meta": meta or {}}
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with profiling.span("cache.put") as s:
+                with open(tmp_path, "wb") as f:
+                    pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+                # Readers never see a half written entry
+                os.replace(tmp_path, path)
+                s.set(bytes=os.path.getsize(path))
+        except OSError as e:
+            print(f"Could not cache backtest result: {e}")
+            return
+        self.evict()
+
+    def evict(self):
+        """
+        Delete least recently used entries until the cache fits its budget.
+        """
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(".pkl")]
+        except OSError:
+            return
+        entries = []
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue  # Evicted by another process meanwhile
+            entries.append((stat.st_mtime_ns, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                os.remove(os.path.join(self.directory, name))
+
+    def _load_digests(self):
+        if self._digests is None:
+            try:
+                with open(os.path.join(self.directory, DIGEST_INDEX), "r") as f:
+                    self._digests = json.load(f)
+            except Exception:
+                self._digests = {}
+        return self._digests
+
+    def _save_digests(self):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, DIGEST_INDEX)
+            # Sweep workers share the directory, readers never see a half written index
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._digests, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not save file digests: {e}")
+
+
+_default = None
+
+
+def default_cache():
+    global _default
+    if _default is None:
+        _default = ResultCache()
+    return _default
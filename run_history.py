@@ -0,0 +1,408 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from time_axis import to_epoch_ms, from_epoch_ms
+
+# SQLite file every finished run is recorded in (empty disables the history)
+HISTORY_DB = os.environ.get("BACKTEST_HISTORY_DB", os.path.join("cache", "history.sqlite"))
+
+# Summary metric from stats.summary_stats -> run_stats column
+STAT_COLUMNS = {
+    "Total Trades": "total_trades",
+    "Win Rate %": "win_rate",
+    "Net Profit/Loss": "net_profit",
+    "Profit Factor": "profit_factor",
+    "Expectancy": "expectancy",
+    "Max Drawdown": "max_drawdown",
+    "Max Drawdown %": "max_drawdown_pct",
+    "Sharpe": "sharpe",
+    "Sortino": "sortino",
+    "Avg Hold (min)": "avg_hold_min",
+    "Max Win Streak": "max_win_streak",
+    "Max Loss Streak": "max_loss_streak",
+}
+
+# Trade log column -> trades column, open and close times are stored as epoch ms
+TRADE_COLUMNS = {
+    "Datetime": "open_time",
+    "Direction": "direction",
+    "Trade Open Price": "open_price",
+    "Trade Close Price": "close_price",
+    "Profit_Loss": "profit_loss",
+    "Stop_Loss": "stop_loss",
+    "Take_Profit": "take_profit",
+    "Diff": "diff",
+    "capital": "capital",
+    "Close_Time": "close_time",
+    "Result": "result",
+    "Closed_Normally": "closed_normally",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    symbol TEXT,
+    timeframe TEXT,
+    candles_path TEXT,
+    candles_digest TEXT,
+    signals_path TEXT,
+    signals_digest TEXT,
+    strategy TEXT,
+    engine_version TEXT,
+    capital REAL,
+    leverage REAL,
+    tp_percent REAL,
+    sl_percent REAL,
+    params TEXT NOT NULL,
+    seconds REAL
+);
+CREATE INDEX IF NOT EXISTS runs_market ON runs (symbol, timeframe, sl_percent);
+CREATE INDEX IF NOT EXISTS runs_created ON runs (created);
+
+CREATE TABLE IF NOT EXISTS run_stats (
+    run_id INTEGER PRIMARY KEY REFERENCES runs (id) ON DELETE CASCADE,
+    total_trades INTEGER,
+    win_rate REAL,
+    net_profit REAL,
+    profit_factor REAL,
+    expectancy REAL,
+    max_drawdown REAL,
+    max_drawdown_pct REAL,
+    sharpe REAL,
+    sortino REAL,
+    avg_hold_min REAL,
+    max_win_streak INTEGER,
+    max_loss_streak INTEGER,
+    periods TEXT
+);
+CREATE INDEX IF NOT EXISTS run_stats_profit_factor ON run_stats (profit_factor);
+CREATE INDEX IF NOT EXISTS run_stats_net_profit ON run_stats (net_profit);
+CREATE INDEX IF NOT EXISTS run_stats_sharpe ON run_stats (sharpe);
+CREATE INDEX IF NOT EXISTS run_stats_max_drawdown_pct ON run_stats (max_drawdown_pct);
+
+CREATE TABLE IF NOT EXISTS trades (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    open_time INTEGER,
+    direction TEXT,
+    open_price REAL,
+    close_price REAL,
+    profit_loss REAL,
+    stop_loss REAL,
+    take_profit REAL,
+    diff REAL,
+    capital REAL,
+    close_time INTEGER,
+    result TEXT,
+    closed_normally TEXT,
+    PRIMARY KEY (run_id, seq)
+) WITHOUT ROWID;
+"""
+
+# Columns runs can be ordered by in query(), as (table alias, column)
+ORDER_COLUMNS = {
+    "profit_factor": ("s", "profit_factor"),
+    "net_profit": ("s", "net_profit"),
+    "sharpe": ("s", "sharpe"),
+    "win_rate": ("s", "win_rate"),
+    "max_drawdown_pct": ("s", "max_drawdown_pct"),
+    "total_trades": ("s", "total_trades"),
+    "created": ("r", "created"),
+}
+
+# Filters matching at most this many runs are applied first and the matches sorted
+MATCH_SORT_LIMIT = 5000
+
+
+def symbol_of(candles_path):
+    """
+    Symbol of a candle file saved by Screen3 as data/<symbol>--<name>.csv.
+    """
+    stem = os.path.splitext(os.path.basename(candles_path or ""))[0]
+    return stem.split("--")[0]
+
+
+class RunHistory:
+    """
+    Every finished backtest in a local SQLite database: one row per run with
+    its inputs, data versions, parameters and timing, one row of aggregate
+    stats and its trade log.
+
+    The market columns, the parameters searched most (TP/SL) and the main
+    metrics are real indexed columns rather than JSON, so filtered and ranked
+    queries stay fast with hundreds of thousands of runs; the full formData
+    is kept as JSON next to them. Each thread gets its own connection, and
+    the database is in WAL mode so the browser can read while a worker writes.
+    """
+
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+            connection.executescript(SCHEMA)
+            # Runs recorded before non-finite metrics were stored as NULL
+            with connection:
+                connection.execute("UPDATE run_stats SET profit_factor = NULL"
+                                   " WHERE profit_factor IN (9e999, -9e999)")
+            self._local.connection = connection
+        return connection
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.execute("PRAGMA optimize")
+            connection.close()
+            self._local.connection = None
+
+    def add_runs(self, runs):
+        """
+        Record runs in one transaction.
+
+        :param runs: Iterable of dicts with candles_path and formData, and
+            optionally summary, stats (period rows), trades_df, seconds,
+            candles_digest and signals_digest.
+        :return: ids of the new runs.
+        """
+        from trade_simulation import ENGINE_VERSION
+
+        connection = self.connection()
+        ids = []
+        with connection:
+            for run in runs:
+                formData = run["formData"]
+                strategy = formData.get("SignalStrategy")
+                cursor = connection.execute(
+                    "INSERT INTO runs (created, symbol, timeframe, candles_path, candles_digest,"
+                    " signals_path, signals_digest, strategy, engine_version, capital, leverage,"
+                    " tp_percent, sl_percent, params, seconds)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        run.get("created", time.time()),
+                        symbol_of(run["candles_path"]),
+                        str(formData.get("interval")),
+                        run["candles_path"],
+                        run.get("candles_digest"),
+                        formData.get("File"),
+                        run.get("signals_digest"),
+                        strategy["strategy"] if strategy else None,
+                        ENGINE_VERSION,
+                        formData.get("Capital"),
+                        formData.get("Leverage"),
+                        formData.get("TP_percent"),
+                        formData.get("SL_percent"),
+                        json.dumps(formData, default=str),
+                        run.get("seconds"),
+                    ))
+                run_id = cursor.lastrowid
+                ids.append(run_id)
+
+                summary = run.get("summary") or {}
+                connection.execute(
+                    f"INSERT INTO run_stats (run_id, {', '.join(STAT_COLUMNS.values())}, periods)"
+                    f" VALUES ({', '.join('?' * (len(STAT_COLUMNS) + 2))})",
+                    (run_id, *(_plain(summary.get(key)) for key in STAT_COLUMNS),
+                     json.dumps(run.get("stats") or [], default=str)))
+
+                trades_df = run.get("trades_df")
+                if trades_df is not None and not trades_df.empty:
+                    connection.executemany(
+                        f"INSERT INTO trades (run_id, seq, {', '.join(TRADE_COLUMNS.values())})"
+                        f" VALUES ({', '.join('?' * (len(TRADE_COLUMNS) + 2))})",
+                        _trade_rows(run_id, trades_df))
+        return ids
+
+    def add_run(self, candles_path, formData, **run):
+        return self.add_runs([dict(run, candles_path=candles_path, formData=formData)])[0]
+
+    def query(self, symbol=None, timeframe=None, max_sl=None, min_trades=None,
+              order_by="profit_factor", descending=True, limit=20):
+        """
+        Runs matching the filters with their stats, best first.
+
+        :param max_sl: Only runs with SL % below this.
+        :param order_by: One of ORDER_COLUMNS. Runs without a value for it,
+            e.g. no profit factor for a run without losing trades, are left out.
+        """
+        run_where, run_args = [], []
+        if symbol:
+            run_where.append("r.symbol = ?")
+            run_args.append(symbol)
+        if timeframe:
+            run_where.append("r.timeframe = ?")
+            run_args.append(str(timeframe))
+        if max_sl is not None:
+            run_where.append("r.sl_percent < ?")
+            run_args.append(max_sl)
+
+        alias, column = ORDER_COLUMNS[order_by]
+        where = run_where + [f"{alias}.{column} IS NOT NULL"]
+        args = list(run_args)
+        if min_trades:
+            where.append("s.total_trades >= ?")
+            args.append(min_trades)
+
+        # SQLite's planner would pick the runs_market index and sort every
+        # match. When the filters match many runs it is far cheaper to walk
+        # the index of the ordering column and stop after limit matches;
+        # CROSS JOIN makes SQLite loop over that column's table first.
+        if run_where and self._matches_at_most(run_where, run_args, MATCH_SORT_LIMIT):
+            tables = "runs r JOIN run_stats s ON s.run_id = r.id"
+        elif alias == "s":
+            tables = "run_stats s CROSS JOIN runs r ON s.run_id = r.id"
+        else:
+            tables = "runs r CROSS JOIN run_stats s ON s.run_id = r.id"
+
+        sql = (
+            "SELECT r.id AS run_id, r.created, r.symbol, r.timeframe, r.strategy,"
+            " r.tp_percent, r.sl_percent, r.leverage, r.seconds,"
+            f" {', '.join('s.' + name for name in STAT_COLUMNS.values())}"
+            f" FROM {tables} WHERE {' AND '.join(where)}"
+            f" ORDER BY {alias}.{column} {'DESC' if descending else 'ASC'}"
+        )
+        if limit:
+            sql += " LIMIT ?"
+            args.append(int(limit))
+
+        cursor = self.connection().execute(sql, args)
+        frame = pd.DataFrame(cursor.fetchall(), columns=[d[0] for d in cursor.description])
+        frame["created"] = pd.to_datetime(frame["created"], unit="s").dt.floor("s")
+        return frame
+
+    def _matches_at_most(self, run_where, run_args, count):
+        # Counting stops after count + 1 runs, this never reads the whole index
+        matches = self.connection().execute(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM runs r WHERE {' AND '.join(run_where)} LIMIT ?)",
+            run_args + [count + 1]).fetchone()[0]
+        return matches <= count
+
+    def distinct(self, column):
+        """
+        Values of the symbol or timeframe column, for filter choices.
+        """
+        if column not in ("symbol", "timeframe"):
+            raise ValueError(f"Not a filter column: {column!r}")
+        # The market index holds both columns, this reads it rather than the table
+        rows = self.connection().execute(
+            f"SELECT DISTINCT {column} FROM runs WHERE {column} IS NOT NULL ORDER BY {column}")
+        return [row[0] for row in rows]
+
+    def count(self):
+        return self.connection().execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def load_run(self, run_id):
+        """
+        :return: (run, stats, trades_df) where run has candles_path and
+            formData, or None when the run is not in the history.
+        """
+        connection = self.connection()
+        row = connection.execute(
+            "SELECT r.candles_path, r.params, s.periods FROM runs r"
+            " LEFT JOIN run_stats s ON s.run_id = r.id WHERE r.id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        candles_path, params, periods = row
+
+        cursor = connection.execute(
+            f"SELECT {', '.join(TRADE_COLUMNS.values())} FROM trades WHERE run_id = ? ORDER BY seq",
+            (run_id,))
+        trades = cursor.fetchall()
+        trades_df = pd.DataFrame()
+        if trades:
+            trades_df = pd.DataFrame(trades, columns=list(TRADE_COLUMNS))
+            for column in ("Datetime", "Close_Time"):
+                trades_df[column] = from_epoch_ms(trades_df[column].to_numpy(np.int64))
+            trades_df["Month"] = trades_df["Datetime"].dt.to_period("M").astype(str)
+        run = {"run_id": run_id, "candles_path": candles_path, "formData": json.loads(params)}
+        return run, json.loads(periods or "[]"), trades_df
+
+    def delete_runs(self, run_ids):
+        connection = self.connection()
+        with connection:
+            connection.executemany("DELETE FROM runs WHERE id = ?", [(i,) for i in run_ids])
+
+
+def _plain(value):
+    # numpy scalars aren't accepted as SQLite parameters
+    value = value.item() if isinstance(value, np.generic) else value
+    # An infinite profit factor (no losing trade) would rank above every real
+    # one, metrics without a finite value are stored as NULL and not ranked
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def _trade_rows(run_id, trades_df):
+    columns = []
+    for column in TRADE_COLUMNS:
+        if column not in trades_df.columns:
+            columns.append([None] * len(trades_df))
+        elif column in ("Datetime", "Close_Time"):
+            columns.append(to_epoch_ms(trades_df[column]).tolist())
+        else:
+            columns.append(trades_df[column].to_numpy(dtype=object).tolist())
+    return ((run_id, seq, *values) for seq, values in enumerate(zip(*columns)))
+
+
+def record_backtest(candles_path, formData, stats, trades_df, seconds, history=None,
+                    summary=None):
+    """
+    Record a finished backtest in the history, with the digests of its input
+    files and its summary metrics. Failures are reported, not raised, a run
+    that finished is never lost to the history.
+
+    :param summary: Summary run_pipeline returned, computed from the trades
+        when not given.
+    """
+    from stats import compute_stats
+    from result_cache import default_cache
+
+    history = history or default_history()
+    if not history.enabled:
+        return None
+    try:
+        cache = default_cache()
+        if summary is None:
+            summary = {}
+            if trades_df is not None and not trades_df.empty:
+                _, summary = compute_stats(trades_df, formData.get("Capital", 1000))
+        return history.add_run(
+            candles_path, formData,
+            summary=summary,
+            stats=stats,
+            trades_df=trades_df,
+            seconds=seconds,
+            candles_digest=cache.file_digest(candles_path),
+            signals_digest=cache.file_digest(formData["File"]) if formData.get("File") else None,
+        )
+    except (sqlite3.Error, OSError) as e:
+        print(f"Could not record the run in the history: {e}")
+        return None
+
+
+_default = None
+
+
+def default_history():
+    global _default
+    if _default is None:
+        _default = RunHistory()
+    return _default
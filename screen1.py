@@ -1,11 +1,18 @@
 import os
-import pandas as pd
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QFormLayout, QLabel, QPushButton, QFileDialog,
-    QDoubleSpinBox, QCheckBox, QHBoxLayout, QComboBox, QApplication,
-    QDialog, QTableWidget, QTableWidgetItem, QMessageBox, QHeaderView
+    QDoubleSpinBox, QSpinBox, QCheckBox, QHBoxLayout, QComboBox, QApplication,
+    QDialog, QTableView, QMessageBox, QHeaderView, QLineEdit, QTimeEdit
 )
-from PyQt5.QtCore import QTimer
+from PyQt5.QtCore import Qt, QTime
+
+# Signal source -> (strategy, (first parameter, default), (second parameter, default))
+SIGNAL_SOURCES = {
+    "From File": None,
+    "EMA Crossover": ("ema_cross", ("fast", 9), ("slow", 21)),
+    "RSI": ("rsi", ("length", 14), ("oversold", 30)),
+    "Bollinger Bands": ("bollinger", ("length", 20), ("mult", 2)),
+}
 
 
 class Screen1(QWidget):
@@ -67,12 +74,67 @@ class Screen1(QWidget):
         ])
         form.addRow("Timeframe:", self.timeframe_combo)
 
+        # Which candle a signal is traded on when its time isn't a candle open time
+        self.signalMatchCombo = QComboBox()
+        self.signalMatchCombo.addItems(["Backward", "Forward", "Nearest"])
+        self.signalToleranceSpin = QDoubleSpinBox()
+        self.signalToleranceSpin.setSuffix(" s")
+        self.signalToleranceSpin.setDecimals(0)
+        self.signalToleranceSpin.setMaximum(86400)
+        signal_match_layout = QHBoxLayout()
+        signal_match_layout.addWidget(self.signalMatchCombo)
+        signal_match_layout.addWidget(self.signalToleranceSpin)
+        form.addRow("Signal Match:", signal_match_layout)
+
+        # Above 1 signals keep opening positions while others are still open
+        self.maxPositionsSpin = QSpinBox()
+        self.maxPositionsSpin.setRange(1, 100000)
+        form.addRow("Max Open Positions:", self.maxPositionsSpin)
+
+        # Exit rules on top of TP/SL, 0 (or unchecked) leaves a rule off
+        self.trailingStopSpin = QDoubleSpinBox()
+        self.trailingStopSpin.setSuffix(" %")
+        self.trailingStopSpin.setMaximum(1000)
+        form.addRow("Trailing Stop:", self.trailingStopSpin)
+
+        self.breakEvenSpin = QDoubleSpinBox()
+        self.breakEvenSpin.setSuffix(" %")
+        self.breakEvenSpin.setMaximum(1000)
+        form.addRow("Break-even After:", self.breakEvenSpin)
+
+        self.maxBarsSpin = QSpinBox()
+        self.maxBarsSpin.setMaximum(1000000)
+        form.addRow("Max Bars in Trade:", self.maxBarsSpin)
+
+        self.sessionCloseCheck = QCheckBox("Close at (UTC)")
+        self.sessionCloseEdit = QTimeEdit(QTime(0, 0))
+        self.sessionCloseEdit.setDisplayFormat("HH:mm")
+        session_close_layout = QHBoxLayout()
+        session_close_layout.addWidget(self.sessionCloseCheck)
+        session_close_layout.addWidget(self.sessionCloseEdit)
+        form.addRow("Session Close:", session_close_layout)
+
         self.withCompoundingCheck = QCheckBox("With Compounding")
         form.addRow(self.withCompoundingCheck)
 
         self.useAlternateSignalCheck = QCheckBox("Use Alternate Signal")
         form.addRow(self.useAlternateSignalCheck)
 
+        # Signals come from a file or are generated from the candles by a strategy
+        self.signalSourceCombo = QComboBox()
+        self.signalSourceCombo.addItems(list(SIGNAL_SOURCES))
+        self.signalParam1Spin = QDoubleSpinBox()
+        self.signalParam1Spin.setMaximum(10000)
+        self.signalParam2Spin = QDoubleSpinBox()
+        self.signalParam2Spin.setMaximum(10000)
+        signal_source_layout = QHBoxLayout()
+        signal_source_layout.addWidget(self.signalSourceCombo)
+        signal_source_layout.addWidget(self.signalParam1Spin)
+        signal_source_layout.addWidget(self.signalParam2Spin)
+        form.addRow("Signals:", signal_source_layout)
+        self.signalSourceCombo.currentTextChanged.connect(self.onSignalSourceChanged)
+        self.onSignalSourceChanged(self.signalSourceCombo.currentText())
+
         self.fileButton = QPushButton("Select File")
         self.fileLabel = QLabel("No file selected")
         fileLayout = QVBoxLayout()
@@ -88,11 +150,17 @@ class Screen1(QWidget):
         self.addNewButton = QPushButton("Add New")
         addNewLayout = QHBoxLayout()
         addNewLayout.addWidget(self.addNewButton)
+        self.historyButton = QPushButton("History")
+        addNewLayout.addWidget(self.historyButton)
+        self.sweepButton = QPushButton("Sweep")
+        addNewLayout.addWidget(self.sweepButton)
         layout.addLayout(addNewLayout)
 
         self.fileButton.clicked.connect(self.selectFile)
         self.submitButton.clicked.connect(self.submitForm)
         self.addNewButton.clicked.connect(self.navigateToScreen3)
+        self.historyButton.clicked.connect(self.mainWindow.showScreen4)
+        self.sweepButton.clicked.connect(self.mainWindow.showScreen5)
 
         self.selectedFile = None
 
@@ -120,8 +188,19 @@ class Screen1(QWidget):
         if not file_path or not os.path.exists(file_path):
             QMessageBox.warning(self, "Error", "No valid file selected.")
             return
+
+        # pandas and the table model load on first use to keep startup light
+        from table_models import DataFrameTableModel
+        from frame_memory import price_array
+        from dataset_cache import default_cache
+
         try:
-            data = pd.read_csv(file_path)
+            # The candles a backtest on this file loads too, shown with the prices
+            # as stored; the model shows the epoch ms times in the display timezone
+            candles = default_cache().candles(file_path)
+            data = candles.assign(**{
+                column: price_array(candles, column)
+                for column in candles.attrs.get("price_decimals", {})})
         except Exception as e:
             QMessageBox.warning(self, "Error", f"Could not load file: {e}")
             return
@@ -130,21 +209,33 @@ class Screen1(QWidget):
         dialog.setWindowTitle(f"Data in {os.path.basename(file_path)}")
         dialog.setGeometry(100, 100, 1200, 600)  # Set dialog size
         dialog_layout = QVBoxLayout(dialog)
-        table = QTableWidget()
-        dialog_layout.addWidget(table)
 
-        if not data.empty:
-            table.setColumnCount(len(data.columns))
-            table.setRowCount(len(data))
-            table.setHorizontalHeaderLabels(data.columns)
-            table.horizontalHeader().setStretchLastSection(True)  # Stretch the last section
-            table.horizontalHeader().setSectionResizeMode(
-                QHeaderView.Stretch)  # Stretch all sections
-
-            for row in range(len(data)):
-                for col in range(len(data.columns)):
-                    item = QTableWidgetItem(str(data.iat[row, col]))
-                    table.setItem(row, col, item)
+        model = DataFrameTableModel(data, dialog, timeColumns=["Datetime"])
+
+        # Filter row: pick a column and type text or a comparison like ">100"
+        filter_column = QComboBox()
+        filter_column.addItems(model.columnNames())
+        filter_edit = QLineEdit()
+        filter_edit.setPlaceholderText("Filter (text, >100, <=2.5 ...)")
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(filter_column)
+        filter_layout.addWidget(filter_edit)
+        dialog_layout.addLayout(filter_layout)
+
+        def apply_filter():
+            model.setFilter(filter_column.currentIndex(), filter_edit.text())
+        filter_edit.returnPressed.connect(apply_filter)
+        filter_column.currentIndexChanged.connect(apply_filter)
+
+        table = QTableView()
+        table.setModel(model)
+        # Keep file order until a header is clicked
+        table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        table.setSortingEnabled(True)
+        table.horizontalHeader().setStretchLastSection(True)  # Stretch the last section
+        table.horizontalHeader().setSectionResizeMode(
+            QHeaderView.Stretch)  # Stretch all sections
+        dialog_layout.addWidget(table)
 
         dialog.exec_()
 
@@ -158,6 +249,13 @@ class Screen1(QWidget):
         self.submitButton.setEnabled(False)
         self.submitButton.setText("Loading...")
 
+        # The backtest runs in a worker thread, MainWindow only starts it
+        self.processSubmission(self.formData())
+
+    def formData(self):
+        """
+        Parameters of a run as entered, the formData every screen passes on.
+        """
         timeframe_text = self.timeframe_combo.currentText()
 
         timeframe_map = {
@@ -167,7 +265,7 @@ class Screen1(QWidget):
         }
         interval = timeframe_map.get(timeframe_text, "1")
 
-        data = {
+        return {
             "Capital": self.capitalSpin.value(),
             "Leverage": self.leverageSpin.value(),
             "MakerFees": self.makerFeesSpin.value(),
@@ -177,10 +275,52 @@ class Screen1(QWidget):
             "File": self.selectedFile,
             "WithCompounding": self.withCompoundingCheck.isChecked(),
             "useAlternateSignal": self.useAlternateSignalCheck.isChecked(),
-            "interval": interval
+            "interval": interval,
+            "SignalMatch": self.signalMatchCombo.currentText().lower(),
+            "SignalTolerance": self.signalToleranceSpin.value(),
+            "MaxPositions": self.maxPositionsSpin.value(),
+            "ExitRules": self.exitRules(),
+            "SignalStrategy": self.signalStrategy()
         }
 
-        QTimer.singleShot(100, lambda: self.processSubmission(data))
+    def onSignalSourceChanged(self, text):
+        source = SIGNAL_SOURCES.get(text)
+        self.signalParam1Spin.setVisible(source is not None)
+        self.signalParam2Spin.setVisible(source is not None)
+        if source is None:
+            return
+        _, (name1, default1), (name2, default2) = source
+        self.signalParam1Spin.setPrefix(f"{name1} ")
+        self.signalParam1Spin.setValue(default1)
+        self.signalParam2Spin.setPrefix(f"{name2} ")
+        self.signalParam2Spin.setValue(default2)
+
+    def signalStrategy(self):
+        source = SIGNAL_SOURCES.get(self.signalSourceCombo.currentText())
+        if source is None:
+            return None
+        strategy, (name1, _), (name2, _) = source
+        config = {
+            "strategy": strategy,
+            name1: self.signalParam1Spin.value(),
+            name2: self.signalParam2Spin.value(),
+        }
+        if strategy == "rsi":
+            config["overbought"] = 100 - config["oversold"]
+        return config
+
+    def exitRules(self):
+        rules = []
+        if self.trailingStopSpin.value() > 0:
+            rules.append({"rule": "trailing_stop", "percent": self.trailingStopSpin.value()})
+        if self.breakEvenSpin.value() > 0:
+            rules.append({"rule": "break_even", "trigger_percent": self.breakEvenSpin.value()})
+        if self.maxBarsSpin.value() > 0:
+            rules.append({"rule": "max_bars", "bars": self.maxBarsSpin.value()})
+        if self.sessionCloseCheck.isChecked():
+            rules.append({"rule": "session_close",
+                          "time": self.sessionCloseEdit.time().toString("HH:mm")})
+        return rules
 
     def processSubmission(self, data):
         self.mainWindow.showScreen2(data)
@@ -1,6 +1,5 @@
 import os
 import pandas as pd
-import plotly.graph_objects as go
 from PyQt5.QtWidgets import (
     QWidget,
     QVBoxLayout,
@@ -13,11 +12,42 @@ from PyQt5.QtWidgets import (
     QPushButton,
     QDialog,
     QVBoxLayout,
-    QFileDialog
+    QFileDialog,
+    QTableView,
+    QHBoxLayout,
+    QProgressBar,
+    QComboBox
 )
-from PyQt5.QtWebEngineWidgets import QWebEngineView
-from PyQt5.QtCore import QUrl
-from tempfile import NamedTemporaryFile
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from table_models import TradesTableModel, ChartButtonDelegate
+from chart_data import load_candle_series
+from stats import compute_stats
+import profiling
+
+
+class ExportWorker(QThread):
+    progress_signal = pyqtSignal(int, int)
+    finished_signal = pyqtSignal(str)
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, path, fmt, trades_df, stats, meta):
+        super().__init__()
+        self.path = path
+        self.fmt = fmt
+        self.trades_df = trades_df
+        self.stats = stats
+        self.meta = meta
+
+    def run(self):
+        """Write the export off the GUI thread."""
+        from export import export_run
+
+        try:
+            export_run(self.path, self.trades_df, self.stats, self.meta, fmt=self.fmt,
+                       progress=self.progress_signal.emit)
+            self.finished_signal.emit(self.path)
+        except Exception as e:
+            self.error_signal.emit(f"Failed to export: {e}")
 
 
 class Screen2(QWidget):
@@ -37,23 +67,74 @@ class Screen2(QWidget):
         self.userInfoLayout = QFormLayout()
         self.layout.addLayout(self.userInfoLayout)
 
+        # Progress of the running backtest
+        self.progressLabel = QLabel("")
+        self.progressBar = QProgressBar()
+        self.progressBar.setRange(0, 100)
+        self.cancelButton = QPushButton("Cancel")
+        self.cancelButton.clicked.connect(self.cancelRun)
+        progressLayout = QHBoxLayout()
+        progressLayout.addWidget(self.progressLabel)
+        progressLayout.addWidget(self.progressBar)
+        progressLayout.addWidget(self.cancelButton)
+        self.layout.addLayout(progressLayout)
+        self.progressBar.hide()
+        self.cancelButton.hide()
+        self.partialTrades = []
+
         # Stats and trades tables
         self.statsTable = QTableWidget()
-        self.tradesTable = QTableWidget()
+        self.tradesTable = QTableView()
+        self.tradesModel = None
+        self.trades_df = None
+        self.formData = {}
+        self.chartDialog = None
+
+        # "View Chart" buttons are painted by a delegate instead of one widget per row
+        self.chartButtonDelegate = ChartButtonDelegate(self.tradesTable)
+        self.chartButtonDelegate.clicked.connect(self.onViewChartClicked)
+        self.tradesTable.setSortingEnabled(True)
+        self.tradesTable.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
 
         size_policy = QSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.statsTable.setSizePolicy(size_policy)
         self.tradesTable.setSizePolicy(size_policy)
 
+        # Stats period and whole-run summary
+        self.periodCombo = QComboBox()
+        self.periodCombo.addItems(["Day", "Week", "Month", "Year"])
+        self.periodCombo.setCurrentText("Month")
+        self.periodCombo.currentTextChanged.connect(self.onPeriodChanged)
+        self.summaryLabel = QLabel("")
+        self.summaryLabel.setWordWrap(True)
+        statsHeaderLayout = QHBoxLayout()
+        statsHeaderLayout.addWidget(QLabel("Stats per:"))
+        statsHeaderLayout.addWidget(self.periodCombo)
+        statsHeaderLayout.addWidget(self.summaryLabel, 1)
+        self.layout.addLayout(statsHeaderLayout)
+
         self.layout.addWidget(self.statsTable)
         self.layout.addWidget(self.tradesTable)
 
-        # Export to CSV button
-        self.exportButton = QPushButton("Export to CSV")
+        # Equity curve and Export to CSV buttons
+        self.equityButton = QPushButton("Equity Curve")
+        self.equityButton.clicked.connect(self.showEquityCurve)
+        self.exportButton = QPushButton("Export")
         self.exportButton.clicked.connect(self.exportToCSV)
-        self.layout.addWidget(self.exportButton)
+        self.profileButton = QPushButton("Profile")
+        self.profileButton.clicked.connect(self.mainWindow.showProfile)
+        buttonLayout = QHBoxLayout()
+        buttonLayout.addWidget(self.equityButton)
+        buttonLayout.addWidget(self.exportButton)
+        buttonLayout.addWidget(self.profileButton)
+        self.layout.addLayout(buttonLayout)
+        self.equityPanel = None
+        self.exportWorker = None
+        self.stats = []
+        self.summary = {}
 
     def updateUserInputs(self, formData):
+        self.formData = formData
         while self.userInfoLayout.count():
             child = self.userInfoLayout.takeAt(0)
             if child.widget():
@@ -61,10 +142,83 @@ class Screen2(QWidget):
         for key, value in formData.items():
             self.userInfoLayout.addRow(QLabel(f"{key}: "), QLabel(str(value)))
 
-    def updateTable(self, stats, trades_df):
-        # Update monthly stats table
-        self.trades_df = trades_df  # Save trades_df for export functionality
+    def beginRun(self):
+        self.updateTable([], None)
+        self.partialTrades = []
+        self.progressBar.setValue(0)
+        self.progressLabel.setText("Starting...")
+        self.progressBar.show()
+        self.cancelButton.show()
+        self.cancelButton.setEnabled(True)
+        self.exportButton.setEnabled(False)
+        self.equityButton.setEnabled(False)
+
+    def updateProgress(self, stage, percent, rate):
+        text = stage
+        if rate:
+            text += f" ({rate:,.0f} candles/s)"
+        self.progressLabel.setText(text)
+        self.progressBar.setValue(int(percent))
+
+    def appendTrades(self, partial_df):
+        # Partial results while the backtest is still running
+        self.partialTrades.append(partial_df)
+        if self.tradesModel is None:
+            self.updateTable([], partial_df)
+        else:
+            self.tradesModel.appendFrame(partial_df)
+
+    def endRun(self):
+        self.progressLabel.setText("Done")
+        self.progressBar.setValue(100)
+        self.cancelButton.hide()
+        self.exportButton.setEnabled(True)
+        self.equityButton.setEnabled(True)
+
+    def cancelRun(self):
+        self.mainWindow.cancelBacktest()
+        self.progressLabel.setText(
+            f"Cancelled, showing {sum(map(len, self.partialTrades))} trades completed so far")
+        self.cancelButton.hide()
+        if self.partialTrades:
+            self.trades_df = pd.concat(self.partialTrades, ignore_index=True)
+            self.updateStats(None)
+            self.exportButton.setEnabled(True)
+            self.equityButton.setEnabled(True)
+
+    def onPeriodChanged(self, period):
+        if self.trades_df is not None and not self.trades_df.empty:
+            self.updateStats(None)
+
+    def updateStats(self, stats, summary=None):
+        """
+        Fill the stats table and summary. The monthly stats and summary of
+        the run are shown as given; when stats is None, or the period
+        selector isn't on Month, they are computed from the current trades.
+        """
+        self.statsTable.clear()
+        self.statsTable.setRowCount(0)
+        self.statsTable.setColumnCount(0)
+        self.summaryLabel.setText("")
+        self.stats = []
+        self.summary = {}
+        if self.trades_df is None or self.trades_df.empty:
+            return
+
+        period = self.periodCombo.currentText().lower()
+        if stats is None or summary is None or period != "month":
+            stats, summary = compute_stats(
+                self.trades_df, self.formData.get("Capital", 1000), period=period)
+        self.stats = stats
+        self.summary = summary
 
+        self.summaryLabel.setText("   ".join(
+            f"{key}: {value:,.2f}" if isinstance(value, float) else f"{key}: {value}"
+            for key, value in summary.items()))
+        self.fillStatsTable(stats)
+
+    @profiling.traced("ui.fillStatsTable")
+    def fillStatsTable(self, stats):
         if stats:
             headers = list(stats[0].keys())
             num_data_rows = len(stats)
@@ -98,33 +252,31 @@ class Screen2(QWidget):
                     self.statsTable.setItem(
                         footer_row, c, QTableWidgetItem(""))
 
+    def updateTable(self, stats, trades_df, summary=None):
+        # Update monthly stats table
+        self.trades_df = trades_df  # Save trades_df for export functionality
+
+        self.updateStats(stats, summary)
+
         # Update trades table with "View Chart" button
         if trades_df is not None and not trades_df.empty:
-            trade_headers = list(trades_df.columns) + ["Actions"]
-            num_trade_rows = trades_df.shape[0]
-            self.tradesTable.setColumnCount(len(trade_headers))
-            self.tradesTable.setRowCount(num_trade_rows)
-            self.tradesTable.setHorizontalHeaderLabels(trade_headers)
-
-            header_trades = self.tradesTable.horizontalHeader()
-            header_trades.setSectionResizeMode(QHeaderView.Stretch)
-
-            for r in range(num_trade_rows):
-                for c, col in enumerate(trades_df.columns):
-                    value = trades_df.iloc[r][col]
-                    self.tradesTable.setItem(
-                        r, c, QTableWidgetItem(str(value)))
-
-                # Add "View Chart" button in the last column
-                view_button = QPushButton("View Chart")
-                view_button.clicked.connect(
-                    lambda checked, row=r: self.viewCandleChart(
-                        trades_df.iloc[row]["Datetime"],  # Trade open time
-                        trades_df.iloc[row]["Close_Time"]  # Trade close time
-                    )
-                )
-                self.tradesTable.setCellWidget(
-                    r, len(trade_headers) - 1, view_button)
+            with profiling.span("ui.tradesTable", rows=len(trades_df)):
+                self.tradesModel = TradesTableModel(trades_df, self)
+                self.tradesTable.setModel(self.tradesModel)
+                self.tradesTable.setItemDelegateForColumn(
+                    self.tradesModel.actionColumn, self.chartButtonDelegate)
+
+                header_trades = self.tradesTable.horizontalHeader()
+                header_trades.setSectionResizeMode(QHeaderView.Stretch)
+        else:
+            self.tradesModel = None
+            self.tradesTable.setModel(None)
+
+    def onViewChartClicked(self, row):
+        self.viewCandleChart(
+            self.tradesModel.value(row, "Datetime"),  # Trade open time
+            self.tradesModel.value(row, "Close_Time")  # Trade close time
+        )
 
     def viewCandleChart(self, open_time, close_time):
         # Fetch the selected Candle File from Screen1
@@ -133,124 +285,104 @@ class Screen2(QWidget):
             return
 
         try:
-            # Load candle data
-            candle_data = pd.read_csv(candle_file, parse_dates=["Datetime"])
-
-            # Find the indices for the open_time and close_time
-            open_idx = candle_data[candle_data['Datetime']
-                                   == pd.to_datetime(open_time)].index
-            close_idx = candle_data[candle_data['Datetime']
-                                    == pd.to_datetime(close_time)].index
-
-            if not open_idx.empty and not close_idx.empty:
-                open_idx = open_idx[0]
-                close_idx = close_idx[0]
-
-                # Adjust to include 30 candles before and after
-                start_idx = max(open_idx - 30, 0)
-                end_idx = min(close_idx + 30, len(candle_data) - 1)
-
-                # Filter the data for the expanded range
-                filtered_data = candle_data.iloc[start_idx:end_idx + 1].copy()
-            else:
-                return
+            series = load_candle_series(candle_file)
 
-            if filtered_data.empty:
+            # The trade's candles plus 30 before and after
+            window = series.window(open_time, close_time, padding=30)
+            if window is None:
                 return
 
-            # Create the candle chart
-            self.showCandleChart(
-                filtered_data, open_time=open_time, close_time=close_time)
+            if self.chartDialog is None:
+                from chart_view import CandleChartDialog  # plotly and QtWebEngine
+                self.chartDialog = CandleChartDialog(self)
+            self.chartDialog.chartView.showWindow(series, window, markers=[
+                (series.locate(open_time), "Trade Open", "Open", "blue"),
+                (series.locate(close_time), "Trade Close", "Close", "red"),
+            ])
+            self.chartDialog.showMaximized()
+            self.chartDialog.raise_()
         except Exception as e:
             return
 
-    def showCandleChart(self, filtered_data, open_time=None, close_time=None):
-        dialog = QDialog(self)
-        dialog.setWindowTitle("Candle Chart")
-        dialog.showMaximized()  # Show dialog in full screen
-
-        # Generate the candlestick chart using Plotly
-        fig = go.Figure(data=[
-            go.Candlestick(
-                x=filtered_data['Datetime'],
-                open=filtered_data['Open'],
-                high=filtered_data['High'],
-                low=filtered_data['Low'],
-                close=filtered_data['Close'],
-                increasing_line_color='limegreen',
-                decreasing_line_color='tomato',
-            )
-        ])
-
-        # Add scatter points for open and close trade times
-        if open_time:
-            fig.add_trace(
-                go.Scatter(
-                    x=[pd.to_datetime(open_time)],
-                    y=[filtered_data.loc[filtered_data['Datetime'] ==
-                                         pd.to_datetime(open_time), 'High'].iloc[0]],
-                    mode="markers+text",
-                    name="Trade Open",
-                    text=["Open"],
-                    textposition="top center",
-                    marker=dict(color="blue", size=10, symbol="circle"),
-                )
-            )
-        if close_time:
-            fig.add_trace(
-                go.Scatter(
-                    x=[pd.to_datetime(close_time)],
-                    y=[filtered_data.loc[filtered_data['Datetime'] ==
-                                         pd.to_datetime(close_time), 'High'].iloc[0]],
-                    mode="markers+text",
-                    name="Trade Close",
-                    text=["Close"],
-                    textposition="top center",
-                    marker=dict(color="red", size=10, symbol="circle"),
-                )
-            )
-
-        # Update layout for dark theme and better visuals
-        fig.update_layout(
-            title="Candle Chart with Trade Points",
-            xaxis_title="Datetime",
-            yaxis_title="Price",
-            template="plotly_dark",  # Apply the dark theme
-            xaxis_rangeslider_visible=False,
-            font=dict(color="white"),
-        )
-
-        # Save the chart as an HTML file
-        with NamedTemporaryFile(delete=False, suffix=".html") as tmp:
-            fig.write_html(tmp.name)
-            chart_file = tmp.name
-
-        # Display the chart in a QWebEngineView
-        web_view = QWebEngineView()
-        web_view.setUrl(QUrl.fromLocalFile(chart_file))
-        dialog_layout = QVBoxLayout(dialog)
-        dialog_layout.addWidget(web_view)
-        dialog.exec_()
+    def showEquityCurve(self):
+        if self.trades_df is None or self.trades_df.empty:
+            return
 
-        # Cleanup temporary HTML file
-        os.remove(chart_file)
+        candle_file = self.mainWindow.screen1.candleFileCombo.currentText()
+        series = None
+        if candle_file and os.path.exists(candle_file):
+            series = load_candle_series(candle_file)
+
+        if self.equityPanel is None:
+            from equity_view import EquityPanel
+            self.equityPanel = EquityPanel(self)
+        self.equityPanel.setRun(
+            self.trades_df,
+            series,
+            self.formData.get("Capital", 1000),
+            self.formData.get("Leverage", 1),
+            self.formData.get("WithCompounding", False)
+        )
+        self.equityPanel.show()
+        self.equityPanel.raise_()
 
     def exportToCSV(self):
+        """
+        Export the trades, the stats shown and the run parameters in the
+        background, as CSV files or a columnar directory.
+        """
         if self.trades_df is None or self.trades_df.empty:
             return
+        if self.exportWorker is not None and self.exportWorker.isRunning():
+            return
+
+        from export import COLUMNAR_EXTENSION, run_metadata
 
+        csv_filter = "CSV Files (*.csv)"
+        columnar_filter = f"Columnar (*{COLUMNAR_EXTENSION})"
         options = QFileDialog.Options()
-        file_path, _ = QFileDialog.getSaveFileName(
-            self, "Save Trades to CSV", "", "CSV Files (*.csv);;All Files (*)", options=options
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self, "Export Trades", "", f"{csv_filter};;{columnar_filter}", options=options
         )
-        if file_path:
-            try:
-                self.trades_df.to_csv(file_path, index=False)
-                print(f"Trades saved successfully to {file_path}")
-            except Exception as e:
-                print(f"Failed to save trades: {e}")
+        if not file_path:
+            return
+
+        fmt = "columnar" if selected_filter == columnar_filter else "csv"
+        if fmt == "columnar" and not file_path.endswith(COLUMNAR_EXTENSION):
+            file_path += COLUMNAR_EXTENSION
+
+        candle_file = self.mainWindow.screen1.candleFileCombo.currentText()
+        meta = run_metadata(self.formData, self.summary, candles_path=candle_file,
+                            period=self.periodCombo.currentText())
+
+        # The worker only reads trades_df, so it shares the frame instead of copying it
+        self.exportWorker = ExportWorker(
+            file_path, fmt, self.trades_df, self.stats, meta)
+        self.exportWorker.progress_signal.connect(self.onExportProgress)
+        self.exportWorker.finished_signal.connect(self.onExportFinished)
+        self.exportWorker.error_signal.connect(self.onExportError)
+        self.exportButton.setEnabled(False)
+        self.progressBar.setValue(0)
+        self.progressBar.show()
+        self.exportWorker.start()
+
+    def onExportProgress(self, written, total):
+        self.progressLabel.setText(f"Exporting {written:,} / {total:,} rows")
+        self.progressBar.setValue(int(100 * written / total) if total else 100)
+
+    def onExportFinished(self, path):
+        self.exportButton.setEnabled(True)
+        self.progressLabel.setText(f"Exported to {path}")
+        print(f"Trades saved successfully to {path}")
+
+    def onExportError(self, message):
+        self.exportButton.setEnabled(True)
+        self.progressLabel.setText(message)
+        print(message)
 
     def goBack(self):
+        self.mainWindow.cancelBacktest()
+
         # Reset form fields on Screen1
         self.mainWindow.screen1.capitalSpin.setValue(0)
         self.mainWindow.screen1.leverageSpin.setValue(0)
@@ -258,6 +390,14 @@ class Screen2(QWidget):
         self.mainWindow.screen1.takerFeesSpin.setValue(0)
         self.mainWindow.screen1.tpPercentSpin.setValue(0)
         self.mainWindow.screen1.slPercentSpin.setValue(0)
+        self.mainWindow.screen1.signalMatchCombo.setCurrentIndex(0)
+        self.mainWindow.screen1.signalToleranceSpin.setValue(0)
+        self.mainWindow.screen1.maxPositionsSpin.setValue(1)
+        self.mainWindow.screen1.trailingStopSpin.setValue(0)
+        self.mainWindow.screen1.breakEvenSpin.setValue(0)
+        self.mainWindow.screen1.maxBarsSpin.setValue(0)
+        self.mainWindow.screen1.sessionCloseCheck.setChecked(False)
+        self.mainWindow.screen1.signalSourceCombo.setCurrentIndex(0)
         self.mainWindow.screen1.candleFileCombo.setCurrentIndex(0)
         self.mainWindow.screen1.fileLabel.setText("No file selected")
 
@@ -9,6 +9,8 @@ import time
 import traceback
 import pandas as pd
 from binance_data import BinanceData
+from live_feed import LiveFeed, BinanceStreamTransport
+from time_axis import from_epoch_ms
 
 
 class DownloadWorker(QThread):
@@ -60,12 +62,81 @@ class DownloadWorker(QThread):
             self.error_signal.emit(error_msg)
 
 
+class LiveFeedWorker(QThread):
+    log_signal = pyqtSignal(str)
+
+    def __init__(self, binance_data, symbol):
+        super().__init__()
+        self.binance_data = binance_data
+        self.symbol = symbol
+        self.feed = LiveFeed(
+            BinanceStreamTransport(symbol, binance_data.interval),
+            binance_data.data_handler,
+            on_candle=self.on_candle
+        )
+        self.stop_requested = False
+
+    def run(self):
+        """Backfill the gap since the last stored candle, then follow the stream."""
+        try:
+            data = self.binance_data.data_handler.get_data()
+            if len(data.index) > 0:
+                count = self.backfill(int(data.index[-1]) + 1)
+                self.log_signal.emit(f"Backfilled {count} candles for {self.symbol}.")
+            if self.stop_requested:
+                return
+
+            self.log_signal.emit(f"Live feed started for {self.symbol}.")
+            self.feed.run()
+            self.log_signal.emit(f"Live feed stopped for {self.symbol}.")
+        except Exception as e:
+            self.log_signal.emit(
+                f"Live feed error: {e}\n{traceback.format_exc()}")
+
+    def backfill(self, start_time, limit=1000):
+        """
+        Store the closed klines from start_time up to now, page by page.
+
+        :return: Number of candles stored.
+        """
+        count = 0
+        while not self.stop_requested:
+            chunk_data = self.binance_data.fetch_kline_data(start_time=start_time, limit=limit)
+            if not chunk_data:
+                break
+            now = int(time.time() * 1000)
+            for kline in chunk_data:
+                # A kline still forming is left to the stream, which delivers it once closed
+                if int(kline[6]) >= now:
+                    return count
+                self.feed.handle_kline(kline)
+                count += 1
+            if len(chunk_data) < limit:
+                break
+            start_time = int(chunk_data[-1][0]) + 1
+
+            # Introduce a small delay to avoid hitting API rate limits
+            time.sleep(1)
+        return count
+
+    def on_candle(self, row, completed):
+        self.log_signal.emit(
+            f"{self.symbol} {from_epoch_ms(row['Datetime'])} close {row['Close']}")
+
+    def stop(self):
+        self.stop_requested = True
+        self.feed.stop()
+
+
 class Screen3(QWidget):
     def __init__(self, mainWindow, parent=None):
         super().__init__(parent)
         self.mainWindow = mainWindow
         self.added_symbols = []
         self.download_threads = []
+        self.live_workers = {}
+        # Stopped live workers, kept until their thread ends
+        self.stopped_live_workers = []
         self.load_symbols()
 
         # Main layout
@@ -203,20 +274,57 @@ class Screen3(QWidget):
             child = self.symbols_layout.takeAt(0)
             if child.widget():
                 child.widget().deleteLater()
+            elif child.layout():
+                while child.layout().count():
+                    inner = child.layout().takeAt(0)
+                    if inner.widget():
+                        inner.widget().deleteLater()
 
         for symbol_info in self.added_symbols:
             h_layout = QHBoxLayout()
             label = QLabel(f"{symbol_info['symbol']} - {symbol_info['file']}")
+            live_button = QPushButton(
+                "Stop Live" if symbol_info["file"] in self.live_workers else "Go Live")
+            live_button.clicked.connect(
+                lambda checked, s=symbol_info: self.toggle_live(s))
             delete_button = QPushButton("Delete")
             delete_button.clicked.connect(
                 lambda checked, s=symbol_info: self.delete_symbol(s))
             h_layout.addWidget(label)
+            h_layout.addWidget(live_button)
             h_layout.addWidget(delete_button)
             self.symbols_layout.addLayout(h_layout)
 
+    def toggle_live(self, symbol_info):
+        """Start or stop keeping a symbol's candle file current."""
+        file_path = symbol_info["file"]
+        worker = self.live_workers.pop(file_path, None)
+        if worker is not None:
+            if not worker.isFinished():
+                self.stopped_live_workers.append(worker)
+                worker.finished.connect(
+                    lambda w=worker: self.stopped_live_workers.remove(w))
+            worker.stop()
+        else:
+            binance_data = BinanceData(
+                api_url="https://fapi.binance.com",
+                symbol=symbol_info["symbol"],
+                interval="1m",
+                file=file_path
+            )
+            worker = LiveFeedWorker(binance_data, symbol_info["symbol"])
+            worker.log_signal.connect(self.log_text_edit.appendPlainText)
+            self.live_workers[file_path] = worker
+            worker.start()
+        self.update_symbol_list()
+
     def delete_symbol(self, symbol_info):
         """Delete a symbol and its associated file."""
         file_path = symbol_info["file"]
+        worker = self.live_workers.pop(file_path, None)
+        if worker is not None:
+            worker.stop()
+            worker.wait()
         if os.path.exists(file_path):
             os.remove(file_path)
         self.added_symbols = [
@@ -0,0 +1,165 @@
+import time
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QComboBox,
+    QDoubleSpinBox, QSpinBox, QTableView, QHeaderView, QAbstractItemView, QMessageBox
+)
+from PyQt5.QtCore import Qt
+from table_models import DataFrameTableModel
+from run_history import default_history
+
+# Sort choice -> (history column, descending)
+SORT_CHOICES = {
+    "Profit Factor": ("profit_factor", True),
+    "Net Profit/Loss": ("net_profit", True),
+    "Sharpe": ("sharpe", True),
+    "Win Rate %": ("win_rate", True),
+    "Lowest Max Drawdown %": ("max_drawdown_pct", False),
+    "Most Trades": ("total_trades", True),
+    "Newest": ("created", True),
+}
+
+ALL = "All"
+
+
+class Screen4(QWidget):
+    """
+    Browser over the run history: filter and rank recorded runs, and open
+    one in Screen2.
+    """
+
+    def __init__(self, mainWindow, parent=None):
+        super().__init__(parent)
+        self.mainWindow = mainWindow
+        self.history = default_history()
+        self.runs = None
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(40, 40, 40, 40)
+
+        self.backButton = QPushButton("Back")
+        self.backButton.clicked.connect(self.goBack)
+        layout.addWidget(self.backButton)
+
+        self.symbolCombo = QComboBox()
+        self.timeframeCombo = QComboBox()
+
+        self.maxSlSpin = QDoubleSpinBox()
+        self.maxSlSpin.setSuffix(" %")
+        self.maxSlSpin.setMaximum(1000)
+        self.maxSlSpin.setSpecialValueText("Any")  # 0 means no SL filter
+
+        self.minTradesSpin = QSpinBox()
+        self.minTradesSpin.setMaximum(10_000_000)
+
+        self.sortCombo = QComboBox()
+        self.sortCombo.addItems(list(SORT_CHOICES))
+
+        self.limitSpin = QSpinBox()
+        self.limitSpin.setRange(1, 100_000)
+        self.limitSpin.setValue(20)
+
+        self.searchButton = QPushButton("Search")
+        self.searchButton.clicked.connect(self.search)
+
+        filterLayout = QHBoxLayout()
+        for label, widget in (("Symbol:", self.symbolCombo), ("Timeframe:", self.timeframeCombo),
+                              ("SL below:", self.maxSlSpin), ("Min trades:", self.minTradesSpin),
+                              ("Sort by:", self.sortCombo), ("Top:", self.limitSpin)):
+            filterLayout.addWidget(QLabel(label))
+            filterLayout.addWidget(widget)
+        filterLayout.addWidget(self.searchButton)
+        layout.addLayout(filterLayout)
+
+        self.resultLabel = QLabel("")
+        layout.addWidget(self.resultLabel)
+
+        self.runsTable = QTableView()
+        self.runsTable.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.runsTable.doubleClicked.connect(self.openRun)
+        layout.addWidget(self.runsTable)
+
+        self.openButton = QPushButton("Open")
+        self.openButton.clicked.connect(self.openRun)
+        self.deleteButton = QPushButton("Delete")
+        self.deleteButton.clicked.connect(self.deleteRuns)
+        buttonLayout = QHBoxLayout()
+        buttonLayout.addWidget(self.openButton)
+        buttonLayout.addWidget(self.deleteButton)
+        layout.addLayout(buttonLayout)
+
+    def refresh(self):
+        """
+        Reload the filter choices and search again, runs may have been added.
+        """
+        for combo, column in ((self.symbolCombo, "symbol"), (self.timeframeCombo, "timeframe")):
+            current = combo.currentText()
+            combo.clear()
+            combo.addItem(ALL)
+            combo.addItems(self.history.distinct(column))
+            combo.setCurrentText(current or ALL)
+        self.search()
+
+    def search(self):
+        order_by, descending = SORT_CHOICES[self.sortCombo.currentText()]
+        started = time.perf_counter()
+        self.runs = self.history.query(
+            symbol=None if self.symbolCombo.currentText() in ("", ALL) else self.symbolCombo.currentText(),
+            timeframe=None if self.timeframeCombo.currentText() in ("", ALL) else self.timeframeCombo.currentText(),
+            max_sl=self.maxSlSpin.value() or None,
+            min_trades=self.minTradesSpin.value(),
+            order_by=order_by,
+            descending=descending,
+            limit=self.limitSpin.value(),
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.resultLabel.setText(
+            f"{len(self.runs):,} of {self.history.count():,} runs ({elapsed_ms:.1f} ms)")
+
+        self.runsModel = DataFrameTableModel(self.runs, self)
+        self.runsTable.setModel(self.runsModel)
+        self.runsTable.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        # Keep the query's ranking until a header is clicked
+        self.runsTable.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.runsTable.setSortingEnabled(True)
+
+    def selectedRunIds(self):
+        if self.runs is None or self.runsTable.selectionModel() is None:
+            return []
+        rows = sorted({index.row() for index in self.runsTable.selectionModel().selectedRows()})
+        return [int(self.runs["run_id"].iloc[self.runsModel.sourceRow(row)]) for row in rows]
+
+    def openRun(self):
+        run_ids = self.selectedRunIds()
+        if not run_ids:
+            return
+        loaded = self.history.load_run(run_ids[0])
+        if loaded is None:
+            return
+        run, stats, trades_df = loaded
+
+        # Screen2's charts read the candle file selected in Screen1
+        screen1 = self.mainWindow.screen1
+        index = screen1.candleFileCombo.findText(run["candles_path"])
+        if index >= 0:
+            screen1.candleFileCombo.setCurrentIndex(index)
+
+        screen2 = self.mainWindow.ensureScreen2()
+        screen2.updateUserInputs(run["formData"])
+        screen2.beginRun()
+        screen2.updateTable(stats, trades_df)
+        screen2.endRun()
+        screen2.progressLabel.setText(f"Run {run['run_id']} from the history")
+        self.mainWindow.stack.setCurrentWidget(screen2)
+
+    def deleteRuns(self):
+        run_ids = self.selectedRunIds()
+        if not run_ids:
+            return
+        answer = QMessageBox.question(
+            self, "Delete Runs", f"Delete {len(run_ids)} run(s) from the history?")
+        if answer == QMessageBox.Yes:
+            self.history.delete_runs(run_ids)
+            self.search()
+
+    def goBack(self):
+        self.mainWindow.stack.setCurrentWidget(self.mainWindow.screen1)
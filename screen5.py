@@ -0,0 +1,299 @@
+import os
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QComboBox,
+    QDoubleSpinBox, QSpinBox, QLineEdit, QMessageBox
+)
+from PyQt5.QtCore import QThread, QTimer, pyqtSignal
+from sweep import grid_runs, run_pool, SweepGrid
+
+METRICS = [
+    "Net Profit/Loss", "Profit Factor", "Win Rate %", "Sharpe", "Sortino",
+    "Expectancy", "Max Drawdown %", "Total Trades",
+]
+# Metrics where a lower value is the better one, drawn with the colours reversed
+LOWER_IS_BETTER = {"Max Drawdown %", "Max Drawdown", "Max Loss Streak"}
+MAX_TICKS = 12
+
+
+class SweepWorker(QThread):
+    results_signal = pyqtSignal(object)
+    finished_signal = pyqtSignal(int)
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, runs, workers):
+        super().__init__()
+        self.runs = runs
+        self.workers = workers
+        self.cancel_requested = False
+
+    def run(self):
+        """Run the sweep in a process pool, results reach the UI in batches."""
+        try:
+            results = run_pool(self.runs, self.workers, on_results=self.results_signal.emit,
+                               should_stop=lambda: self.cancel_requested)
+            self.finished_signal.emit(len(results))
+        except Exception as e:
+            self.error_signal.emit(f"Error during sweep: {e}")
+
+    def cancel(self):
+        self.cancel_requested = True
+
+
+def _steps(start, stop, step):
+    count = int(np.floor((stop - start) / step + 1e-9)) + 1
+    return [round(start + i * step, 6) for i in range(max(count, 1))]
+
+
+class Screen5(QWidget):
+    """
+    TP% x SL% (x leverage) sweep on the candle file and parameters of
+    Screen1, shown as a heatmap of one metric that fills in as runs finish.
+    Clicking a cell opens its run in Screen2.
+    """
+
+    def __init__(self, mainWindow, parent=None):
+        super().__init__(parent)
+        self.mainWindow = mainWindow
+        self.worker = None
+        self.workers = []
+        self.grid = None
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(40, 40, 40, 40)
+
+        self.backButton = QPushButton("Back")
+        self.backButton.clicked.connect(self.goBack)
+        layout.addWidget(self.backButton)
+
+        self.tpSpins = self.rangeSpins(0.1, 5.0, 0.1)
+        self.slSpins = self.rangeSpins(0.1, 5.0, 0.1)
+        self.leverageEdit = QLineEdit()
+        self.leverageEdit.setPlaceholderText("Screen1's")
+        self.workersSpin = QSpinBox()
+        self.workersSpin.setRange(1, 256)
+        self.workersSpin.setValue(os.cpu_count() or 1)
+
+        self.startButton = QPushButton("Start")
+        self.startButton.clicked.connect(self.startSweep)
+        self.stopButton = QPushButton("Stop")
+        self.stopButton.clicked.connect(self.stopSweep)
+        self.stopButton.setEnabled(False)
+
+        gridLayout = QHBoxLayout()
+        for label, spins in (("TP % from/to/step:", self.tpSpins),
+                             ("SL % from/to/step:", self.slSpins)):
+            gridLayout.addWidget(QLabel(label))
+            for spin in spins:
+                gridLayout.addWidget(spin)
+        for label, widget in (("Leverages:", self.leverageEdit), ("Workers:", self.workersSpin)):
+            gridLayout.addWidget(QLabel(label))
+            gridLayout.addWidget(widget)
+        gridLayout.addWidget(self.startButton)
+        gridLayout.addWidget(self.stopButton)
+        layout.addLayout(gridLayout)
+
+        self.metricCombo = QComboBox()
+        self.metricCombo.addItems(METRICS)
+        self.metricCombo.currentTextChanged.connect(self.redraw)
+        self.leverageCombo = QComboBox()
+        self.leverageCombo.currentIndexChanged.connect(self.redraw)
+        self.progressLabel = QLabel("")
+        self.cellLabel = QLabel("")
+
+        viewLayout = QHBoxLayout()
+        viewLayout.addWidget(QLabel("Metric:"))
+        viewLayout.addWidget(self.metricCombo)
+        viewLayout.addWidget(QLabel("Leverage:"))
+        viewLayout.addWidget(self.leverageCombo)
+        viewLayout.addWidget(self.progressLabel)
+        viewLayout.addStretch()
+        viewLayout.addWidget(self.cellLabel)
+        layout.addLayout(viewLayout)
+
+        self.figure = Figure(facecolor="#111111")
+        self.canvas = FigureCanvasQTAgg(self.figure)
+        self.axes = self.figure.add_subplot(1, 1, 1)
+        self.axes.set_facecolor("#111111")
+        self.axes.tick_params(colors="white")
+        self.axes.set_xlabel("TP %", color="white")
+        self.axes.set_ylabel("SL %", color="white")
+        # One image whatever the number of cells; NaN cells stay transparent
+        self.image = self.axes.imshow(np.full((1, 1), np.nan), origin="lower", aspect="auto",
+                                      interpolation="nearest", cmap="RdYlGn")
+        self.colorbar = self.figure.colorbar(self.image, ax=self.axes)
+        self.colorbar.ax.tick_params(colors="white")
+        self.canvas.mpl_connect("button_press_event", self.onCanvasClicked)
+        self.canvas.mpl_connect("motion_notify_event", self.onCanvasMoved)
+        layout.addWidget(self.canvas)
+
+        # Coalesce result batches into one redraw
+        self.redrawTimer = QTimer(self)
+        self.redrawTimer.setSingleShot(True)
+        self.redrawTimer.setInterval(100)
+        self.redrawTimer.timeout.connect(self.redraw)
+
+    def rangeSpins(self, start, stop, step):
+        spins = []
+        for value in (start, stop, step):
+            spin = QDoubleSpinBox()
+            spin.setDecimals(3)
+            spin.setRange(0.001, 1000)
+            spin.setSingleStep(0.1)
+            spin.setValue(value)
+            spins.append(spin)
+        return spins
+
+    def leverages(self):
+        text = self.leverageEdit.text().strip()
+        if not text:
+            return None
+        return [float(value) for value in text.split(",") if value.strip()]
+
+    def startSweep(self):
+        screen1 = self.mainWindow.screen1
+        candles_path = screen1.candleFileCombo.currentText()
+        base = screen1.formData()
+        if not candles_path:
+            QMessageBox.warning(self, "Error", "Select a Candle File in the main screen first.")
+            return
+        if not base.get("File") and not base.get("SignalStrategy"):
+            QMessageBox.warning(self, "Error", "Select a Signals File or a signal strategy "
+                                               "in the main screen first.")
+            return
+        try:
+            leverages = self.leverages()
+        except ValueError:
+            QMessageBox.warning(self, "Error", "Leverages must be numbers separated by commas.")
+            return
+
+        tp_values = _steps(*(spin.value() for spin in self.tpSpins))
+        sl_values = _steps(*(spin.value() for spin in self.slSpins))
+        runs = grid_runs([candles_path], [base["interval"]], tp_values, sl_values, base, leverages)
+
+        self.stopSweep()
+        self.grid = SweepGrid(runs)
+        self.leverageCombo.blockSignals(True)
+        self.leverageCombo.clear()
+        self.leverageCombo.addItems([f"{value:g}" for value in self.grid.leverage_values])
+        self.leverageCombo.blockSignals(False)
+        self.setAxes()
+
+        worker = SweepWorker(runs, self.workersSpin.value())
+        worker.results_signal.connect(self.onResults)
+        worker.finished_signal.connect(self.onSweepFinished)
+        worker.error_signal.connect(self.onSweepError)
+        # Keep a reference until the thread ends, a stopped sweep finishes its running runs
+        worker.finished.connect(lambda: self.workers.remove(worker))
+        self.workers.append(worker)
+        self.worker = worker
+        self.startButton.setEnabled(False)
+        self.stopButton.setEnabled(True)
+        self.updateProgress()
+        worker.start()
+
+    def stopSweep(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+        self.startButton.setEnabled(True)
+        self.stopButton.setEnabled(False)
+
+    # Signals from a sweep that was stopped or replaced are ignored
+    def onResults(self, results):
+        if self.sender() is self.worker:
+            self.grid.add(results)
+            self.updateProgress()
+            if not self.redrawTimer.isActive():
+                self.redrawTimer.start()
+
+    def onSweepFinished(self, count):
+        if self.sender() is self.worker:
+            self.stopSweep()
+            self.updateProgress()
+            self.redraw()
+
+    def onSweepError(self, message):
+        if self.sender() is self.worker:
+            self.stopSweep()
+            QMessageBox.warning(self, "Error", message)
+
+    def updateProgress(self):
+        if self.grid is None:
+            return
+        text = f"{self.grid.finished:,} / {len(self.grid):,} runs"
+        if self.grid.errors:
+            text += f", {len(self.grid.errors):,} failed"
+        self.progressLabel.setText(text)
+
+    def setAxes(self):
+        rows, columns = len(self.grid.sl_values), len(self.grid.tp_values)
+        self.image.set_extent((-0.5, columns - 0.5, -0.5, rows - 0.5))
+        for axis, values in ((self.axes.xaxis, self.grid.tp_values),
+                             (self.axes.yaxis, self.grid.sl_values)):
+            ticks = range(0, len(values), max(1, -(-len(values) // MAX_TICKS)))
+            axis.set_ticks(list(ticks))
+            axis.set_ticklabels([f"{values[i]:g}" for i in ticks])
+        self.redraw()
+
+    def currentValues(self):
+        values = self.grid.metric(self.metricCombo.currentText())
+        return values[max(self.leverageCombo.currentIndex(), 0)]
+
+    def redraw(self):
+        if self.grid is None:
+            return
+        metric = self.metricCombo.currentText()
+        values = np.ma.masked_invalid(self.currentValues())
+        self.image.set_data(values)
+        self.image.set_cmap("RdYlGn_r" if metric in LOWER_IS_BETTER else "RdYlGn")
+        if values.count():
+            low, high = values.min(), values.max()
+            self.image.set_clim(low, high if high > low else low + 1)
+        self.colorbar.update_normal(self.image)
+        self.colorbar.ax.set_ylabel(metric, color="white")
+        self.canvas.draw_idle()
+
+    def cellAt(self, event):
+        if self.grid is None or event.inaxes is not self.axes or event.xdata is None:
+            return None
+        tp, sl = int(round(event.xdata)), int(round(event.ydata))
+        if not (0 <= tp < len(self.grid.tp_values) and 0 <= sl < len(self.grid.sl_values)):
+            return None
+        return max(self.leverageCombo.currentIndex(), 0), sl, tp
+
+    def onCanvasMoved(self, event):
+        cell = self.cellAt(event)
+        if cell is None:
+            self.cellLabel.setText("")
+            return
+        _, sl, tp = cell
+        value = self.grid.metric(self.metricCombo.currentText())[cell]
+        error = self.grid.errors.get(cell)
+        shown = "failed" if error else ("pending" if np.isnan(value) else f"{value:,.4g}")
+        self.cellLabel.setText(
+            f"TP {self.grid.tp_values[tp]:g}%  SL {self.grid.sl_values[sl]:g}%: {shown}")
+
+    def onCanvasClicked(self, event):
+        cell = self.cellAt(event)
+        if cell is None:
+            return
+        if self.grid.errors.get(cell):
+            QMessageBox.warning(self, "Error", self.grid.errors[cell])
+            return
+        if np.isnan(self.grid.metric("Total Trades")[cell]):
+            return  # Not finished yet
+        self.openRun(self.grid.runs[cell])
+
+    def openRun(self, run):
+        # Screen2 runs the backtest on the candle file selected in Screen1
+        screen1 = self.mainWindow.screen1
+        index = screen1.candleFileCombo.findText(run["candles_path"])
+        if index >= 0:
+            screen1.candleFileCombo.setCurrentIndex(index)
+        self.mainWindow.showScreen2(dict(run["formData"]))
+
+    def goBack(self):
+        self.mainWindow.stack.setCurrentWidget(self.mainWindow.screen1)
@@ -0,0 +1,484 @@
+"""
+Local HTTP/JSON backtest service, so scripts and dashboards can share one
+warm engine:
+
+    python server.py --port 8765 --workers 4
+
+    POST   /runs                {"candles_path": "data/BTCUSDT--all.csv", "formData": {...}}
+    POST   /sweeps              {"candles": [...], "intervals": ["15"], "tp": [0.5, 1],
+                                 "sl": [0.3], "leverage": [1, 2], "base": {...}}
+    GET    /jobs                status of every job
+    GET    /jobs/<id>           status and progress of a job
+    GET    /jobs/<id>/stats     summary and monthly stats of a run, ranked results of a sweep
+                                (?rank_by=Sharpe&ascending=1)
+    GET    /jobs/<id>/trades    trades of a run as JSON records, or ?format=npz
+    DELETE /jobs/<id>           cancel the runs of a job that have not started
+
+Submissions are answered 202 with the job id. Runs wait in a bounded queue,
+a submission that would overflow it is refused with 429 and Retry-After.
+When a worker process dies its pool is replaced; the runs it had queued
+fail and a submission caught by the breakage gets 503 and Retry-After.
+Each worker process keeps the candle and signal files it loaded in its
+dataset cache for the next runs on them.
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import argparse
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+
+PORT = 8765
+MAX_QUEUED_RUNS = 10_000
+MAX_JOB_RUNS = 10_000
+KEEP_JOBS = 200
+PROGRESS_SECONDS = 0.5
+RETRY_AFTER_SECONDS = 5
+
+
+class ServiceBusy(Exception):
+    """Raised when a submission doesn't fit in the run queue."""
+
+
+class ServiceUnavailable(Exception):
+    """Raised when the worker pool broke while a submission was queued."""
+
+
+# Worker processes
+
+_progress_queue = None
+
+
+def _init_worker(progress_queue, dataset_bytes):
+    global _progress_queue
+    from dataset_cache import default_cache
+
+    _progress_queue = progress_queue
+    if dataset_bytes is not None:
+        default_cache().resize(dataset_bytes)
+
+
+def _execute(job_id, index, run, keep_trades):
+    from sweep import run_one
+
+    reported = [0.0, None]
+
+    def progress(stage, percent, rate):
+        now = time.monotonic()
+        if stage != reported[1] or now - reported[0] >= PROGRESS_SECONDS:
+            reported[:] = [now, stage]
+            _progress_queue.put((job_id, index, stage, percent))
+
+    _progress_queue.put((job_id, index, "Starting", 0.0))
+    return run_one(run, progress=progress, keep_trades=keep_trades)
+
+
+# Service
+
+def _plain(value):
+    """
+    value with numpy scalars, non-finite floats and times made JSON-safe.
+    """
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+class BacktestService:
+    """
+    Jobs of one run or a sweep of runs, executed by a process pool.
+    """
+
+    def __init__(self, workers=None, max_queued_runs=MAX_QUEUED_RUNS,
+                 max_job_runs=MAX_JOB_RUNS, keep_jobs=KEEP_JOBS, dataset_bytes=None):
+        """
+        :param dataset_bytes: Memory budget of each worker's dataset cache,
+            BACKTEST_DATASET_CACHE_MB by default.
+        """
+        self.max_queued_runs = max_queued_runs
+        self.max_job_runs = max_job_runs
+        self.keep_jobs = keep_jobs
+        self.jobs = OrderedDict()
+        self.queued_runs = 0
+        self.lock = threading.Lock()
+
+        # Spawned, forked workers would inherit the server's threads and locks
+        self.context = multiprocessing.get_context("spawn")
+        self.progress_queue = self.context.Queue()
+        self.workers = workers or os.cpu_count() or 1
+        self.dataset_bytes = dataset_bytes
+        self.pool = self._new_pool()
+        self.progressThread = threading.Thread(target=self._read_progress, daemon=True)
+        self.progressThread.start()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(self.workers, mp_context=self.context,
+                                   initializer=_init_worker,
+                                   initargs=(self.progress_queue, self.dataset_bytes))
+
+    def _replace_pool(self, broken):
+        # A worker that died (killed, out of memory) breaks the whole pool;
+        # its queued runs fail and later ones go to a new pool
+        if self.pool is broken:
+            self.pool = self._new_pool()
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    def submit_run(self, candles_path, formData):
+        if not isinstance(formData, dict):
+            raise ValueError("formData must be an object.")
+        if not candles_path or not os.path.exists(candles_path):
+            raise ValueError("Invalid or missing candles_path.")
+        run = {"run_id": "r000000", "candles_path": candles_path, "formData": formData}
+        return self._submit("run", [run], keep_trades=True)
+
+    def submit_sweep(self, runs):
+        if not runs:
+            raise ValueError("The sweep has no runs.")
+        if len(runs) > self.max_job_runs:
+            raise ValueError(f"A sweep can have at most {self.max_job_runs} runs, "
+                             f"this one has {len(runs)}.")
+        for path in {run["candles_path"] for run in runs}:
+            if not path or not os.path.exists(path):
+                raise ValueError(f"Invalid or missing candle file: {path}")
+        return self._submit("sweep", runs, keep_trades=False)
+
+    def _submit(self, kind, runs, keep_trades):
+        with self.lock:
+            if self.queued_runs + len(runs) > self.max_queued_runs:
+                raise ServiceBusy(f"{len(runs)} runs don't fit in the queue, "
+                                  f"{self.queued_runs} of at most {self.max_queued_runs} "
+                                  f"runs are queued.")
+            job_id = uuid.uuid4().hex[:12]
+            # A pool that broke while idle is replaced and the submission retried once
+            for attempt in range(2):
+                pool, futures = self.pool, []
+                try:
+                    for index, run in enumerate(runs):
+                        futures.append(pool.submit(_execute, job_id, index, run, keep_trades))
+                    break
+                except BrokenProcessPool:
+                    for future in futures:
+                        future.cancel()
+                    self._replace_pool(pool)
+            else:
+                raise ServiceUnavailable("A worker process died, the workers are restarting.")
+
+            # Registered only once every run is in the pool
+            self.queued_runs += len(runs)
+            job = {
+                "job_id": job_id, "kind": kind, "status": "queued",
+                "runs": runs, "results": [None] * len(runs), "progress": {},
+                "open": len(runs), "finished_runs": 0, "failed_runs": 0,
+                "created": time.time(), "started": None, "finished": None,
+                "futures": futures,
+            }
+            self.jobs[job_id] = job
+            self._evict()
+        for index, future in enumerate(futures):
+            future.add_done_callback(lambda future, job=job, index=index, pool=pool:
+                                     self._on_done(job, index, future, pool))
+        return job_id
+
+    def _evict(self):
+        # Oldest finished jobs go first, running ones are always kept
+        finished = [job_id for job_id, job in self.jobs.items() if job["finished"] is not None]
+        for job_id in finished[:max(len(self.jobs) - self.keep_jobs, 0)]:
+            del self.jobs[job_id]
+
+    def _on_done(self, job, index, future, pool):
+        with self.lock:
+            self.queued_runs -= 1
+            job["open"] -= 1
+            job["progress"].pop(index, None)
+            if not future.cancelled():
+                try:
+                    result = future.result()
+                except Exception as e:  # The worker process died
+                    result = {"run_id": job["runs"][index]["run_id"], "error": str(e)}
+                    if isinstance(e, BrokenProcessPool):
+                        self._replace_pool(pool)
+                job["results"][index] = result
+                job["finished_runs"] += 1
+                job["failed_runs"] += "error" in result
+            if job["open"] == 0:
+                job["finished"] = time.time()
+                if job["status"] != "cancelled":
+                    job["status"] = "failed" if job["failed_runs"] == len(job["runs"]) else "done"
+
+    def _read_progress(self):
+        while True:
+            try:
+                message = self.progress_queue.get()
+            except (EOFError, OSError):
+                return
+            if message is None:
+                return
+            job_id, index, stage, percent = message
+            with self.lock:
+                job = self.jobs.get(job_id)
+                # Progress can arrive after the run's result did
+                if job is None or job["results"][index] is not None:
+                    continue
+                if job["status"] == "queued":
+                    job["status"] = "running"
+                    job["started"] = time.time()
+                job["progress"][index] = (stage, percent)
+
+    def status(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return None if job is None else self._status(job)
+
+    def statuses(self):
+        with self.lock:
+            return [self._status(job) for job in self.jobs.values()]
+
+    def _status(self, job):
+        runs = len(job["runs"])
+        running = sum(percent for _, percent in job["progress"].values()) / 100
+        status = {
+            "job_id": job["job_id"], "kind": job["kind"], "status": job["status"],
+            "runs": runs, "finished_runs": job["finished_runs"],
+            "failed_runs": job["failed_runs"], "running_runs": len(job["progress"]),
+            "percent": 100.0 * (job["finished_runs"] + running) / runs,
+            "created": job["created"], "started": job["started"], "finished": job["finished"],
+        }
+        if job["kind"] == "run":
+            status["stage"] = next(iter(job["progress"].values()), (None,))[0]
+            result = job["results"][0]
+            if result is not None and "error" in result:
+                status["error"] = result["error"]
+        return _plain(status)
+
+    def job(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancel the runs of a job that have not started; running ones finish.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return False
+            if job["finished"] is None:
+                job["status"] = "cancelled"
+            futures = list(job["futures"])
+        for future in futures:
+            future.cancel()
+        return True
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.progress_queue.put(None)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    service = None  # Set on the subclass serve() makes
+
+    ROUTES = [
+        ("POST", re.compile(r"^/runs$"), "postRun"),
+        ("POST", re.compile(r"^/sweeps$"), "postSweep"),
+        ("GET", re.compile(r"^/jobs$"), "getJobs"),
+        ("GET", re.compile(r"^/jobs/(\w+)$"), "getJob"),
+        ("GET", re.compile(r"^/jobs/(\w+)/stats$"), "getStats"),
+        ("GET", re.compile(r"^/jobs/(\w+)/trades$"), "getTrades"),
+        ("DELETE", re.compile(r"^/jobs/(\w+)$"), "deleteJob"),
+    ]
+
+    def do_GET(self):
+        self.route("GET")
+
+    def do_POST(self):
+        self.route("POST")
+
+    def do_DELETE(self):
+        self.route("DELETE")
+
+    def route(self, method):
+        url = urlsplit(self.path)
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        for route_method, pattern, handler in self.ROUTES:
+            match = pattern.match(url.path)
+            if match and route_method == method:
+                try:
+                    getattr(self, handler)(*match.groups())
+                except ServiceBusy as e:
+                    self.sendJson(429, {"error": str(e)},
+                                  {"Retry-After": str(RETRY_AFTER_SECONDS)})
+                except ServiceUnavailable as e:
+                    self.sendJson(503, {"error": str(e)},
+                                  {"Retry-After": str(RETRY_AFTER_SECONDS)})
+                except (ValueError, KeyError, TypeError) as e:
+                    self.sendJson(400, {"error": str(e)})
+                return
+        self.sendJson(404, {"error": f"No {method} {url.path}"})
+
+    def readJson(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+        if not isinstance(body, dict):
+            raise ValueError("The request body must be a JSON object.")
+        return body
+
+    def sendJson(self, code, payload, headers=None):
+        self.sendBytes(code, json.dumps(payload).encode(), "application/json", headers)
+
+    def sendBytes(self, code, body, content_type, headers=None):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def finishedJob(self, job_id):
+        """
+        The job, or None once a 404 or 409 was sent for it.
+        """
+        job = self.service.job(job_id)
+        if job is None:
+            self.sendJson(404, {"error": f"No job {job_id}"})
+        elif job["finished"] is None:
+            self.sendJson(409, {"error": f"Job {job_id} is {job['status']}",
+                                "status": self.service.status(job_id)})
+        else:
+            return job
+        return None
+
+    def postRun(self):
+        body = self.readJson()
+        job_id = self.service.submit_run(body["candles_path"], body.get("formData", {}))
+        self.sendJson(202, {"job_id": job_id})
+
+    def postSweep(self):
+        from sweep import grid_runs
+
+        body = self.readJson()
+        if "runs" in body:
+            runs = body["runs"]
+        else:
+            runs = grid_runs(body["candles"], body.get("intervals", ["15"]), body["tp"], body["sl"],
+                             body.get("base"), body.get("leverage"))
+        job_id = self.service.submit_sweep(runs)
+        self.sendJson(202, {"job_id": job_id, "runs": len(runs)})
+
+    def getJobs(self):
+        self.sendJson(200, {"jobs": self.service.statuses()})
+
+    def getJob(self, job_id):
+        status = self.service.status(job_id)
+        if status is None:
+            self.sendJson(404, {"error": f"No job {job_id}"})
+        else:
+            self.sendJson(200, status)
+
+    def getStats(self, job_id):
+        from sweep import results_frame, RANK_BY
+
+        job = self.finishedJob(job_id)
+        if job is None:
+            return
+        results = [result for result in job["results"] if result is not None]
+        if job["kind"] == "run":
+            result = results[0] if results else {"error": "The run was cancelled."}
+            self.sendJson(200, _plain({key: result.get(key) for key in (
+                "formData", "summary", "monthly_stats", "error")}))
+            return
+        frame = results_frame(results, self.query.get("rank_by", RANK_BY),
+                              self.query.get("ascending", "0") not in ("0", "false", ""))
+        records = frame.astype(object).where(frame.notna(), None).to_dict("records")
+        self.sendJson(200, _plain({"results": records}))
+
+    def getTrades(self, job_id):
+        from export import npz_bytes
+
+        job = self.finishedJob(job_id)
+        if job is None:
+            return
+        if job["kind"] != "run":
+            raise ValueError("Sweeps keep summaries only, submit a run on its own for its trades.")
+        result = job["results"][0]
+        if result is None or "error" in result:
+            self.sendJson(409, {"error": "The run has no trades",
+                                "status": self.service.status(job_id)})
+            return
+
+        trades_df = result["trades"]
+        fmt = self.query.get("format", "json")
+        if fmt == "npz":
+            self.sendBytes(200, npz_bytes(trades_df), "application/octet-stream")
+        elif fmt == "json":
+            self.sendBytes(200, trades_df.to_json(orient="records", date_format="iso").encode(),
+                           "application/json")
+        else:
+            raise ValueError(f"Unknown format {fmt}, use json or npz.")
+
+    def deleteJob(self, job_id):
+        if self.service.cancel(job_id):
+            self.sendJson(200, self.service.status(job_id))
+        else:
+            self.sendJson(404, {"error": f"No job {job_id}"})
+
+    def log_message(self, format, *args):
+        pass  # Quiet, clients poll often
+
+
+def serve(host="127.0.0.1", port=PORT, service=None):
+    """
+    HTTP server for a BacktestService; call serve_forever() on it.
+    """
+    handler = type("BoundServiceHandler", (ServiceHandler,), {"service": service or BacktestService()})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="Address to listen on, keep it local unless behind a proxy")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes")
+    parser.add_argument("--max-queued", type=int, default=MAX_QUEUED_RUNS,
+                        help="Runs that can wait for a worker")
+    parser.add_argument("--dataset-mb", type=float, default=None,
+                        help="Memory each worker may hold loaded files in")
+    args = parser.parse_args(argv)
+
+    dataset_bytes = None if args.dataset_mb is None else int(args.dataset_mb * 2**20)
+    service = BacktestService(args.workers, args.max_queued, dataset_bytes=dataset_bytes)
+    server = serve(args.host, args.port, service)
+    print(f"Serving backtests on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
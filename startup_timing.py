@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import time
+import datetime
+
+# Imported first by main.py, so this is as close to interpreter start as we get
+_started = time.perf_counter()
+_marks = {}
+
+REPORT_FILE = os.environ.get("BACKTEST_STARTUP_REPORT", "startup_timing.json")
+HISTORY_LENGTH = 50
+
+
+def mark(name):
+    """
+    Record the seconds elapsed since startup under name (first call wins).
+    """
+    _marks.setdefault(name, round(time.perf_counter() - _started, 4))
+
+
+def marks():
+    return dict(_marks)
+
+
+def install_first_paint_hook(widget, on_painted=None):
+    """
+    Mark "first_paint" when widget receives its first paint event.
+
+    :param on_painted: Optional callable run once right after the first paint.
+    """
+    from PyQt5.QtCore import QObject, QEvent
+
+    class FirstPaintFilter(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint:
+                mark("first_paint")
+                obj.removeEventFilter(self)
+                if on_painted is not None:
+                    on_painted()
+            return False
+
+    hook = FirstPaintFilter(widget)
+    widget.installEventFilter(hook)
+    return hook
+
+
+def write_report(path=REPORT_FILE):
+    """
+    Append this start's marks to the JSON history in path and print a summary,
+    so startup regressions show up between builds.
+    """
+    entry = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "frozen": bool(getattr(sys, "frozen", False)),
+        "python": sys.version.split()[0],
+        "modules_loaded": len(sys.modules),
+        "marks": marks(),
+    }
+
+    try:
+        with open(path, "r") as f:
+            history = json.load(f)
+    except Exception:
+        history = []
+    history = (history + [entry])[-HISTORY_LENGTH:]
+
+    try:
+        with open(path, "w") as f:
+            json.dump(history, f, indent=2)
+    except OSError as e:
+        print(f"Could not write startup report: {e}")
+
+    summary = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in entry["marks"].items())
+    print(f"Startup timing: {summary}")
+    return entry
@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+
+# Period name -> (table header, numpy calendar unit, periods per year for annualizing)
+PERIODS = {
+    "day": ("Day", "D", 365),
+    "week": ("Week", "W", 52),
+    "month": ("Month", "M", 12),
+    "year": ("Year", "Y", 1),
+}
+
+
+def local_datetimes(values):
+    """
+    Trade times as naive local datetime64[ms], the calendar periods are cut on.
+    """
+    times = pd.to_datetime(pd.Series(values))
+    if times.dt.tz is not None:
+        times = times.dt.tz_localize(None)
+    return times.to_numpy().astype("datetime64[ms]")
+
+
+def period_keys(local_times, period):
+    """
+    Calendar bucket of each time as datetime64 (weeks start on Monday).
+    """
+    unit = PERIODS[period][1]
+    if unit == "W":
+        days = local_times.astype("datetime64[D]").astype(np.int64)
+        # 1970-01-01 was a Thursday, shift so buckets start on Monday
+        return ((days + 3) // 7 * 7 - 3).astype("datetime64[D]")
+    return local_times.astype(f"datetime64[{unit}]")
+
+
+def _streaks(flags):
+    """
+    Length of the longest run of True in a boolean array.
+    """
+    if not flags.any():
+        return 0
+    padded = np.concatenate([[False], flags, [False]])
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    return int((edges[1::2] - edges[::2]).max())
+
+
+def compute_stats(trades_df, initial_capital, period="month"):
+    """
+    Per-period aggregates and whole-run metrics of a trade log.
+
+    Everything is derived from a handful of arrays with bincount and
+    cumulative operations, no per-group Python loop, so sweeps can call it
+    for every parameter set.
+
+    :param trades_df: Trades with Datetime, Close_Time, Profit_Loss and Result.
+    :param initial_capital: Capital at the start of the run.
+    :param period: "day", "week", "month" or "year".
+    :return: (rows, summary) where rows is a list of dicts, one per period
+        in the layout Screen2 shows, and summary a dict of run metrics.
+    """
+    header, _, periods_per_year = PERIODS[period]
+    if trades_df is None or trades_df.empty:
+        nothing = np.empty(0, dtype=bool)
+        return [], summary_stats(
+            np.empty(0), np.empty(0), nothing, nothing, initial_capital,
+            np.empty(0, dtype=np.int64), periods_per_year)
+
+    open_times = local_datetimes(trades_df["Datetime"])
+    close_times = local_datetimes(trades_df["Close_Time"])
+    pnl = trades_df["Profit_Loss"].to_numpy(np.float64)
+    result = trades_df["Result"].to_numpy()
+    wins = result == "PROFIT"
+    losses = result == "LOSS"
+
+    keys = period_keys(open_times, period)
+    uniques, codes = np.unique(keys, return_inverse=True)
+    n = len(uniques)
+    # Position of each trade's period in the span from the first to the last,
+    # periods without trades included
+    steps = keys.astype(np.int64)
+    span_codes = (steps - steps.min()) // (7 if PERIODS[period][1] == "W" else 1)
+
+    win_counts = np.bincount(codes, weights=wins, minlength=n)
+    loss_counts = np.bincount(codes, weights=losses, minlength=n)
+    net = np.bincount(codes, weights=pnl, minlength=n)
+    profit = np.bincount(codes, weights=np.where(wins, pnl, 0.0), minlength=n)
+    loss = np.bincount(codes, weights=np.where(losses, pnl, 0.0), minlength=n)
+
+    labels = uniques.astype(str)
+    rows = [
+        {
+            header: label,
+            "Winning Trades": w,
+            "Losing Trades": l,
+            "Total Trades": w + l,
+            "Total Profit": p,
+            "Total Loss": lo,
+            "Net Profit/Loss": nt,
+        }
+        for label, w, l, p, lo, nt in zip(
+            labels.tolist(),
+            win_counts.astype(np.int64).tolist(),
+            loss_counts.astype(np.int64).tolist(),
+            profit.tolist(),
+            loss.tolist(),
+            net.tolist(),
+        )
+    ]
+
+    hold = (close_times - open_times).astype(np.int64)
+    order = np.argsort(close_times, kind="stable")
+    summary = summary_stats(
+        pnl[order], hold, wins[order], losses[order], initial_capital, span_codes[order],
+        periods_per_year)
+    return rows, summary
+
+
+def summary_stats(pnl, hold_ms, wins, losses, initial_capital, codes, periods_per_year):
+    """
+    Run metrics from trade P&L ordered by close time.
+
+    :param codes: Index of each trade's period counted from the first period,
+        for period returns; periods no trade falls in return 0.
+    """
+    total = len(pnl)
+    gross_profit = float(pnl[pnl > 0].sum())
+    gross_loss = float(-pnl[pnl < 0].sum())
+    net = float(pnl.sum())
+
+    equity = initial_capital + np.concatenate([[0.0], np.cumsum(pnl)])
+    peak = np.maximum.accumulate(equity)
+    drawdown = equity - peak
+    drawdown_pct = np.where(peak > 0, drawdown / peak, 0.0)
+
+    # Period returns relative to the equity at the start of each period,
+    # flat periods between trades included
+    sharpe = sortino = 0.0
+    if total:
+        n = int(codes.max()) + 1
+        period_pnl = np.bincount(codes, weights=pnl, minlength=n)
+        start_equity = initial_capital + np.concatenate([[0.0], np.cumsum(period_pnl)[:-1]])
+        returns = np.divide(period_pnl, start_equity,
+                            out=np.zeros(n), where=start_equity > 0)
+        scale = np.sqrt(periods_per_year)
+        if n > 1 and returns.std(ddof=1) > 0:
+            sharpe = float(returns.mean() / returns.std(ddof=1) * scale)
+        downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2))
+        if downside > 0:
+            sortino = float(returns.mean() / downside * scale)
+
+    if gross_loss > 0:
+        profit_factor = gross_profit / gross_loss
+    else:
+        profit_factor = float("inf") if gross_profit > 0 else 0.0
+
+    return {
+        "Total Trades": total,
+        "Win Rate %": float(wins.sum() / total * 100) if total else 0.0,
+        "Net Profit/Loss": net,
+        "Profit Factor": profit_factor,
+        "Expectancy": net / total if total else 0.0,
+        "Max Drawdown": float(-drawdown.min()),
+        "Max Drawdown %": float(-drawdown_pct.min() * 100),
+        "Sharpe": sharpe,
+        "Sortino": sortino,
+        "Avg Hold (min)": float(hold_ms.mean() / 60000) if total else 0.0,
+        "Max Win Streak": _streaks(wins),
+        "Max Loss Streak": _streaks(losses),
+    }
@@ -0,0 +1,453 @@
+"""
+Parameter sweeps over candle files x timeframes x TP/SL grids, run on this
+machine or spread over several through a job queue in a shared directory.
+
+    python sweep.py submit --queue /mnt/shared/sweep1 --candles data/BTCUSDT--all.csv \\
+        --intervals 15,60 --tp 0.5,1,2 --sl 0.3,0.5 --base form.json
+    python sweep.py worker --queue /mnt/shared/sweep1      # on every machine
+    python sweep.py status --queue /mnt/shared/sweep1
+    python sweep.py merge --queue /mnt/shared/sweep1 --out ranked.csv
+    python sweep.py export --queue /mnt/shared/sweep1 --out trades --format columnar
+
+form.json holds the other Screen1 parameters (Capital, Leverage, File ...).
+Paths in it and in --candles should be valid on every worker, relative
+paths are looked up in the queue directory first.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import traceback
+import numpy as np
+import pandas as pd
+from job_queue import JobQueue, LeaseKeeper, worker_name
+
+SWEEP_MANIFEST = "sweep.json"
+SHARD_RUNS = 20
+RANK_BY = "Net Profit/Loss"
+# Results of a local pool are handed on at most this often
+BATCH_SECONDS = 0.25
+
+
+def grid_runs(candle_files, intervals, tp_values, sl_values, base=None, leverage_values=None):
+    """
+    One run per combination, as dicts with run_id, candles_path and formData.
+
+    :param leverage_values: Leverages to try too; None keeps base's Leverage.
+    """
+    runs = []
+    leverages = leverage_values or [None]
+    combinations = itertools.product(candle_files, intervals, leverages, tp_values, sl_values)
+    for number, (candles_path, interval, leverage, tp, sl) in enumerate(combinations):
+        formData = dict(base or {}, interval=str(interval), TP_percent=tp, SL_percent=sl)
+        if leverage is not None:
+            formData["Leverage"] = leverage
+        runs.append({"run_id": f"r{number:06d}", "candles_path": candles_path,
+                     "formData": formData})
+    return runs
+
+
+def _resolve(path, root):
+    if path and not os.path.isabs(path) and root and os.path.exists(os.path.join(root, path)):
+        return os.path.join(root, path)
+    return path
+
+
+def run_one(run, root=None, datasets=None, progress=None, keep_trades=False, cache=None):
+    """
+    Backtest one run of a sweep.
+
+    :param root: Queue directory relative paths may be in.
+    :param datasets: Optional loaded-file cache, see backtest.run_pipeline.
+    :param cache: ResultCache runs already backtested come back from, the
+        process's default cache (BACKTEST_CACHE_DIR) unless given.
+    :param progress: Optional callback(stage, percent, candles_per_second).
+    :param keep_trades: Also return monthly_stats and the trades frame.
+    :return: dict with run_id, candles_path, formData and the stats summary,
+        or error when the run failed.
+    """
+    from backtest import run_pipeline, BacktestError
+    from result_cache import default_cache
+
+    formData = dict(run["formData"])
+    if formData.get("File"):
+        formData["File"] = _resolve(formData["File"], root)
+    result = {"run_id": run["run_id"], "candles_path": run["candles_path"],
+              "formData": run["formData"]}
+    try:
+        monthly_stats, trades_df, result["summary"] = run_pipeline(
+            _resolve(run["candles_path"], root), formData, progress=progress, datasets=datasets,
+            cache=cache if cache is not None else default_cache())
+        if keep_trades:
+            result["monthly_stats"] = monthly_stats
+            result["trades"] = trades_df
+    except BacktestError as e:
+        result["error"] = str(e)
+    except Exception as e:
+        result["error"] = f"{e}\n{traceback.format_exc()}"
+    return result
+
+
+def run_local(runs, progress=None):
+    """
+    Run every run of a sweep here, one after the other.
+
+    :param progress: Optional callback(done, total).
+    """
+    results = []
+    for done, run in enumerate(runs, 1):
+        results.append(run_one(run))
+        if progress is not None:
+            progress(done, len(runs))
+    return results
+
+
+def run_pool(runs, workers=None, on_results=None, should_stop=None,
+             batch_seconds=BATCH_SECONDS):
+    """
+    Run the runs of a sweep in worker processes on this machine.
+
+    :param workers: Number of processes, one per CPU by default.
+    :param on_results: Optional callback(results) with the results finished
+        since the previous call, called at most every batch_seconds.
+    :param should_stop: Optional callable; no more runs are started once it
+        returns True, the ones running are finished.
+    :return: Results of the runs that finished.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+    workers = workers or os.cpu_count() or 1
+    results, batch = [], []
+    queued = iter(runs)
+    pending = set()
+    flushed = time.monotonic()
+
+    def flush():
+        nonlocal batch, flushed
+        if batch and on_results is not None:
+            on_results(batch)
+        results.extend(batch)
+        batch = []
+        flushed = time.monotonic()
+
+    # Spawned, forked workers would inherit the GUI's threads and locks
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context) as pool:
+        stopping = False
+        while True:
+            if not stopping and should_stop is not None and should_stop():
+                stopping = True
+                # Runs not started yet are dropped, running ones are waited for
+                pending = {future for future in pending if not future.cancel()}
+            # A few runs queued per worker keeps them busy without pickling the whole grid upfront
+            while not stopping and len(pending) < workers * 4:
+                run = next(queued, None)
+                if run is None:
+                    break
+                pending.add(pool.submit(run_one, run))
+            if not pending:
+                break
+
+            done, pending = wait(pending, timeout=batch_seconds, return_when=FIRST_COMPLETED)
+            batch.extend(future.result() for future in done)
+            if time.monotonic() - flushed >= batch_seconds:
+                flush()
+    flush()
+    return results
+
+
+class SweepGrid:
+    """
+    Summary metrics of a TP x SL (x leverage) sweep on one candle file and
+    timeframe, as arrays indexed [leverage, SL, TP] that fill in as results
+    arrive. Cells without a result are NaN.
+    """
+
+    def __init__(self, runs):
+        forms = [run["formData"] for run in runs]
+        self.tp_values = sorted({form["TP_percent"] for form in forms})
+        self.sl_values = sorted({form["SL_percent"] for form in forms})
+        self.leverage_values = sorted({form.get("Leverage", 1) for form in forms})
+        self.shape = (len(self.leverage_values), len(self.sl_values), len(self.tp_values))
+
+        tp_index = {value: i for i, value in enumerate(self.tp_values)}
+        sl_index = {value: i for i, value in enumerate(self.sl_values)}
+        leverage_index = {value: i for i, value in enumerate(self.leverage_values)}
+        self.runs = np.empty(self.shape, dtype=object)
+        self.cells = {}
+        for run, form in zip(runs, forms):
+            cell = (leverage_index[form.get("Leverage", 1)], sl_index[form["SL_percent"]],
+                    tp_index[form["TP_percent"]])
+            self.cells[run["run_id"]] = cell
+            self.runs[cell] = run
+
+        self.values = {}
+        self.errors = {}
+        self.finished = 0
+
+    def add(self, results):
+        for result in results:
+            cell = self.cells.get(result["run_id"])
+            if cell is None:
+                continue
+            self.finished += 1
+            summary = result.get("summary")
+            if summary is None:
+                self.errors[cell] = result.get("error")
+                continue
+            for metric, value in summary.items():
+                if metric not in self.values:
+                    self.values[metric] = np.full(self.shape, np.nan)
+                self.values[metric][cell] = value
+
+    def metric(self, name):
+        """
+        Array of a summary metric, all NaN until a run has reported it.
+        """
+        if name not in self.values:
+            return np.full(self.shape, np.nan)
+        return self.values[name]
+
+    def __len__(self):
+        return len(self.cells)
+
+
+def submit(queue, runs, shard_runs=SHARD_RUNS, description=None):
+    """
+    Split runs into shards of shard_runs runs and queue them. Each shard
+    carries everything needed to run it.
+    """
+    from trade_simulation import ENGINE_VERSION
+
+    shard_ids = []
+    for start in range(0, len(runs), shard_runs):
+        shard_id = f"shard-{start // shard_runs:05d}"
+        queue.submit(shard_id, {
+            "shard_id": shard_id,
+            "engine_version": ENGINE_VERSION,
+            "runs": runs[start:start + shard_runs],
+        })
+        shard_ids.append(shard_id)
+
+    queue.write_manifest(SWEEP_MANIFEST, {
+        "created": time.time(),
+        "runs": len(runs),
+        "shards": shard_ids,
+        "description": description or {},
+    })
+    return shard_ids
+
+
+def work(queue, wait=True, poll_seconds=5.0, max_shards=None):
+    """
+    Claim and run shards until none are left.
+
+    :param wait: Keep polling while other workers hold shards, so shards
+        of workers that crash are picked up once their lease expires.
+    :return: Number of shards this worker completed.
+    """
+    from trade_simulation import ENGINE_VERSION
+
+    completed = 0
+    while max_shards is None or completed < max_shards:
+        claimed = queue.claim()
+        if claimed is None:
+            if wait and queue.status()["claimed"]:
+                time.sleep(poll_seconds)
+                continue
+            break
+
+        shard_id, shard = claimed
+        if shard.get("engine_version") != ENGINE_VERSION:
+            # Results of another engine version would be mixed into the sweep
+            queue.release(shard_id)
+            print(f"{worker_name()}: {shard_id} was queued for engine version "
+                  f"{shard.get('engine_version')}, this worker runs {ENGINE_VERSION}; "
+                  "stopping, update this worker")
+            break
+        print(f"{worker_name()}: running {shard_id} ({len(shard['runs'])} runs)")
+        started = time.time()
+        with LeaseKeeper(queue, shard_id) as lease:
+            results = [run_one(run, queue.root) for run in shard["runs"]]
+        if lease.lost:
+            print(f"{worker_name()}: lease on {shard_id} expired while running, "
+                  "storing the result anyway")
+
+        queue.complete(shard_id, {"shard_id": shard_id, "results": results}, {
+            "runs": len(results),
+            "errors": sum(1 for result in results if "error" in result),
+            "seconds": time.time() - started,
+        })
+        completed += 1
+    return completed
+
+
+def results_frame(results, rank_by=RANK_BY, ascending=False):
+    """
+    One row per run: run id, candle file, parameters and summary, best first.
+    """
+    rows = []
+    for result in results:
+        row = {"run_id": result["run_id"], "candles_path": result["candles_path"]}
+        row.update({f"param.{k}": v for k, v in result["formData"].items()
+                    if not isinstance(v, (dict, list))})
+        row.update(result.get("summary") or {})
+        row["error"] = result.get("error")
+        rows.append(row)
+
+    frame = pd.DataFrame(rows)
+    if not frame.empty and rank_by in frame.columns:
+        frame = frame.sort_values(rank_by, ascending=ascending, na_position="last",
+                                  kind="stable").reset_index(drop=True)
+        frame.insert(0, "rank", range(1, len(frame) + 1))
+    return frame
+
+
+def merge(queue, rank_by=RANK_BY, ascending=False):
+    """
+    Assemble the result shards of a queue into one ranked frame.
+
+    :return: (frame, missing shard ids)
+    """
+    sweep = queue.read_manifest(SWEEP_MANIFEST)
+    results = []
+    finished = set()
+    for manifest, result in queue.completed():
+        finished.add(manifest["shard_id"])
+        results.extend(result["results"])
+    missing = [shard_id for shard_id in sweep["shards"] if shard_id not in finished]
+    return results_frame(results, rank_by, ascending), missing
+
+
+def record_history(queue, history=None):
+    """
+    Record the runs of the finished shards in the run history, in one transaction.
+
+    :return: Number of runs recorded.
+    """
+    from run_history import default_history
+
+    history = history or default_history()
+    runs = [
+        result for _, shard in queue.completed() for result in shard["results"]
+        if "error" not in result
+    ]
+    history.add_runs(runs)
+    return len(runs)
+
+
+def export_results(queue, directory, fmt="csv", progress=None):
+    """
+    Write the trade logs and stats of the finished runs of a queue with
+    export.export_sweep, one run=<id>/ partition per run. Shards keep
+    summaries only, so each run is backtested again, one at a time, as the
+    export reaches it.
+
+    :return: Number of runs exported.
+    """
+    from export import export_sweep
+
+    results = [
+        result for _, shard in queue.completed() for result in shard["results"]
+        if "error" not in result
+    ]
+
+    def runs():
+        for result in results:
+            run = run_one(result, queue.root, keep_trades=True)
+            if "error" in run:
+                print(f"Skipping {run['run_id']}: {run['error']}")
+                continue
+            yield {"run_id": run["run_id"], "formData": run["formData"],
+                   "summary": run["summary"], "stats": run["monthly_stats"],
+                   "trades_df": run["trades"]}
+
+    exported = [0]
+
+    def count(rows_written, runs_written):
+        exported[0] = runs_written
+        if progress is not None:
+            progress(rows_written, runs_written)
+
+    export_sweep(directory, runs(), fmt, progress=count)
+    return exported[0]
+
+
+def _floats(text):
+    return [float(value) for value in text.split(",") if value.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit_parser = commands.add_parser("submit", help="Queue the shards of a sweep")
+    submit_parser.add_argument("--candles", required=True, help="Comma separated candle files")
+    submit_parser.add_argument("--intervals", default="15", help="Minutes, comma separated")
+    submit_parser.add_argument("--tp", required=True, help="TP percents, comma separated")
+    submit_parser.add_argument("--sl", required=True, help="SL percents, comma separated")
+    submit_parser.add_argument("--base", help="JSON file with the other parameters")
+    submit_parser.add_argument("--shard-runs", type=int, default=SHARD_RUNS)
+
+    worker_parser = commands.add_parser("worker", help="Run queued shards")
+    worker_parser.add_argument("--no-wait", action="store_true",
+                               help="Exit when nothing is pending instead of waiting "
+                                    "for other workers' shards")
+    worker_parser.add_argument("--poll", type=float, default=5.0)
+
+    commands.add_parser("status", help="Count pending, claimed and done shards")
+
+    merge_parser = commands.add_parser("merge", help="Rank the results of finished shards")
+    merge_parser.add_argument("--out", default="sweep_results.csv")
+    merge_parser.add_argument("--rank-by", default=RANK_BY)
+    merge_parser.add_argument("--ascending", action="store_true")
+    merge_parser.add_argument("--history", action="store_true",
+                              help="Also record the runs in the run history")
+
+    export_parser = commands.add_parser(
+        "export", help="Write the trades of the finished runs, a partition per run")
+    export_parser.add_argument("--out", default="sweep_export", help="Output directory")
+    export_parser.add_argument("--format", default="csv", choices=("csv", "columnar"))
+
+    for command in commands.choices.values():
+        command.add_argument("--queue", required=True, help="Shared queue directory")
+        command.add_argument("--lease", type=float, default=None,
+                             help="Lease timeout in seconds")
+    args = parser.parse_args(argv)
+
+    queue = JobQueue(args.queue) if args.lease is None else JobQueue(args.queue, args.lease)
+
+    if args.command == "submit":
+        base = {}
+        if args.base:
+            with open(args.base, "r") as f:
+                base = json.load(f)
+        runs = grid_runs(args.candles.split(","), args.intervals.split(","),
+                         _floats(args.tp), _floats(args.sl), base)
+        shard_ids = submit(queue, runs, args.shard_runs, description=vars(args))
+        print(f"Queued {len(runs)} runs in {len(shard_ids)} shards")
+    elif args.command == "worker":
+        count = work(queue, wait=not args.no_wait, poll_seconds=args.poll)
+        print(f"{worker_name()}: completed {count} shards")
+    elif args.command == "status":
+        print(json.dumps(queue.status()))
+    elif args.command == "merge":
+        frame, missing = merge(queue, args.rank_by, args.ascending)
+        frame.to_csv(args.out, index=False)
+        print(f"Wrote {len(frame)} runs to {args.out}")
+        if args.history:
+            print(f"Recorded {record_history(queue)} runs in the run history")
+        if missing:
+            print(f"{len(missing)} shards are not finished: {', '.join(missing)}")
+            return 1
+    elif args.command == "export":
+        count = export_results(queue, args.out, args.format)
+        print(f"Exported {count} runs to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
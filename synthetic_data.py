@@ -0,0 +1,287 @@
+"""
+Seeded synthetic candle stores and signal files for load testing.
+
+Prices follow a random walk that switches between market regimes, with
+clustered volatility and gaps where no candles were recorded. Candles are
+generated and written chunk by chunk, so the size is limited by disk only:
+
+    python synthetic_data.py --bars 100m --out data/SYNTH--100m.csv \\
+        --signals synth_signals.csv --density 0.02 --signal-interval 15
+
+The same seed and options always give the same files, whatever the chunk size.
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from indicators import rma
+from time_axis import interval_ms
+
+CHUNK_ROWS = 1_000_000
+START_MS = 1577836800000  # 2020-01-01 UTC
+
+CANDLE_COLUMNS = ["Datetime", "Open", "Close", "High", "Low", "Volume"]
+SIGNAL_COLUMNS = ["time", "close", "Buy Normal", "Buy Smart", "Sell Normal", "Sell Smart"]
+
+# Regime -> (drift per bar, volatility multiplier, mean length in bars)
+REGIMES = {
+    "range": (0.0, 0.7, 720),
+    "bull": (2e-5, 1.0, 1440),
+    "bear": (-3e-5, 1.4, 960),
+}
+
+
+class SyntheticMarket:
+    """
+    Candles of one synthetic market, generated in order.
+
+    Each source of randomness (regimes, volatility, returns, wicks, volume,
+    gap starts and lengths, signals) has its own generator spawned from the
+    seed and draws its values in bar order. Generating in chunks of any size
+    therefore gives the same bars.
+    """
+
+    def __init__(self, seed=0, interval="1", start_ms=START_MS, start_price=100.0,
+                 volatility=0.001, regimes=REGIMES, vol_persistence=500, vol_of_vol=0.5,
+                 gap_rate=1e-5, mean_gap_bars=30, decimals=6):
+        """
+        :param interval: Bar length in minutes, as in formData["interval"].
+        :param volatility: Typical standard deviation of a bar's log return.
+        :param vol_persistence: Bars over which volatility shocks fade out;
+            larger values give longer calm and wild stretches.
+        :param vol_of_vol: Standard deviation of log volatility.
+        :param gap_rate: Chance per bar that a gap of missing candles starts.
+        :param mean_gap_bars: Average number of candles missing in a gap.
+        """
+        self.interval_ms = interval_ms(interval)
+        self.start_ms = start_ms
+        self.volatility = volatility
+        self.regimes = list(regimes.values())
+        self.vol_persistence = vol_persistence
+        self.vol_of_vol = vol_of_vol
+        self.gap_rate = gap_rate
+        self.mean_gap_bars = mean_gap_bars
+        self.decimals = decimals
+
+        streams = np.random.SeedSequence(seed).spawn(8)
+        (self._regime_rng, self._vol_rng, self._return_rng, self._wick_rng,
+         self._volume_rng, self._gap_rng, self._gap_length_rng, self._signal_rng) = (
+            np.random.default_rng(stream) for stream in streams)
+
+        self.bar = 0  # Index of the next bar, gaps included
+        self._log_price = np.log(start_price)
+        self._log_vol = 0.0
+        self._regime = 0
+        self._regime_left = self._regime_length(0)
+        self._gap_left = 0
+
+    def _regime_length(self, regime):
+        return int(self._regime_rng.geometric(1 / self.regimes[regime][2]))
+
+    def _regime_index(self, n):
+        """
+        Regime of each of the next n bars, continuing the current one.
+        """
+        index = np.empty(n, dtype=np.intp)
+        filled = 0
+        while filled < n:
+            take = min(self._regime_left, n - filled)
+            index[filled:filled + take] = self._regime
+            filled += take
+            self._regime_left -= take
+            if self._regime_left == 0:
+                # Switch to one of the other regimes
+                step = 1 + int(self._regime_rng.integers(len(self.regimes) - 1))
+                self._regime = (self._regime + step) % len(self.regimes)
+                self._regime_left = self._regime_length(self._regime)
+        return index
+
+    def _gap_mask(self, n):
+        """
+        False for the next n bars that fall in a gap.
+        """
+        keep = np.ones(n, dtype=bool)
+        covered = min(self._gap_left, n)
+        keep[:covered] = False
+        self._gap_left -= covered
+
+        for start in np.flatnonzero(self._gap_rng.random(n) < self.gap_rate):
+            if start < covered:
+                continue  # Already in a gap
+            length = int(self._gap_length_rng.geometric(1 / self.mean_gap_bars))
+            keep[start:start + length] = False
+            covered = start + length
+            self._gap_left = max(covered - n, 0)
+        return keep
+
+    def next_candles(self, n):
+        """
+        The next n bars as a candle DataFrame in the store's layout, with
+        Datetime in UTC epoch ms. Bars in gaps are left out, so it can have
+        fewer than n rows.
+        """
+        regime = self._regime_index(n)
+        drift, vol_mult, _ = (np.asarray(values) for values in zip(*self.regimes))
+
+        # Log volatility is an AR(1) of normal shocks, i.e. their Wilder average,
+        # scaled so its standard deviation is about vol_of_vol
+        shocks = self._vol_rng.standard_normal(n) * self.vol_of_vol * np.sqrt(2 * self.vol_persistence)
+        log_vol = rma(shocks, self.vol_persistence, self._log_vol)
+        self._log_vol = log_vol[-1]
+        sigma = self.volatility * vol_mult[regime] * np.exp(log_vol - self.vol_of_vol ** 2 / 2)
+
+        returns = drift[regime] + sigma * self._return_rng.standard_normal(n)
+        # Accumulated from the last close, so chunks add up exactly like one long walk
+        log_close = np.cumsum(np.concatenate([[self._log_price], returns]))[1:]
+        log_open = np.concatenate([[self._log_price], log_close[:-1]])
+        self._log_price = log_close[-1]
+
+        wicks = self._wick_rng.standard_exponential((n, 2)) * sigma[:, None] / 2
+        log_high = np.maximum(log_open, log_close) + wicks[:, 0]
+        log_low = np.minimum(log_open, log_close) - wicks[:, 1]
+        volume = sigma / self.volatility * self._volume_rng.lognormal(0.0, 0.5, n) * 10
+
+        keep = self._gap_mask(n)
+        times = self.start_ms + (self.bar + np.arange(n, dtype=np.int64)) * self.interval_ms
+        self.bar += n
+
+        return pd.DataFrame({
+            "Datetime": times[keep],
+            "Open": np.exp(log_open[keep]).round(self.decimals),
+            "Close": np.exp(log_close[keep]).round(self.decimals),
+            "High": np.exp(log_high[keep]).round(self.decimals),
+            "Low": np.exp(log_low[keep]).round(self.decimals),
+            "Volume": volume[keep].round(4),
+        })
+
+    def signals_for(self, candles, density, signal_interval=None, smart_share=0.25):
+        """
+        Signals on candles in the Buy/Sell Normal/Smart file layout.
+
+        :param density: Share of eligible candles with a signal.
+        :param signal_interval: Only candles opening on this timeframe's
+            boundaries (minutes) get signals, as if the signals came from a
+            chart on that timeframe. None for every candle.
+        :param smart_share: Share of signals that are Smart rather than Normal.
+        """
+        draws = self._signal_rng.random((len(candles), 3))
+        times = candles["Datetime"].to_numpy()
+        picked = draws[:, 0] < density
+        if signal_interval is not None:
+            picked &= times % interval_ms(signal_interval) == 0
+
+        buy = draws[picked, 1] < 0.5
+        smart = draws[picked, 2] < smart_share
+        return pd.DataFrame({
+            "time": times[picked],
+            "close": candles["Close"].to_numpy()[picked],
+            "Buy Normal": (buy & ~smart).astype(np.int8),
+            "Buy Smart": (buy & smart).astype(np.int8),
+            "Sell Normal": (~buy & ~smart).astype(np.int8),
+            "Sell Smart": (~buy & smart).astype(np.int8),
+        })
+
+    def chunks(self, bars, chunk_rows=CHUNK_ROWS):
+        """
+        Candle DataFrames covering the next bars bars, chunk_rows bars each.
+        """
+        end = self.bar + bars
+        while self.bar < end:
+            yield self.next_candles(min(chunk_rows, end - self.bar))
+
+
+def candles(bars, seed=0, **options):
+    """
+    bars synthetic candles of a SyntheticMarket(seed, **options) as one DataFrame.
+    """
+    market = SyntheticMarket(seed, **options)
+    return pd.concat(list(market.chunks(bars)), ignore_index=True)
+
+
+def write(path, bars, market=None, signals_path=None, density=0.01, signal_interval=None,
+          chunk_rows=CHUNK_ROWS, progress=None):
+    """
+    Stream bars synthetic candles to a candle store at path and, when
+    signals_path is given, matching signals to a signals file.
+
+    :param progress: Optional callback(bars_done, bars_total).
+    :return: (candles written, signals written)
+    """
+    market = market or SyntheticMarket()
+    for target in (path, signals_path):
+        if target and os.path.dirname(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+
+    written = signal_count = 0
+    first_bar = market.bar
+    candles_file = open(path, "w", newline="")
+    signals_file = open(signals_path, "w", newline="") if signals_path else None
+    try:
+        candles_file.write(",".join(CANDLE_COLUMNS) + "\n")
+        if signals_file is not None:
+            signals_file.write(",".join(SIGNAL_COLUMNS) + "\n")
+        for chunk in market.chunks(bars, chunk_rows):
+            candles_file.write(_candle_lines(chunk, market.decimals))
+            written += len(chunk)
+            if signals_file is not None:
+                signals = market.signals_for(chunk, density, signal_interval)
+                signals.to_csv(signals_file, header=False, index=False)
+                signal_count += len(signals)
+            if progress is not None:
+                progress(market.bar - first_bar, bars)
+    finally:
+        candles_file.close()
+        if signals_file is not None:
+            signals_file.close()
+    return written, signal_count
+
+
+def _candle_lines(chunk, decimals):
+    # %-formatting the rows is several times faster than DataFrame.to_csv
+    row = f"%d,%.{decimals}f,%.{decimals}f,%.{decimals}f,%.{decimals}f,%.4f\n"
+    columns = (chunk[column].tolist() for column in CANDLE_COLUMNS)
+    return "".join([row % values for values in zip(*columns)])
+
+
+def main(argv=None):
+    from benchmark import parse_size
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bars", type=parse_size, default=parse_size("1m"),
+                        help="Bars to generate, e.g. 500k, 100m (gaps included)")
+    parser.add_argument("--out", required=True, help="Candle store to write")
+    parser.add_argument("--signals", help="Signals file to write alongside")
+    parser.add_argument("--density", type=float, default=0.01,
+                        help="Share of eligible candles with a signal")
+    parser.add_argument("--signal-interval", help="Signal timeframe in minutes")
+    parser.add_argument("--interval", default="1", help="Bar length in minutes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start-price", type=float, default=100.0)
+    parser.add_argument("--volatility", type=float, default=0.001,
+                        help="Typical per-bar log return standard deviation")
+    parser.add_argument("--gap-rate", type=float, default=1e-5,
+                        help="Chance per bar that a gap starts (0 for none)")
+    parser.add_argument("--chunk-rows", type=parse_size, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    market = SyntheticMarket(args.seed, interval=args.interval, start_price=args.start_price,
+                             volatility=args.volatility, gap_rate=args.gap_rate)
+    started = time.perf_counter()
+
+    def report(done, total):
+        rate = done / max(time.perf_counter() - started, 1e-9)
+        print(f"\r{done:,} / {total:,} bars ({rate:,.0f} bars/s)", end="", flush=True)
+
+    candle_count, signal_count = write(
+        args.out, args.bars, market, args.signals, args.density, args.signal_interval,
+        args.chunk_rows, report)
+    print(f"\nWrote {candle_count:,} candles to {args.out}"
+          + (f" and {signal_count:,} signals to {args.signals}" if args.signals else "")
+          + f" in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
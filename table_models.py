@@ -0,0 +1,244 @@
+import re
+import numpy as np
+import pandas as pd
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QVariant, QEvent, pyqtSignal
+from PyQt5.QtWidgets import QStyledItemDelegate, QStyleOptionButton, QStyle, QApplication
+from time_axis import from_epoch_ms, format_times
+
+
+class DataFrameTableModel(QAbstractTableModel):
+    """
+    Read-only table model backed by the column arrays of a DataFrame.
+
+    No per-cell objects are created up front: the view asks for the cells it
+    is painting and only those are formatted. Sorting and filtering work on
+    whole columns and only produce a new row order.
+
+    Columns named in timeColumns hold int64 epoch milliseconds; they sort as
+    numbers and show as times in the display timezone.
+    """
+
+    _comparison = re.compile(r"^\s*(>=|<=|==|!=|>|<|=)\s*(.+?)\s*$")
+
+    def __init__(self, data, parent=None, timeColumns=()):
+        super().__init__(parent)
+        self._columns = list(data.columns)
+        self._timeColumns = {self._columns.index(name) for name in timeColumns
+                             if name in self._columns}
+        self._arrays = [data[col].to_numpy() for col in self._columns]
+        self._length = len(data)
+        self._sortColumn = None
+        self._order = None
+        self._filter = None
+        self._mask = None
+        self._rows = np.arange(self._length)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return QVariant()
+        value = self._arrays[index.column()][self._rows[index.row()]]
+        return self.formatValue(index.column(), value)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return QVariant()
+        if orientation == Qt.Horizontal:
+            return str(self._columns[section])
+        return str(self._rows[section] + 1)
+
+    def appendFrame(self, data):
+        """
+        Append rows with the same columns, e.g. results streaming in from a
+        running backtest. An active sort or filter is re-applied.
+        """
+        if len(data) == 0:
+            return
+        start = self._length
+        self._length += len(data)
+        arrays = [np.concatenate([values, data[col].to_numpy()])
+                  for values, col in zip(self._arrays, self._columns)]
+
+        if self._order is None and self._mask is None:
+            self.beginInsertRows(QModelIndex(), start, self._length - 1)
+            self._arrays = arrays
+            self._updateRows()
+            self.endInsertRows()
+            return
+
+        self.beginResetModel()
+        self._arrays = arrays
+        if self._sortColumn is not None:
+            self._order = self._sortOrder(*self._sortColumn)
+        if self._filter is not None:
+            self._mask = self._matchColumn(*self._filter)
+        self._updateRows()
+        self.endResetModel()
+
+    def formatValue(self, column, value):
+        if column in self._timeColumns:
+            return str(from_epoch_ms(value))
+        if isinstance(value, np.datetime64):
+            return str(pd.Timestamp(value))
+        return str(value)
+
+    def columnNames(self):
+        return list(self._columns)
+
+    def sourceRow(self, row):
+        """
+        Position in the original DataFrame of a row shown in the view.
+        """
+        return int(self._rows[row])
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.beginResetModel()
+        if column < 0:
+            self._sortColumn = None
+            self._order = None
+        else:
+            self._sortColumn = (column, order)
+            self._order = self._sortOrder(column, order)
+        self._updateRows()
+        self.endResetModel()
+
+    def _sortOrder(self, column, order):
+        values = self._arrays[column]
+        if values.dtype == object:
+            values = pd.Series(values).astype(str).to_numpy()
+        rows = np.argsort(values, kind="stable")
+        return rows[::-1] if order == Qt.DescendingOrder else rows
+
+    def setFilter(self, column, text):
+        """
+        Keep only rows whose value in column matches text.
+
+        Text such as ">100" or "<= 2.5" compares numerically, anything else
+        is a case-insensitive substring match. Empty text clears the filter.
+        """
+        self.beginResetModel()
+        if not text or column < 0:
+            self._filter = None
+            self._mask = None
+        else:
+            self._filter = (column, text)
+            self._mask = self._matchColumn(column, text)
+        self._updateRows()
+        self.endResetModel()
+
+    def _matchColumn(self, column, text):
+        values = self._arrays[column]
+        if column in self._timeColumns:
+            # Matched against the times as shown
+            times = pd.Series(from_epoch_ms(values))
+            shown = format_times(times)
+            values = (shown if shown is not None else times.astype(str)).to_numpy()
+        match = self._comparison.match(text)
+        if match and values.dtype.kind in "iuf":
+            op, operand = match.groups()
+            try:
+                operand = float(operand)
+            except ValueError:
+                return np.zeros(len(values), dtype=bool)
+            if op in ("=", "=="):
+                return values == operand
+            return {
+                ">": np.greater, "<": np.less, ">=": np.greater_equal,
+                "<=": np.less_equal, "!=": np.not_equal,
+            }[op](values, operand)
+
+        as_text = pd.Series(values).astype(str)
+        return as_text.str.contains(text, case=False, regex=False).to_numpy()
+
+    def _updateRows(self):
+        rows = self._order if self._order is not None else np.arange(self._length)
+        if self._mask is not None:
+            rows = rows[self._mask[rows]]
+        self._rows = rows
+
+
+class TradesTableModel(DataFrameTableModel):
+    """
+    Trades from the backtest plus a trailing "Actions" column that
+    ChartButtonDelegate paints as a "View Chart" button.
+    """
+
+    ACTION_TEXT = "View Chart"
+
+    def __init__(self, trades_df, parent=None):
+        super().__init__(trades_df, parent)
+        self.actionColumn = len(self._columns)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._columns) + 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid() and index.column() == self.actionColumn:
+            return self.ACTION_TEXT if role == Qt.DisplayRole else QVariant()
+        return super().data(index, role)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if (orientation == Qt.Horizontal and section == self.actionColumn
+                and role == Qt.DisplayRole):
+            return "Actions"
+        return super().headerData(section, orientation, role)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if column == self.actionColumn:
+            return
+        super().sort(column, order)
+
+    def value(self, row, column_name):
+        """
+        Raw value of column_name for a row shown in the view.
+        """
+        return self._arrays[self._columns.index(column_name)][self._rows[row]]
+
+
+class ChartButtonDelegate(QStyledItemDelegate):
+    """
+    Paints a push button in every cell of a column and reports clicks by row,
+    so large tables don't need a real QPushButton per row.
+    """
+
+    clicked = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pressedRow = -1
+
+    def _buttonRect(self, option):
+        return option.rect.adjusted(4, 2, -4, -2)
+
+    def paint(self, painter, option, index):
+        button = QStyleOptionButton()
+        button.rect = self._buttonRect(option)
+        button.text = str(index.data())
+        button.state = QStyle.State_Enabled
+        if index.row() == self._pressedRow:
+            button.state |= QStyle.State_Sunken
+        else:
+            button.state |= QStyle.State_Raised
+        style = option.widget.style() if option.widget else QApplication.style()
+        style.drawControl(QStyle.CE_PushButton, button, painter, option.widget)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() not in (QEvent.MouseButtonPress, QEvent.MouseButtonRelease):
+            return False
+        if event.button() != Qt.LeftButton:
+            return False
+        if not self._buttonRect(option).contains(event.pos()):
+            self._pressedRow = -1
+            return False
+
+        if event.type() == QEvent.MouseButtonPress:
+            self._pressedRow = index.row()
+        elif self._pressedRow == index.row():
+            self._pressedRow = -1
+            self.clicked.emit(index.row())
+        return True
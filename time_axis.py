@@ -0,0 +1,136 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Inside the app every time is int64 UTC epoch milliseconds. This is only the
+# timezone times are shown in.
+DISPLAY_TZ = os.environ.get("BACKTEST_DISPLAY_TZ", "Asia/Karachi")
+
+SECOND_MS = 1000
+MINUTE_MS = 60 * SECOND_MS
+
+_EPOCH = pd.Timestamp(0, tz="UTC")
+
+
+def to_epoch_ms(values):
+    """
+    Convert times to int64 epoch milliseconds.
+
+    Accepts a scalar or array-like of epoch-ms integers (returned as they are),
+    datetimes or datetime strings. Naive datetimes are taken as UTC. Columns
+    mixing integers and strings, like candle files written before the store
+    switched to epoch ms, are handled too.
+    """
+    if np.ndim(values) == 0:
+        if isinstance(values, (int, np.integer)):
+            return int(values)
+        when = pd.Timestamp(values)
+        when = when.tz_localize("UTC") if when.tzinfo is None else when.tz_convert("UTC")
+        return int((when - _EPOCH) // pd.Timedelta(milliseconds=1))
+
+    series = values if isinstance(values, pd.Series) else pd.Series(values)
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return series.to_numpy(np.int64)
+    if pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype):
+        numeric = pd.to_numeric(series, errors="coerce")
+        if numeric.notna().all():
+            return numeric.to_numpy(np.int64)
+        if numeric.notna().any():
+            ms = numeric.to_numpy(np.float64, copy=True)
+            text = numeric.isna().to_numpy()
+            ms[text] = to_epoch_ms(series[text])
+            return ms.astype(np.int64)
+
+    times = pd.to_datetime(series, utc=True)
+    return ((times - _EPOCH) // pd.Timedelta(milliseconds=1)).to_numpy(np.int64)
+
+
+def from_epoch_ms(ms, tz=None):
+    """
+    Epoch milliseconds as timezone-aware datetimes for display, a Timestamp
+    for a scalar and a DatetimeIndex otherwise.
+
+    :param tz: Timezone to show, DISPLAY_TZ by default.
+    """
+    tz = tz or DISPLAY_TZ
+    if np.ndim(ms) == 0:
+        return pd.Timestamp(int(ms), unit="ms", tz="UTC").tz_convert(tz)
+    return pd.to_datetime(np.asarray(ms, dtype=np.int64), unit="ms", utc=True).tz_convert(tz)
+
+
+def format_times(series):
+    """
+    A Series of timezone-aware times as the text str() and to_csv give them
+    ("2024-01-01 05:15:00+05:00"), built with array operations rather than
+    one Timestamp at a time. Returns None when the values need pandas' own
+    formatting (NaT or sub-second parts).
+    """
+    local = series.dt.tz_localize(None).to_numpy()
+    if np.isnat(local).any():
+        return None
+    seconds = local.astype("datetime64[s]")
+    if (local != seconds).any():
+        return None
+
+    utc = series.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy().astype("datetime64[s]")
+    offsets, codes = np.unique((seconds - utc).astype(np.int64) // 60, return_inverse=True)
+    # A handful of distinct UTC offsets, each formatted once
+    suffixes = np.array([f"{'-' if offset < 0 else '+'}{abs(offset) // 60:02d}:{abs(offset) % 60:02d}"
+                         for offset in offsets.tolist()], dtype=str)
+    text = np.datetime_as_string(seconds, unit="s")  # 2024-01-01T05:15:00
+    if len(text):
+        text.view("U1").reshape(len(text), -1)[:, 10] = " "
+    return pd.Series(np.char.add(text, suffixes[codes]), index=series.index)
+
+
+def interval_ms(interval):
+    """
+    Length of a candle interval given in minutes (as the form stores it).
+    """
+    return int(interval) * MINUTE_MS
+
+
+ALIGN_DIRECTIONS = ("backward", "forward", "nearest")
+
+
+def align_to_candles(candle_times, event_times, tolerance_ms=0, direction="backward"):
+    """
+    Position of the candle each event belongs to, found by binary search over
+    the candle open times, or -1 when no candle is within tolerance.
+
+    :param candle_times: int64 epoch ms of the candles, in any order.
+    :param event_times: int64 epoch ms of the events (signals).
+    :param tolerance_ms: Largest allowed distance between an event and its candle.
+        With 0 only events exactly at a candle's open time are matched.
+    :param direction: "backward" matches the last candle opened at or before the
+        event, "forward" the first at or after it, "nearest" whichever is closer.
+    """
+    if direction not in ALIGN_DIRECTIONS:
+        raise ValueError(f"Unknown alignment direction {direction!r}")
+    candle_times = np.asarray(candle_times, dtype=np.int64)
+    event_times = np.asarray(event_times, dtype=np.int64)
+    matched = np.full(len(event_times), -1, dtype=np.int64)
+    if not len(candle_times) or not len(event_times):
+        return matched
+
+    order = np.argsort(candle_times, kind="stable")
+    ordered = candle_times[order]
+    last = len(ordered) - 1
+
+    before = np.searchsorted(ordered, event_times, side="right") - 1
+    after = np.searchsorted(ordered, event_times, side="left")
+    gap_before = np.where(before >= 0, event_times - ordered[np.clip(before, 0, last)], np.iinfo(np.int64).max)
+    gap_after = np.where(after <= last, ordered[np.clip(after, 0, last)] - event_times, np.iinfo(np.int64).max)
+
+    if direction == "backward":
+        pick, gap = before, gap_before
+    elif direction == "forward":
+        pick, gap = after, gap_after
+    else:
+        use_after = gap_after < gap_before
+        pick = np.where(use_after, after, before)
+        gap = np.where(use_after, gap_after, gap_before)
+
+    ok = gap <= tolerance_ms
+    matched[ok] = order[pick[ok]]
+    return matched
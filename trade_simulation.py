@@ -1,5 +1,21 @@
-import pandas as pd
 import numpy as np
+import profiling
+from position_book import PositionBook
+from exit_rules import ExitScan
+from time_axis import to_epoch_ms, interval_ms, align_to_candles, SECOND_MS
+from frame_memory import direction_codes, price_array, frame_bytes, DIRECTION_LABELS, BUY, SELL
+
+# Bump whenever a change alters backtest results, cached results of other versions are ignored
+ENGINE_VERSION = "1"
+
+# One aligned signal: the position of its candle and what to trade there
+SIGNAL_EVENT = np.dtype([
+    ("candle", np.int64),
+    ("direction", np.int8),  # frame_memory direction code
+    ("entry", np.float64),
+    ("take_profit", np.float64),
+    ("stop_loss", np.float64),
+])
 
 
 class TradeSimulation:
@@ -15,10 +31,28 @@ class TradeSimulation:
         sl_percent,
         with_compounding,
         use_alternate_signall,
-        interval
+        interval,
+        signal_tolerance_ms=0,
+        signal_direction="backward",
+        max_positions=1,
+        exit_rules=None
     ):
-        self.candles_df = candles_df.copy()
-        self.signals_df = signals_df.copy()
+        """
+        :param signal_tolerance_ms: How far a signal may be from the open time
+            of the candle it is assigned to; 0 requires an exact match.
+        :param max_positions: How many positions may be open at once. Above 1
+            every signal opens a position while there is room, and an
+            alternate signal closes all positions in the other direction.
+        :param exit_rules: ExitRule instances applied on top of TP and SL.
+            Only for max_positions=1.
+        :param signal_direction: "backward", "forward" or "nearest", see
+            time_axis.align_to_candles.
+        """
+        # candles_df is None when candles are streamed through run_chunks().
+        # The frames are not copied, tranform() builds new frames instead of
+        # changing the caller's.
+        self.candles_df = candles_df
+        self.signals_df = signals_df
         self.capital = capital
         self.inital_capital = capital
         self.leverage = leverage
@@ -29,82 +63,423 @@ class TradeSimulation:
         self.with_compounding = with_compounding  # Store the compounding flag
         self.use_alternate_signall = use_alternate_signall
         self.interval = interval
-
-        self.active_trades = []
+        self.interval_ms = interval_ms(interval)
+        self.signal_tolerance_ms = signal_tolerance_ms
+        self.signal_direction = signal_direction
+        self.signal_events = np.empty(0, dtype=SIGNAL_EVENT)
+        self.unmatched_signals = 0
+        self.signals_prepared = False
+        self.last_candle_time = None  # Open time of the last candle simulated
+
+        self.max_positions = max(1, int(max_positions))
+        self.exit_rules = list(exit_rules or [])
+        self.exit_scan = None
+        if self.exit_rules and self.max_positions > 1:
+            raise ValueError("Exit rules can only be used with one open position at a time.")
         self.completed_trades = []
+        if self.max_positions > 1:
+            self.active_trades = PositionBook(self.interval_ms - SECOND_MS)
+        else:
+            self.active_trades = []
 
+    @profiling.traced("simulation.tranform")
     def tranform(self):
-        self.candles_df['Datetime'] = pd.to_datetime(
-            self.candles_df['Datetime'])
-
-        self.candles_df['Datetime'] = self.candles_df['Datetime'].dt.tz_convert(
-            'Asia/Karachi'
-        )
-        self.candles_df.set_index('Datetime', inplace=True)
-
-        self.signals_df['time'] = pd.to_datetime(self.signals_df['time'])
-        self.signals_df['time'] = self.signals_df['time'].dt.tz_convert(
-            'Asia/Karachi'
-        )
-
-        self.signals_df.set_index('time', inplace=True)
-
-        buy = self.signals_df['Buy'] == 1
-        sell = self.signals_df['Sell'] == 1
-
-        self.signals_df['Direction'] = np.where(
-            buy,
-            "BUY",
-            np.where(
-                sell,
-                "SELL",
-                "NaN"
-            )
+        # Candles and signals are indexed by UTC epoch ms from here on
+        with profiling.span("simulation.candle_times", rows=len(self.candles_df)) as s:
+            self.candles_df = self.candles_df.assign(
+                Datetime=to_epoch_ms(self.candles_df['Datetime'])).set_index('Datetime')
+            if profiling.is_enabled():
+                s.set(memory_bytes=frame_bytes(self.candles_df))
+
+        self.prepare_signals()
+
+        with profiling.span("simulation.align_signals", rows=len(self.signals_df)) as s:
+            self.signal_events = self.align_signals(
+                self.candles_df.index.to_numpy(np.int64))
+            self.unmatched_signals = len(self.signals_df) - len(self.signal_events)
+            s.set(unmatched=self.unmatched_signals, memory_bytes=self.signal_events.nbytes)
+
+    def prepare_signals(self):
+        """
+        Index the signals by epoch ms and work out their direction, TP and SL.
+        """
+        if self.signals_prepared:
+            return
+        self.signals_prepared = True
+
+        with profiling.span("simulation.signal_times", rows=len(self.signals_df)) as s:
+            signals_df = self.signals_df.assign(time=to_epoch_ms(self.signals_df['time']))
+            buy = signals_df['Buy'] == 1
+            sell = signals_df['Sell'] == 1
+
+            self.signals_df = signals_df.assign(
+                Take_Profit=np.where(
+                    buy,
+                    signals_df['Entry'] * (1 + self.tp_percent/100),
+                    np.where(
+                        sell,
+                        signals_df['Entry'] * (1 - self.tp_percent/100),
+                        np.nan
+                    )
+                ),
+                Stop_Loss=np.where(
+                    buy,
+                    signals_df['Entry'] * (1 - self.sl_percent/100),
+                    np.where(
+                        sell,
+                        signals_df['Entry'] * (1 + self.sl_percent/100),
+                        np.nan
+                    )
+                ),
+                Direction=direction_codes(buy, sell)
+            ).set_index('time')[[
+                'Entry',
+                'Take_Profit',
+                'Stop_Loss',
+                'Direction'
+            ]]
+            if profiling.is_enabled():
+                s.set(memory_bytes=frame_bytes(self.signals_df))
+
+        # Signal times in order, for picking the signals near a chunk of candles
+        signal_times = self.signals_df.index.to_numpy(np.int64)
+        self.signal_time_order = np.argsort(signal_times, kind="stable")
+        self.sorted_signal_times = signal_times[self.signal_time_order]
+
+    def align_signals(self, candle_times, before=None, after=None):
+        """
+        Map signals to the candles they are traded on, as SIGNAL_EVENT records
+        ordered by candle. Signals on the same candle keep their file order.
+
+        :param candle_times: Epoch-ms open times of the candles.
+        :param before: When candle_times is one chunk of a longer history, open
+            time of the candle just before it (None for the first chunk).
+        :param after: Open time of the candle just after the chunk (None for
+            the last). With both neighbours known, every signal is matched to
+            the same candle as when aligning the whole history at once, and to
+            at most one chunk.
+        """
+        candle_times = np.asarray(candle_times, dtype=np.int64)
+        picked = self.signal_time_order
+        context = candle_times
+        if before is not None or after is not None:
+            context = np.concatenate([
+                [before] if before is not None else [],
+                candle_times,
+                [after] if after is not None else []
+            ]).astype(np.int64)
+            if len(context):
+                lo = np.searchsorted(
+                    self.sorted_signal_times, context.min() - self.signal_tolerance_ms, side="left")
+                hi = np.searchsorted(
+                    self.sorted_signal_times, context.max() + self.signal_tolerance_ms, side="right")
+                picked = picked[lo:hi]
+
+        matched = align_to_candles(
+            context,
+            self.signals_df.index.to_numpy(np.int64)[picked],
+            self.signal_tolerance_ms,
+            self.signal_direction
         )
-
-        self.signals_df['Stop_Loss'] = np.where(
-            buy,
-            self.signals_df['Entry'] * (1 - self.sl_percent/100),
-            np.where(
-                sell,
-                self.signals_df['Entry'] * (1 + self.sl_percent/100),
-                np.nan
+        if before is not None:
+            matched -= 1
+        keep = (matched >= 0) & (matched < len(candle_times))
+        picked, matched = picked[keep], matched[keep]
+        # By candle, then by position in the signals file
+        order = np.lexsort((picked, matched))
+        picked = picked[order]
+
+        events = np.empty(len(picked), dtype=SIGNAL_EVENT)
+        events["candle"] = matched[order]
+        events["direction"] = self.signals_df['Direction'].to_numpy(np.int8)[picked]
+        events["entry"] = self.signals_df['Entry'].to_numpy(np.float64)[picked]
+        events["take_profit"] = self.signals_df['Take_Profit'].to_numpy(np.float64)[picked]
+        events["stop_loss"] = self.signals_df['Stop_Loss'].to_numpy(np.float64)[picked]
+        return events
+
+    def run_backtest(self, progress=None, should_stop=None, progress_every=5000):
+        """
+        :param progress: Optional callback(processed, index) every
+            progress_every candles, with the number of candles processed so far
+            and the epoch-ms time of the current candle.
+        :param should_stop: Optional callable checked at the same interval;
+            returning True ends the run early.
+        """
+        run = _RunState(progress, should_stop, progress_every)
+        closed_before = len(self.completed_trades)
+        with profiling.span("simulation.run_backtest") as run_span:
+            self.simulate_candles(
+                run,
+                self.candles_df.index.to_numpy(np.int64),
+                price_array(self.candles_df, 'High'),
+                price_array(self.candles_df, 'Low'),
+                self.signal_events,
+                price_array(self.candles_df, 'Close') if self.needs_close else None
             )
-        )
+            self._finish_run(run, run_span, closed_before)
+        return self.completed_trades
 
-        self.signals_df['Take_Profit'] = np.where(
-            buy,
-            self.signals_df['Entry'] * (1 + self.tp_percent/100),
-            np.where(
-                sell,
-                self.signals_df['Entry'] * (1 - self.tp_percent/100),
-                np.nan
-            )
-        )
+    def run_chunks(self, chunks, progress=None, should_stop=None, progress_every=5000):
+        """
+        Backtest candles that arrive as DataFrames (Datetime, High, Low) in time
+        order, without holding the whole history. Open trades and capital carry
+        over from one chunk to the next and the trades are the same as
+        tranform() followed by run_backtest() on the concatenated chunks.
+
+        One chunk is read ahead, its first candle is needed to align the
+        signals that fall between two chunks.
+
+        :param chunks: Iterable of candle DataFrames, e.g. pd.read_csv(..., chunksize=n).
+        :raises ValueError: when the candles are not in time order.
+        """
+        self.prepare_signals()
+        run = _RunState(progress, should_stop, progress_every)
+        closed_before = len(self.completed_trades)
+        matched_signals = 0
+
+        def chunk_arrays(chunk):
+            if chunk is None:
+                return None
+            times = to_epoch_ms(chunk['Datetime'])
+            if len(times) > 1 and (np.diff(times) < 0).any():
+                raise ValueError("Candles must be in time order to be backtested in chunks.")
+            return (times, price_array(chunk, 'High'), price_array(chunk, 'Low'),
+                    price_array(chunk, 'Close') if self.needs_close else None)
+
+        chunks = (chunk for chunk in chunks if len(chunk))
+        with profiling.span("simulation.run_chunks") as run_span:
+            current = chunk_arrays(next(chunks, None))
+            before = None
+            while current is not None:
+                following = chunk_arrays(next(chunks, None))
+                times, high, low, close = current
+                if before is not None and times[0] < before:
+                    raise ValueError("Candles must be in time order to be backtested in chunks.")
+
+                after = int(following[0][0]) if following is not None else None
+                events = self.align_signals(times, before, after)
+                matched_signals += len(events)
+                run_span.count("chunks")
+
+                if not self.simulate_candles(run, times, high, low, events, close):
+                    break
+                before = int(times[-1])
+                current = following
+
+            self.unmatched_signals = len(self.signals_df) - matched_signals
+            self._finish_run(run, run_span, closed_before)
+        return self.completed_trades
 
-        self.signals_df = self.signals_df[[
-            'Entry',
-            'Take_Profit',
-            'Stop_Loss',
-            'Direction'
-        ]]
-
-        self.candles_df = pd.merge(
-            self.candles_df,
-            self.signals_df,
-            how='left',
-            left_index=True,
-            right_index=True
-        )
+    @property
+    def needs_close(self):
+        """
+        Whether the exit rules need the candles' Close prices.
+        """
+        return any(rule.uses_close for rule in self.exit_rules)
+
+    def simulate_candles(self, run, times, high, low, events, close=None):
+        """
+        Run the candles of one chunk (or the whole history) through the
+        simulation. Candle positions in events are relative to this chunk.
+
+        :return: False when the run has to end (no capital left or stopped).
+        """
+        if self.exit_rules:
+            return self.simulate_rule_candles(run, times, high, low, events, close)
+
+        event_candle = events["candle"].tolist()
+        event_direction = DIRECTION_LABELS[events["direction"]].tolist()
+        event_entry = events["entry"].tolist()
+        event_take_profit = events["take_profit"].tolist()
+        event_stop_loss = events["stop_loss"].tolist()
+        event_count = len(event_candle)
+        candle_count = len(times)
+        offset = run.processed
+        next_event = 0
+        # One row reused for every candle, trades copy the values they keep
+        row = {}
+
+        i = 0
+        while i < candle_count:
+            if not self.active_trades:
+                # Nothing happens while flat until the next signal's candle
+                if next_event >= event_count:
+                    break
+                i = max(i, event_candle[next_event])
+
+            index = int(times[i])
+            run.processed, run.index = offset + i + 1, index
+            row['High'] = high[i]
+            row['Low'] = low[i]
+            if next_event < event_count and event_candle[next_event] == i:
+                # Several signals on one candle are each simulated in turn
+                while next_event < event_count and event_candle[next_event] == i:
+                    row['Entry'] = event_entry[next_event]
+                    row['Take_Profit'] = event_take_profit[next_event]
+                    row['Stop_Loss'] = event_stop_loss[next_event]
+                    row['Direction'] = event_direction[next_event]
+                    next_event += 1
+                    self.simulate_trades(row, index)
+                    if self.capital <= 0:
+                        break
+            else:
+                row['Entry'] = np.nan
+                row['Take_Profit'] = np.nan
+                row['Stop_Loss'] = np.nan
+                row['Direction'] = None
+                self.simulate_trades(row, index)
 
-    def run_backtest(self):
-        for index, row in self.candles_df.iterrows():
-            self.simulate_trades(row, index)
             if self.capital <= 0:
                 # self.capital = 500
-                break
+                return False
+
+            if run.processed >= run.next_report and not run.report():
+                return False
+            i += 1
+
+        if candle_count:
+            run.processed, run.index = offset + candle_count, int(times[-1])
+            if run.processed >= run.next_report and not run.report():
+                return False
+        return True
+
+    def simulate_rule_candles(self, run, times, high, low, events, close):
+        """
+        simulate_candles() with exit rules. While a trade is open its exit is
+        found by an ExitScan, so only the candle it exits on and the candles
+        with signals are visited one by one.
+        """
+        event_candle = events["candle"].tolist()
+        event_count = len(event_candle)
+        candle_count = len(times)
+        offset = run.processed
+        next_event = 0
+        exit_at = None  # (position, price, reason) of the open trade's exit
+        row = {}
+
+        i = 0
+        while i < candle_count:
+            if not self.active_trades:
+                if next_event >= event_count:
+                    break
+                i = max(i, event_candle[next_event])
+            else:
+                if self.exit_scan is None:
+                    trade = self.active_trades[-1]
+                    self.exit_scan = ExitScan(
+                        trade, self.exit_rules, self.interval_ms,
+                        trade['Datetime'] + self.interval_ms - SECOND_MS)
+                if exit_at is None:
+                    exit_at = (self.exit_scan.scan(times, high, low, close, i)
+                               or (candle_count, None, None))
+                i = exit_at[0]
+                if next_event < event_count:
+                    i = min(i, event_candle[next_event])
+                if i >= candle_count:
+                    break  # Still open at the end, the scan goes on in the next chunk
+
+            index = int(times[i])
+            run.processed, run.index = offset + i + 1, index
+            if exit_at is not None and exit_at[0] == i:
+                self.close_on_rule(exit_at[1], exit_at[2], index)
+                exit_at = None
+
+            if next_event < event_count and event_candle[next_event] == i:
+                trade = self.active_trades[-1] if self.active_trades else None
+                row['High'] = high[i]
+                row['Low'] = low[i]
+                while next_event < event_count and event_candle[next_event] == i:
+                    event = events[next_event]
+                    row['Entry'] = float(event["entry"])
+                    row['Take_Profit'] = float(event["take_profit"])
+                    row['Stop_Loss'] = float(event["stop_loss"])
+                    row['Direction'] = DIRECTION_LABELS[event["direction"]]
+                    next_event += 1
+                    self.simulate_trades(row, index)
+                    if self.capital <= 0:
+                        break
+
+                if not self.active_trades or self.active_trades[-1] is not trade:
+                    # Closed by an alternate signal, or a new trade was opened
+                    exit_at = None
+                    self.exit_scan = None
 
-        return self.completed_trades
+            if self.capital <= 0:
+                return False
+
+            if run.processed >= run.next_report and not run.report():
+                return False
+            i += 1
+
+        if candle_count:
+            run.processed, run.index = offset + candle_count, int(times[-1])
+            if run.processed >= run.next_report and not run.report():
+                return False
+        return True
+
+    def close_on_rule(self, price, reason, index):
+        """
+        Close the open trade where its ExitScan found the exit. A moved stop
+        is recorded as the trade's stop loss, exits at a candle's Close are
+        recorded like alternate signal exits.
+        """
+        trade = self.active_trades[-1]
+        self.exit_scan = None
+        if reason == "Close":
+            self.close_trade(trade, price, index, price)
+            return
+        if reason == "Stop_Loss":
+            trade['Stop_Loss'] = price
+        self.close_trade(trade, price, index)
+
+    def _finish_run(self, run, run_span, closed_before):
+        closed = len(self.completed_trades) - closed_before
+        run_span.set(candles=run.processed, trades_closed=closed,
+                     trades_opened=closed + len(self.active_trades))
+        if run.index is not None:
+            self.last_candle_time = run.index
+        if run.progress is not None and run.index is not None:
+            run.progress(run.processed, run.index)
+
+    def push_candle(self, candle, signal=None):
+        """
+        Feed one newly closed candle through the simulation without
+        reprocessing history. Call after tranform() and run_backtest().
+
+        :param candle: dict with Datetime (epoch ms or datetime), Open, High, Low, Close.
+        :param signal: optional dict with Entry, Buy, Sell for this candle; when
+            omitted the loaded signals are matched to it as in run_backtest().
+        :return: the trades completed by this candle.
+        """
+        index = to_epoch_ms(candle['Datetime'])
+        if signal is not None:
+            events = np.empty(0, dtype=SIGNAL_EVENT)
+            entry = float(signal['Entry'])
+            if signal.get('Buy') == 1:
+                events = np.array([(0, BUY, entry, entry * (1 + self.tp_percent/100),
+                                    entry * (1 - self.sl_percent/100))], dtype=SIGNAL_EVENT)
+            elif signal.get('Sell') == 1:
+                events = np.array([(0, SELL, entry, entry * (1 - self.tp_percent/100),
+                                    entry * (1 + self.sl_percent/100))], dtype=SIGNAL_EVENT)
+        else:
+            # Matched like the batch run, with the previous candle and the
+            # expected next one as neighbours so each signal is used once
+            self.prepare_signals()
+            events = self.align_signals(
+                [index], self.last_candle_time, index + self.interval_ms)
+
+        completed_before = len(self.completed_trades)
+        if self.capital > 0:
+            self.simulate_candles(
+                _RunState(None, None, np.iinfo(np.int64).max),
+                np.array([index], dtype=np.int64),
+                np.array([candle['High']], dtype=np.float64),
+                np.array([candle['Low']], dtype=np.float64),
+                events,
+                np.array([candle.get('Close', np.nan)], dtype=np.float64)
+            )
+        self.last_candle_time = index
+        return self.completed_trades[completed_before:]
 
     def record_trade(self, trade, index, result, price_diff, close_price=0):
         completed = {
@@ -214,12 +589,12 @@ class TradeSimulation:
         if last_candle is None:
             return
 
-        if len(self.active_trades) > 0:
-            minute = pd.Timedelta(minutes=int(self.interval))
-            seconds = pd.Timedelta(seconds=1)
+        if self.max_positions > 1:
+            self.simulate_positions(last_candle, index)
+            return
 
-            skip_time = pd.to_datetime(
-                self.active_trades[-1]['Datetime']) + minute - seconds
+        if len(self.active_trades) > 0:
+            skip_time = self.active_trades[-1]['Datetime'] + self.interval_ms - SECOND_MS
             if index <= skip_time:
                 return
 
@@ -290,3 +665,65 @@ class TradeSimulation:
             }
 
             self.active_trades.append(trade)
+
+
+    def simulate_positions(self, last_candle, index):
+        """
+        simulate_trades() for more than one open position, kept in a PositionBook.
+        Every position has its own skip window and positions close in the
+        order they were opened.
+        """
+        book = self.active_trades
+        book.activate(index)
+
+        for trade, price in book.crossed(last_candle['High'], last_candle['Low']):
+            self.close_trade(trade, price, index)
+
+        direction = last_candle['Direction']
+        if direction != 'BUY' and direction != 'SELL':
+            return
+
+        if self.use_alternate_signall:
+            for trade in book.active("SELL" if direction == 'BUY' else "BUY"):
+                self.close_trade(trade, last_candle['Entry'], index, last_candle['Entry'])
+
+        if len(book) < self.max_positions:
+            book.append({
+                'Datetime': index,
+                'Direction': direction,
+                'Stop_Loss': last_candle['Stop_Loss'],
+                'Take_Profit': last_candle['Take_Profit'],
+                'Entry_Price': last_candle['Entry']
+            })
+
+    def close_trade(self, trade, price, index, close_price=0):
+        if trade['Direction'] == "BUY":
+            price_diff, result = self.calculate_long_profit_loss(trade, price)
+        else:
+            price_diff, result = self.calculate_short_profit_loss(trade, price)
+        self.record_trade(trade, index, result, price_diff, close_price)
+
+
+class _RunState:
+    """
+    Progress of a run across the chunks it is simulated in.
+    """
+
+    def __init__(self, progress, should_stop, progress_every):
+        self.progress = progress
+        self.should_stop = should_stop
+        self.progress_every = progress_every
+        self.next_report = progress_every
+        self.processed = 0
+        self.index = None
+
+    def report(self):
+        """
+        :return: False when the run should stop.
+        """
+        self.next_report = (self.processed // self.progress_every + 1) * self.progress_every
+        if self.should_stop is not None and self.should_stop():
+            return False
+        if self.progress is not None:
+            self.progress(self.processed, self.index)
+        return True